@@ -1,20 +1,66 @@
-from flask import Flask
-from app.database import db
+import math
+import time
+from flask import Flask, current_app, jsonify, request
+from playhouse.pool import MaxConnectionsExceeded
+from app.database import db, connect_db, close_db, use_replica, start_request_stats, stop_request_stats, READ_YOUR_WRITES_SECONDS
+from app.analytics import schedule_coverage_refresh
 from app.api.v1 import api_v1_bp
 from app.api.v2 import api_v2_bp
 
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+READ_PRIMARY_COOKIE = "read_primary_until"
+
+def _recently_wrote():
+    try:
+        return float(request.cookies.get(READ_PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+def _is_read_request():
+    view = current_app.view_functions.get(request.endpoint)
+    return request.method in READ_METHODS or getattr(view, 'read_only', False)
+
 def create_app():
     app = Flask(__name__)
 
-    app.before_request
+    @app.before_request
     def _db_connect():
-        if db.is_closed():
-            db.connect()
+        start_request_stats()
+        if _is_read_request() and not _recently_wrote():
+            use_replica()
+        connect_db()
 
-    app.teardown_request
+    @app.after_request
+    def _read_your_writes(response):
+        # Replicas lag behind the primary, so keep a client's reads on the
+        # primary for a short window after it changes something
+        if db.replicas and not _is_read_request() and response.status_code < 400:
+            response.set_cookie(
+                READ_PRIMARY_COOKIE,
+                str(time.time() + READ_YOUR_WRITES_SECONDS),
+                max_age=math.ceil(READ_YOUR_WRITES_SECONDS),
+                httponly=True,
+            )
+        return response
+
+    @app.after_request
+    def _refresh_analytics(response):
+        # Every change to coins, duties, KSBs and their links goes through v1
+        if 'api_v1' in request.blueprints and not _is_read_request() and response.status_code < 400:
+            schedule_coverage_refresh()
+        return response
+
+    @app.teardown_request
     def _db_close(exc):
-        if not db.is_closed():
-            db.close()
+        close_db()
+        stop_request_stats()
+
+    @app.errorhandler(MaxConnectionsExceeded)
+    def _db_pool_exhausted(err):
+        return jsonify({
+            'error': "Service unavailable",
+            'message': "No database connection available, please retry"
+        }), 503
 
     app.register_blueprint(api_v1_bp)
     app.register_blueprint(api_v2_bp)
@@ -0,0 +1,68 @@
+from peewee import SQL, fn
+from app.models import Coins, Duties, KSB, CoinDuties, KsbDuties
+
+# JSON documents assembled by Postgres, so nested resources come back from a
+# single query instead of one query per parent row.
+
+EMPTY_JSON_ARRAY = SQL("'[]'::json")
+
+def ksb_json():
+    return fn.json_build_object(
+        'id', KSB.id,
+        'type', KSB.type,
+        'name', KSB.name,
+        'description', KSB.description,
+    )
+
+def ksbs_for_duty(ksb_type=None):
+    # Correlated on the enclosing query's Duties row
+    query = (KSB
+        .select(fn.json_agg(ksb_json()).order_by(KSB.name))
+        .join(KsbDuties)
+        .where(KsbDuties.duty_id == Duties.id))
+    if ksb_type is not None:
+        query = query.where(KSB.type == ksb_type)
+    return fn.COALESCE(query, EMPTY_JSON_ARRAY)
+
+def duty_json(ksb_type=None):
+    return fn.json_build_object(
+        'id', Duties.id,
+        'name', Duties.name,
+        'description', Duties.description,
+        'ksbs', ksbs_for_duty(ksb_type),
+    )
+
+def duties_with_ksbs(ksb_type=None):
+    return Duties.select(Duties.name, duty_json(ksb_type).cast('text').alias('duty')).dicts()
+
+def duties_for_coin():
+    # Correlated on the enclosing query's Coins row
+    return fn.COALESCE(
+        Duties.select(fn.json_agg(duty_json()).order_by(Duties.name))
+            .join(CoinDuties)
+            .where(CoinDuties.coin_id == Coins.id),
+        EMPTY_JSON_ARRAY,
+    )
+
+def coin_tree_json():
+    return fn.json_build_object(
+        'id', Coins.id,
+        'name', Coins.name,
+        'completed', Coins.completed,
+        'duties', duties_for_coin(),
+    )
+
+def coin_tree(coin_id):
+    # The document is returned as text and passed straight through to the
+    # response rather than being decoded and re-encoded in Python
+    return (Coins
+        .select(coin_tree_json().cast('text'))
+        .where(Coins.id == coin_id)
+        .scalar())
+
+def catalog_tree():
+    inner = Coins.select(coin_tree_json().alias('tree')).order_by(Coins.name)
+    return (Coins
+        .select(fn.COALESCE(fn.json_agg(inner.c.tree), EMPTY_JSON_ARRAY).cast('text'))
+        .from_(inner)
+        .scalar())
@@ -0,0 +1,71 @@
+import logging
+import os
+import sys
+import threading
+from peewee import PostgresqlDatabase, Table
+from app.database import db
+
+# Coverage analytics are read from the coin_coverage materialized view (see
+# app/migrations/0005_coverage_view.py) instead of walking every coin's
+# duties and KSBs. Writes through the API schedule a refresh; it can also be
+# refreshed on a schedule with `python -m app.analytics refresh`.
+
+# Seconds between the first write in a burst and the refresh that covers it;
+# 0 turns refresh-on-write off
+COVERAGE_REFRESH_DELAY = float(os.environ.get('COVERAGE_REFRESH_DELAY', 5))
+KSB_TYPE_COLUMNS = {'Knowledge': 'knowledge', 'Skill': 'skill', 'Behaviour': 'behaviour'}
+
+coverage = Table('coin_coverage', (
+    'coin_id', 'coin_name', 'duties', 'knowledge', 'skill', 'behaviour', 'ksbs', 'refreshed_at',
+))
+
+logger = logging.getLogger(__name__)
+_refresh_lock = threading.Lock()
+_refresh_timer = None
+
+def coverage_query():
+    return (coverage
+        .select(
+            coverage.coin_id,
+            coverage.coin_name,
+            coverage.duties,
+            coverage.knowledge,
+            coverage.skill,
+            coverage.behaviour,
+            coverage.ksbs,
+            coverage.refreshed_at)
+        .bind(db))
+
+def refresh_coverage():
+    # Always on the primary; CONCURRENTLY keeps the view readable meanwhile
+    with db.primary.connection_context():
+        db.primary.execute_sql("REFRESH MATERIALIZED VIEW CONCURRENTLY coin_coverage")
+
+def _scheduled_refresh():
+    global _refresh_timer
+    with _refresh_lock:
+        _refresh_timer = None
+    try:
+        refresh_coverage()
+    except Exception:
+        # Anything, pool exhaustion included: the next write schedules another
+        logger.exception("Coverage refresh failed")
+
+def schedule_coverage_refresh():
+    # Debounced per worker: a burst of writes is covered by one refresh
+    # COVERAGE_REFRESH_DELAY seconds after the first of them, and a write made
+    # while that refresh runs schedules the next one
+    global _refresh_timer
+    if COVERAGE_REFRESH_DELAY <= 0 or not isinstance(db.primary, PostgresqlDatabase):
+        return
+    with _refresh_lock:
+        if _refresh_timer is not None:
+            return
+        _refresh_timer = threading.Timer(COVERAGE_REFRESH_DELAY, _scheduled_refresh)
+        _refresh_timer.daemon = True
+        _refresh_timer.start()
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["refresh"]:
+        sys.exit("usage: python -m app.analytics refresh")
+    refresh_coverage()
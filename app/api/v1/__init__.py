@@ -2,9 +2,19 @@ from flask import Blueprint
 from app.api.v1.coins.routes import coins_bp
 from app.api.v1.duties.routes import duties_bp
 from app.api.v1.ksb.routes import ksb_bp
+from app.api.v1.stats.routes import stats_bp
+from app.api.v1.catalog.routes import catalog_bp
+from app.api.v1.search.routes import search_bp
+from app.api.v1.analytics.routes import analytics_bp
+from app.api.v1.bulk.routes import bulk_bp
 
 api_v1_bp = Blueprint("api_v1", __name__, url_prefix="/api/v1")
 
 api_v1_bp.register_blueprint(coins_bp)
 api_v1_bp.register_blueprint(duties_bp)
-api_v1_bp.register_blueprint(ksb_bp)
\ No newline at end of file
+api_v1_bp.register_blueprint(ksb_bp)
+api_v1_bp.register_blueprint(stats_bp)
+api_v1_bp.register_blueprint(catalog_bp)
+api_v1_bp.register_blueprint(search_bp)
+api_v1_bp.register_blueprint(analytics_bp)
+api_v1_bp.register_blueprint(bulk_bp)
\ No newline at end of file
@@ -0,0 +1,39 @@
+from flask import Blueprint, jsonify
+from app.analytics import KSB_TYPE_COLUMNS, coverage, coverage_query
+from app.pagination import is_paginated, paginate, PaginationError
+
+analytics_bp = Blueprint("analytics", __name__, url_prefix="analytics")
+
+def _coin_coverage(row):
+    return {
+        'coin_id': row['coin_id'],
+        'coin_name': row['coin_name'],
+        'duties': row['duties'],
+        'ksbs': {
+            **{ksb_type: row[column] for ksb_type, column in KSB_TYPE_COLUMNS.items()},
+            'total': row['ksbs'],
+        },
+    }
+
+@analytics_bp.get("/coverage")
+def get_coverage():
+    query = coverage_query().dicts()
+    if not is_paginated():
+        rows, next_cursor = list(query.order_by(coverage.coin_name)), None
+    else:
+        try:
+            rows, next_cursor = paginate(query, coverage.coin_name)
+        except PaginationError as err:
+            return jsonify({
+                'error': "Invalid pagination",
+                'message': str(err)
+            }), 400
+
+    response = {
+        'data': [_coin_coverage(row) for row in rows],
+        # The view is refreshed as a whole, so every row has the same time
+        'refreshed_at': rows[0]['refreshed_at'].isoformat() if rows else None,
+    }
+    if is_paginated():
+        response['next_cursor'] = next_cursor
+    return jsonify(response), 200
@@ -0,0 +1,23 @@
+from flask import Blueprint, jsonify, request
+from app.auth import admin_required
+from app.bulk import BulkOperationError, parse_operations, run_operations
+from app.ratelimit import rate_limit_cost
+
+bulk_bp = Blueprint("bulk", __name__, url_prefix="bulk")
+
+@bulk_bp.post("")
+@rate_limit_cost(10)
+@admin_required()
+def run_bulk_operations():
+    try:
+        operations = parse_operations(request.get_json(silent=True))
+        results = run_operations(operations)
+    except BulkOperationError as err:
+        return jsonify({
+            'error': err.error,
+            'message': err.message,
+            'operation': err.index
+        }), err.status
+    return jsonify({
+        'results': results
+    }), 200
@@ -0,0 +1,67 @@
+import io
+import tempfile
+from flask import Blueprint, Response, jsonify, request
+from app.auth import admin_required
+from app.catalog import FORMATS, CatalogError, export_catalog, import_catalog
+from app.streaming import NDJSON
+from app.ratelimit import rate_limit_cost
+
+catalog_bp = Blueprint("catalog", __name__, url_prefix="catalog")
+
+CONTENT_TYPES = {'ndjson': NDJSON, 'csv': "text/csv"}
+# Exports larger than this are spooled to disk instead of memory
+EXPORT_SPOOL_SIZE = 8 * 1024 * 1024
+
+def _requested_format(default):
+    format = request.args.get('format')
+    if format is None:
+        for name, content_type in CONTENT_TYPES.items():
+            if request.mimetype == content_type:
+                return name
+        return default
+    if format not in FORMATS:
+        raise CatalogError(f"format must be one of {', '.join(FORMATS)}")
+    return format
+
+@catalog_bp.post("/import")
+@rate_limit_cost(25)
+@admin_required()
+def import_whole_catalog():
+    try:
+        format = _requested_format('ndjson')
+        stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+        counts = import_catalog(stream, format)
+    except (CatalogError, UnicodeDecodeError) as err:
+        return jsonify({
+            'error': "Invalid catalog",
+            'message': str(err)
+        }), 400
+    return jsonify({
+        'imported': counts
+    }), 200
+
+@catalog_bp.get("/export")
+@rate_limit_cost(25)
+@admin_required()
+def export_whole_catalog():
+    try:
+        format = _requested_format('ndjson')
+    except CatalogError as err:
+        return jsonify({
+            'error': "Invalid catalog",
+            'message': str(err)
+        }), 400
+
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
+    out = io.TextIOWrapper(spool, encoding='utf-8', newline='')
+    export_catalog(out, format)
+    out.detach()
+    spool.seek(0)
+
+    def generate():
+        with spool:
+            yield from iter(lambda: spool.read(64 * 1024), b'')
+
+    return Response(generate(), mimetype=CONTENT_TYPES[format], headers={
+        'Content-Disposition': f"attachment; filename=catalog.{format}"
+    })
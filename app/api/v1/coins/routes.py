@@ -1,13 +1,22 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 from app.models.coins import Coins
 from app.models.duties import Duties
 from app.models.coin_duties import CoinDuties
-import uuid 
+from app.ids import new_id
 from peewee import JOIN
 import peewee
+from psycopg2.errors import UniqueViolation
 from pydantic import BaseModel, ValidationError, field_validator
 from flask_jwt_extended import get_jwt, jwt_required
 from app.auth import admin_required
+from app.aggregates import coin_tree, catalog_tree
+from app.relationships import bulk_ids, is_valid_id, link_many, sync_links, unlink, BulkRequestError
+from app.pagination import is_paginated, paginate, PaginationError
+from app.batch import fetch_by_ids
+from app.database import read_only
+from app.ratelimit import list_cost, rate_limit_cost
+from app.streaming import wants_stream, ndjson_response
+from app.mutations import delete_returning, update_returning
 
 coins_bp = Blueprint("coins", __name__, url_prefix="coins")
 
@@ -25,13 +34,34 @@ class CoinCreateRequestModel(BaseModel):
         return value
 
 class CoinPatchRequestModel(BaseModel):
-    name: str | None = None       
+    # Fields left out are not changed; the name cannot be set to null
+    name: str = None
     completed: bool | None = None 
 
 @coins_bp.get("")
+@rate_limit_cost(list_cost)
 def get_all_coins():
-    coins = [coin for coin in Coins.select().dicts()]
-    return jsonify(coins), 200
+    if 'ids' in request.args:
+        return fetch_by_ids(Coins)
+
+    if wants_stream():
+        return ndjson_response(Coins.select().order_by(Coins.name).dicts())
+
+    if not is_paginated():
+        coins = [coin for coin in Coins.select().dicts()]
+        return jsonify(coins), 200
+
+    try:
+        coins, next_cursor = paginate(Coins.select().dicts(), Coins.name)
+    except PaginationError as err:
+        return jsonify({
+            'error': "Invalid pagination",
+            'message': str(err)
+        }), 400
+    return jsonify({
+        'data': coins,
+        'next_cursor': next_cursor
+    }), 200
 
 @coins_bp.get('/<id>')
 def get_coin_by_id(id):
@@ -52,13 +82,19 @@ def get_coin_by_id(id):
             'message': "The provided ID must be a valid UUID"
         }), 400
 
+@coins_bp.post('/lookup')
+@rate_limit_cost(10)
+@read_only
+def lookup_coins():
+    return fetch_by_ids(Coins)
+
 @coins_bp.post('')
 @admin_required()
 def create_coin():
     try:
         data = CoinCreateRequestModel(**request.get_json()).model_dump()
         new_coin = Coins.create(
-            id=uuid.uuid4(),
+            id=new_id(),
             **data
         )
         return jsonify({
@@ -78,50 +114,51 @@ def create_coin():
 @admin_required()
 def delete_coin(id):
     try:
-        coin_to_delete = Coins.get_by_id(id)
-        coin_to_delete.delete_instance()
-        return jsonify({
-            'status': "Success",
-            'deleted': {
-                'id': coin_to_delete.id,
-                'name': coin_to_delete.name
-            },
-        }), 200
-    except peewee.DoesNotExist:
-        return jsonify({
-            'error': "Database error",
-            'message': f"Coin with ID = {id} does not exist"
-        }), 404
+        deleted_coin = delete_returning(Coins, id)
     except peewee.DataError:
         return jsonify({
             'error': "Invalid ID format",
             'message': "The provided ID must be a valid UUID"
         }), 400
+    if deleted_coin is None:
+        return jsonify({
+            'error': "Database error",
+            'message': f"Coin with ID = {id} does not exist"
+        }), 404
+    return jsonify({
+        'status': "Success",
+        'deleted': {
+            'id': deleted_coin['id'],
+            'name': deleted_coin['name']
+        },
+    }), 200
 
 @coins_bp.patch('/<id>')
 @jwt_required()
 def update_coin(id):
     try:
-        data = CoinPatchRequestModel(**request.get_json()).model_dump(exclude_unset=True)
-        coin = Coins.get(Coins.id == f"{id}")
+        data = CoinPatchRequestModel.model_validate(request.get_json(silent=True)).model_dump(exclude_unset=True)
 
         if "name" in data:
             claims = get_jwt()
             if not claims.get("is_admin"):
                 return jsonify(msg="Only admins can rename coins!"), 403
-            coin.name = data["name"]
-            coin.save()
-
-        if 'completed' in data:
-            coin.completed = data["completed"]
-            coin.save()        
 
-        updated_coin = Coins.get(Coins.id == f"{id}")
+        updated_coin = update_returning(Coins, id, data, ('name', 'completed'))
+        if updated_coin is None:
+            raise peewee.DoesNotExist
         return jsonify({
-            "id": updated_coin.id,
-            "name": updated_coin.name,
-            "completed": updated_coin.completed
+            "id": updated_coin['id'],
+            "name": updated_coin['name'],
+            "completed": updated_coin['completed']
         }), 200
+    except peewee.IntegrityError as err:
+        if not isinstance(getattr(err, 'orig', None), UniqueViolation):
+            raise
+        return jsonify({
+            'error': "Duplication error",
+            'message': f"{data['name']} already exists"
+        }), 409
     except ValidationError as err:
         return jsonify(err.errors()), 400
     except peewee.DoesNotExist:
@@ -166,7 +203,7 @@ def add_duty_to_coin(coin_id, duty_id):
         coin = Coins.get_by_id(coin_id)
         duty = Duties.get_by_id(duty_id)
         new_coin_duty_record = CoinDuties.create(
-                id=uuid.uuid4(),
+                id=new_id(),
                 coin_id = coin_id,
                 duty_id = duty_id,
             )
@@ -200,38 +237,119 @@ def add_duty_to_coin(coin_id, duty_id):
             'message': "IDs must be a valid UUID"
         }), 400
 
+@coins_bp.post('/<coin_id>/duties')
+@rate_limit_cost(10)
+@admin_required()
+def add_duties_to_coin(coin_id):
+    try:
+        duty_ids = bulk_ids(request.get_json(silent=True), 'duty_ids')
+    except BulkRequestError as err:
+        return jsonify({
+            'error': "Invalid json input",
+            'message': str(err)
+        }), 400
+    if not is_valid_id(coin_id):
+        return jsonify({
+            'error': "Invalid ID format",
+            'message': "IDs must be a valid UUID"
+        }), 400
+
+    coin_name, results = link_many(CoinDuties.coin_id, CoinDuties.duty_id, coin_id, duty_ids)
+    if coin_name is None:
+        return jsonify({
+            'error': "Invalid ID",
+            'message': f"A coin with ID = {coin_id} does not exist"
+        }), 404
+    return jsonify({
+        'coin_name': coin_name,
+        'duties': results,
+    }), 200
+
+@coins_bp.put('/<coin_id>/duties')
+@rate_limit_cost(10)
+@admin_required()
+def set_duties_of_coin(coin_id):
+    try:
+        duty_ids = bulk_ids(request.get_json(silent=True), 'duty_ids', allow_empty=True)
+    except BulkRequestError as err:
+        return jsonify({
+            'error': "Invalid json input",
+            'message': str(err)
+        }), 400
+    if not all(is_valid_id(id) for id in [coin_id, *duty_ids]):
+        return jsonify({
+            'error': "Invalid ID format",
+            'message': "IDs must be a valid UUID"
+        }), 400
+
+    coin_name, changes = sync_links(CoinDuties.coin_id, CoinDuties.duty_id, coin_id, duty_ids)
+    if coin_name is None:
+        return jsonify({
+            'error': "Invalid ID",
+            'message': f"A coin with ID = {coin_id} does not exist"
+        }), 404
+    if changes['not_found']:
+        return jsonify({
+            'error': "Invalid ID",
+            'message': "Some duties do not exist, no changes were made",
+            'not_found': changes['not_found']
+        }), 404
+    return jsonify({
+        'coin_name': coin_name,
+        'added': changes['added'],
+        'removed': changes['removed'],
+    }), 200
+
 @coins_bp.delete('/<coin_id>/duties/<duty_id>')
 @admin_required()
 def remove_duty_from_coin(coin_id, duty_id):
     try:
-        Coins.get_by_id(coin_id)
-        coin_name = Coins.get_by_id(coin_id).name
-        Duties.get_by_id(duty_id)
-        duty_name = Duties.get_by_id(duty_id).name
-
-        record_to_delete = CoinDuties.get(CoinDuties.coin_id == coin_id, CoinDuties.duty_id == duty_id)
-        record_to_delete.delete_instance()
+        coin_name, duty_name, removed = unlink(CoinDuties.coin_id, CoinDuties.duty_id, coin_id, duty_id)
+    except peewee.DataError:
         return jsonify({
-                'status': "Success",
-                'message': f"Removed {duty_name} from {coin_name}",
-            }), 200
-    except peewee.DoesNotExist as err:
-        if "Model: Coins" in err.args[0]:
-            return jsonify({
-                'error': "Invalid ID",
-                'message': f"A coin with ID = {coin_id} does not exist"
-            }), 404
-        if "Model: Duties" in err.args[0]:
-            return jsonify({
-                'error': "Invalid ID",
-                'message': f"A duty with ID = {duty_id} does not exist"
-            }), 404
+            'error': "Invalid ID format",
+            'message': "IDs must be a valid UUID"
+        }), 400
+    if coin_name is None:
+        return jsonify({
+            'error': "Invalid ID",
+            'message': f"A coin with ID = {coin_id} does not exist"
+        }), 404
+    if duty_name is None:
+        return jsonify({
+            'error': "Invalid ID",
+            'message': f"A duty with ID = {duty_id} does not exist"
+        }), 404
+    if not removed:
         return jsonify({
                 'error': "Record does not exist",
                 'message': f"{duty_name} is not associated with {coin_name}"
             }), 404
-    except peewee.DataError as err:
+    return jsonify({
+            'status': "Success",
+            'message': f"Removed {duty_name} from {coin_name}",
+        }), 200
+
+# CURRICULUM TREES
+
+@coins_bp.get('/tree')
+@rate_limit_cost(20)
+def get_catalog_tree():
+    return Response(catalog_tree(), mimetype="application/json"), 200
+
+@coins_bp.get('/<id>/tree')
+@rate_limit_cost(5)
+def get_coin_tree(id):
+    try:
+        tree = coin_tree(id)
+    except peewee.DataError:
         return jsonify({
             'error': "Invalid ID format",
-            'message': "IDs must be a valid UUID"
-        }), 400
\ No newline at end of file
+            'message': "The provided ID must be a valid UUID"
+        }), 400
+    if tree is None:
+        return jsonify({
+            'error': "Database error",
+            'message': f"Coin with ID = {id} does not exist"
+        }), 404
+    return Response(tree, mimetype="application/json"), 200
\ No newline at end of file
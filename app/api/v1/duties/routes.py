@@ -1,20 +1,55 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 from app.models.duties import Duties
 from app.models.ksb import KSB
 from app.models.ksb_duties import KsbDuties
-from peewee import JOIN, prefetch
-import uuid 
+from peewee import JOIN
+from app.ids import new_id
+import json
 import peewee
+from pydantic import BaseModel, ValidationError
 from app.auth import admin_required
+from app.pagination import is_paginated, paginate, PaginationError
+from app.batch import fetch_by_ids
+from app.database import read_only
+from app.ratelimit import list_cost, rate_limit_cost
+from app.streaming import wants_stream, ndjson_response, iterate_rows, json_array_response
+from app.aggregates import duties_with_ksbs
+from app.mutations import delete_returning, update_returning
+from app.relationships import bulk_ids, is_valid_id, link_many, sync_links, unlink, BulkRequestError
 
 duties_bp = Blueprint("duties", __name__, url_prefix="duties")
 
 # DUTIES
 
+class DutyPatchRequestModel(BaseModel):
+    # Fields left out are not changed; neither can be set to null
+    name: str = None
+    description: str = None
+
 @duties_bp.get("")
+@rate_limit_cost(list_cost)
 def get_all_duties():
-    duties = [duty for duty in Duties.select().dicts()]
-    return jsonify(duties), 200
+    if 'ids' in request.args:
+        return fetch_by_ids(Duties)
+
+    if wants_stream():
+        return ndjson_response(Duties.select().order_by(Duties.name).dicts())
+
+    if not is_paginated():
+        duties = [duty for duty in Duties.select().dicts()]
+        return jsonify(duties), 200
+
+    try:
+        duties, next_cursor = paginate(Duties.select().dicts(), Duties.name)
+    except PaginationError as err:
+        return jsonify({
+            'error': "Invalid pagination",
+            'message': str(err)
+        }), 400
+    return jsonify({
+        'data': duties,
+        'next_cursor': next_cursor
+    }), 200
 
 @duties_bp.get('/<id>')
 def get_duty_by_id(id):
@@ -36,6 +71,12 @@ def get_duty_by_id(id):
             'message': "The provided ID must be a valid UUID"
         }), 400
 
+@duties_bp.post('/lookup')
+@rate_limit_cost(10)
+@read_only
+def lookup_duties():
+    return fetch_by_ids(Duties)
+
 @duties_bp.post('')
 @admin_required()
 def create_duty():
@@ -46,7 +87,7 @@ def create_duty():
     
     try:
         new_duty = Duties.create(
-            id=uuid.uuid4(),
+            id=new_id(),
             name=data['name'],
             description=data['description'],
         )
@@ -65,48 +106,46 @@ def create_duty():
 @admin_required()
 def delete_duty(id):
     try:
-        duty_to_delete = Duties.get_by_id(id)
-        duty_to_delete.delete_instance()
-        return jsonify({
-            'status': "Success",
-            'deleted': {
-                'id': duty_to_delete.id,
-                'name': duty_to_delete.name,
-                'description': duty_to_delete.description,
-            },
-        }), 200
-    except peewee.DoesNotExist:
-        return jsonify({
-            'error': "Database error",
-            'message': f"Duty with ID = {id} does not exist"
-        }), 404
+        deleted_duty = delete_returning(Duties, id)
     except peewee.DataError:
         return jsonify({
             'error': "Invalid ID format",
             'message': "The provided ID must be a valid UUID"
         }), 400
+    if deleted_duty is None:
+        return jsonify({
+            'error': "Database error",
+            'message': f"Duty with ID = {id} does not exist"
+        }), 404
+    return jsonify({
+        'status': "Success",
+        'deleted': {
+            'id': deleted_duty['id'],
+            'name': deleted_duty['name'],
+            'description': deleted_duty['description'],
+        },
+    }), 200
 
 @duties_bp.patch('/<id>')
 @admin_required()
 def update_duty(id):
     try:
-        data = request.get_json()
-        duty = Duties.get(Duties.id == f"{id}")
-
-        if 'name' in data:
-            duty.name = data["name"]
-            duty.save()
-    
-        if 'description' in data:
-            duty.description = data["description"]
-            duty.save()
-        
-        updated_duty = Duties.get(Duties.id == f"{id}")
-        return jsonify({
-            "id": updated_duty.id,
-            "name": updated_duty.name,
-            "description": updated_duty.description
+        data = DutyPatchRequestModel.model_validate(request.get_json(silent=True)).model_dump(exclude_unset=True)
+        updated_duty = update_returning(Duties, id, data, ('name', 'description'))
+        if updated_duty is None:
+            raise peewee.DoesNotExist
+        return jsonify({
+            "id": updated_duty['id'],
+            "name": updated_duty['name'],
+            "description": updated_duty['description']
         }), 200
+    except peewee.IntegrityError as err:
+        return jsonify({
+            'error': "Duplication error",
+            'message': f"A duty with {err.args[0].split(':  ')[-1][4:-17]} already exists",
+        }), 409
+    except ValidationError as err:
+        return jsonify(err.errors()), 400
     except peewee.DoesNotExist:
         return jsonify({
             'error': "Database error",
@@ -120,36 +159,37 @@ def update_duty(id):
     
 
 @duties_bp.route('/with-ksbs')
+@rate_limit_cost(20)
 def get_duties_with_ksbs():
+    ksb_type = request.args.get('ksb_type')
+    if ksb_type is not None and ksb_type not in ['Knowledge', 'Skill', 'Behaviour']:
+        return jsonify({
+            'error': "Invalid type",
+            'message': "Type must be one of 'Knowledge', 'Skill' or 'Behaviour'",
+        }), 400
+
+    query = duties_with_ksbs(ksb_type)
+    if not is_paginated():
+        rows = iterate_rows(query.order_by(Duties.name))
+        return json_array_response(row['duty'] for row in rows)
+
     try:
-        duties_query = Duties.select()
-        ksb_duties_query = (KsbDuties.select(KsbDuties, KSB).join(KSB))
-        duties_with_ksbs = prefetch(duties_query, ksb_duties_query)
-        
-        result = []
-        for duty in duties_with_ksbs:
-            ksb_list = []
-            for item in duty.ksb_duty:
-                ksb_list.append({
-                    "id": str(item.ksb_id.id),
-                    "type": item.ksb_id.type,
-                    "name": item.ksb_id.name,
-                    "description": item.ksb_id.description
-                })
-                
-            result.append({
-                "id": str(duty.id),
-                "name": duty.name,
-                "description": duty.description,
-                "ksbs": ksb_list 
-            })
-            
-        return jsonify(result), 200
-        
-    except Exception as e:
+        duties, next_cursor = paginate(query, Duties.name)
+    except PaginationError as err:
+        return jsonify({
+            'error': "Invalid pagination",
+            'message': str(err)
+        }), 400
+    except peewee.DatabaseError as e:
         print(f"Database error: {str(e)}")
         return jsonify({"error": "Failed to fetch duties with KSB"}), 500
 
+    body = '{"data": [%s], "next_cursor": %s}' % (
+        ",".join(duty['duty'] for duty in duties),
+        json.dumps(next_cursor),
+    )
+    return Response(body, mimetype="application/json"), 200
+
 # DUTY AND KSB RELATIONSHIPS
 
 @duties_bp.get('/<duty_id>/ksb')
@@ -181,7 +221,7 @@ def add_ksb_to_duty(duty_id, ksb_id):
         duty = Duties.get_by_id(duty_id)
         ksb = KSB.get_by_id(ksb_id)
         new_ksb_duty_record = KsbDuties.create(
-                id=uuid.uuid4(),
+                id=new_id(),
                 duty_id = duty_id,
                 ksb_id = ksb_id,
             )
@@ -215,38 +255,95 @@ def add_ksb_to_duty(duty_id, ksb_id):
             'message': "IDs must be a valid UUID"
         }), 400
 
+@duties_bp.post('/<duty_id>/ksb')
+@rate_limit_cost(10)
+@admin_required()
+def add_ksbs_to_duty(duty_id):
+    try:
+        ksb_ids = bulk_ids(request.get_json(silent=True), 'ksb_ids')
+    except BulkRequestError as err:
+        return jsonify({
+            'error': "Invalid json input",
+            'message': str(err)
+        }), 400
+    if not is_valid_id(duty_id):
+        return jsonify({
+            'error': "Invalid ID format",
+            'message': "IDs must be a valid UUID"
+        }), 400
+
+    duty_name, results = link_many(KsbDuties.duty_id, KsbDuties.ksb_id, duty_id, ksb_ids)
+    if duty_name is None:
+        return jsonify({
+            'error': "Invalid ID",
+            'message': f"A duty with ID = {duty_id} does not exist"
+        }), 404
+    return jsonify({
+        'duty_name': duty_name,
+        'ksbs': results,
+    }), 200
+
+@duties_bp.put('/<duty_id>/ksb')
+@rate_limit_cost(10)
+@admin_required()
+def set_ksbs_of_duty(duty_id):
+    try:
+        ksb_ids = bulk_ids(request.get_json(silent=True), 'ksb_ids', allow_empty=True)
+    except BulkRequestError as err:
+        return jsonify({
+            'error': "Invalid json input",
+            'message': str(err)
+        }), 400
+    if not all(is_valid_id(id) for id in [duty_id, *ksb_ids]):
+        return jsonify({
+            'error': "Invalid ID format",
+            'message': "IDs must be a valid UUID"
+        }), 400
+
+    duty_name, changes = sync_links(KsbDuties.duty_id, KsbDuties.ksb_id, duty_id, ksb_ids)
+    if duty_name is None:
+        return jsonify({
+            'error': "Invalid ID",
+            'message': f"A duty with ID = {duty_id} does not exist"
+        }), 404
+    if changes['not_found']:
+        return jsonify({
+            'error': "Invalid ID",
+            'message': "Some KSBs do not exist, no changes were made",
+            'not_found': changes['not_found']
+        }), 404
+    return jsonify({
+        'duty_name': duty_name,
+        'added': changes['added'],
+        'removed': changes['removed'],
+    }), 200
+
 @duties_bp.delete('/<duty_id>/ksb/<ksb_id>')
 @admin_required()
 def remove_ksb_from_duty(duty_id, ksb_id):
     try:
-        Duties.get_by_id(duty_id)
-        duty_name = Duties.get_by_id(duty_id).name
-        KSB.get_by_id(ksb_id)
-        ksb_name = KSB.get_by_id(ksb_id).name
-
-        record_to_delete = KsbDuties.get(KsbDuties.ksb_id == ksb_id, KsbDuties.duty_id == duty_id)
-        record_to_delete.delete_instance()
+        duty_name, ksb_name, removed = unlink(KsbDuties.duty_id, KsbDuties.ksb_id, duty_id, ksb_id)
+    except peewee.DataError:
         return jsonify({
-                'status': "Success",
-                'message': f"Removed {ksb_name} from {duty_name}",
-            }), 200
-    except peewee.DoesNotExist as err:
-        if "Model: Duties" in err.args[0]:
-            return jsonify({
-                'error': "Invalid ID",
-                'message': f"A duty with ID = {duty_id} does not exist"
-            }), 404
-        if "Model: KSB" in err.args[0]:
-            return jsonify({
-                'error': "Invalid ID",
-                'message': f"A KSB with ID = {ksb_id} does not exist"
-            }), 404
+            'error': "Invalid ID format",
+            'message': "IDs must be a valid UUID"
+        }), 400
+    if duty_name is None:
+        return jsonify({
+            'error': "Invalid ID",
+            'message': f"A duty with ID = {duty_id} does not exist"
+        }), 404
+    if ksb_name is None:
+        return jsonify({
+            'error': "Invalid ID",
+            'message': f"A KSB with ID = {ksb_id} does not exist"
+        }), 404
+    if not removed:
         return jsonify({
                 'error': "Record does not exist",
                 'message': f"{ksb_name} is not associated with {duty_name}"
             }), 404
-    except peewee.DataError as err:
-        return jsonify({
-            'error': "Invalid ID format",
-            'message': "IDs must be a valid UUID"
-        }), 400
\ No newline at end of file
+    return jsonify({
+            'status': "Success",
+            'message': f"Removed {ksb_name} from {duty_name}",
+        }), 200
\ No newline at end of file
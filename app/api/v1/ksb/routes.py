@@ -1,14 +1,47 @@
 from flask import Blueprint, jsonify, request
 from app.models.ksb import KSB
-import uuid 
+from app.ids import new_id
 import peewee
+from pydantic import BaseModel, ValidationError
+from app.pagination import is_paginated, paginate, PaginationError
+from app.batch import fetch_by_ids
+from app.database import read_only
+from app.ratelimit import list_cost, rate_limit_cost
+from app.streaming import wants_stream, ndjson_response
+from app.mutations import delete_returning, update_returning
 
 ksb_bp = Blueprint("ksbs", __name__, url_prefix="ksb")
 
+class KsbPatchRequestModel(BaseModel):
+    # Fields left out are not changed; none can be set to null
+    type: str = None
+    name: str = None
+    description: str = None
+
 @ksb_bp.get("")
+@rate_limit_cost(list_cost)
 def get_all_ksbs():
-    ksbs = [ksb for ksb in KSB.select().dicts()]
-    return jsonify(ksbs), 200
+    if 'ids' in request.args:
+        return fetch_by_ids(KSB)
+
+    if wants_stream():
+        return ndjson_response(KSB.select().order_by(KSB.name).dicts())
+
+    if not is_paginated():
+        ksbs = [ksb for ksb in KSB.select().dicts()]
+        return jsonify(ksbs), 200
+
+    try:
+        ksbs, next_cursor = paginate(KSB.select().dicts(), KSB.name)
+    except PaginationError as err:
+        return jsonify({
+            'error': "Invalid pagination",
+            'message': str(err)
+        }), 400
+    return jsonify({
+        'data': ksbs,
+        'next_cursor': next_cursor
+    }), 200
 
 @ksb_bp.get('/<id>')
 def get_ksb_by_id(id):
@@ -31,6 +64,12 @@ def get_ksb_by_id(id):
             'message': "The provided ID must be a valid UUID"
         }), 400
 
+@ksb_bp.post('/lookup')
+@rate_limit_cost(10)
+@read_only
+def lookup_ksbs():
+    return fetch_by_ids(KSB)
+
 @ksb_bp.post('')
 def create_ksb():
     data = request.get_json()
@@ -46,7 +85,7 @@ def create_ksb():
     
     try:
         new_ksb = KSB.create(
-            id=uuid.uuid4(),
+            id=new_id(),
             type=data['type'],
             name=data['name'],
             description=data['description'],
@@ -66,33 +105,31 @@ def create_ksb():
 @ksb_bp.delete('/<id>')
 def delete_ksb(id):
     try:
-        ksb_to_delete = KSB.get_by_id(id)
-        ksb_to_delete.delete_instance()
-        return jsonify({
-            'status': "Success",
-            'deleted': {
-                'id': ksb_to_delete.id,
-                'type': ksb_to_delete.type,
-                'name': ksb_to_delete.name,
-                'description': ksb_to_delete.description,
-            },
-        }), 200
-    except peewee.DoesNotExist:
-        return jsonify({
-            'error': "Database error",
-            'message': f"KSB with ID = {id} does not exist"
-        }), 404
+        deleted_ksb = delete_returning(KSB, id)
     except peewee.DataError:
         return jsonify({
             'error': "Invalid ID format",
             'message': "The provided ID must be a valid UUID"
         }), 400
+    if deleted_ksb is None:
+        return jsonify({
+            'error': "Database error",
+            'message': f"KSB with ID = {id} does not exist"
+        }), 404
+    return jsonify({
+        'status': "Success",
+        'deleted': {
+            'id': deleted_ksb['id'],
+            'type': deleted_ksb['type'],
+            'name': deleted_ksb['name'],
+            'description': deleted_ksb['description'],
+        },
+    }), 200
 
 @ksb_bp.patch('/<id>')
 def update_ksb(id):
     try:
-        data = request.get_json()
-        ksb = KSB.get(KSB.id == f"{id}")
+        data = KsbPatchRequestModel.model_validate(request.get_json(silent=True)).model_dump(exclude_unset=True)
 
         if 'type' in data and data['type'] not in ['Knowledge', 'Skill', 'Behaviour']:
             return jsonify({
@@ -100,25 +137,22 @@ def update_ksb(id):
                 'message': "Type must be one of 'Knowledge', 'Skill' or 'Behaviour'",
             }), 400
 
-        if 'type' in data:
-            ksb.type = data["type"]
-            ksb.save()
-
-        if 'name' in data:
-            ksb.name = data["name"]
-            ksb.save()
-    
-        if 'description' in data:
-            ksb.description = data["description"]
-            ksb.save()
-        
-        updated_ksb = KSB.get(KSB.id == f"{id}")
+        updated_ksb = update_returning(KSB, id, data, ('type', 'name', 'description'))
+        if updated_ksb is None:
+            raise peewee.DoesNotExist
         return jsonify({
-            "id": updated_ksb.id,
-            "type": updated_ksb.type,
-            "name": updated_ksb.name,
-            "description": updated_ksb.description
+            "id": updated_ksb['id'],
+            "type": updated_ksb['type'],
+            "name": updated_ksb['name'],
+            "description": updated_ksb['description']
         }), 200
+    except peewee.IntegrityError as err:
+        return jsonify({
+            'error': "Duplication error",
+            'message': f"A KSB with {err.args[0].split(':  ')[-1][4:-17]} already exists",
+        }), 409
+    except ValidationError as err:
+        return jsonify(err.errors()), 400
     except peewee.DoesNotExist:
         return jsonify({
             'error': "Database error",
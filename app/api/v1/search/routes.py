@@ -0,0 +1,37 @@
+from flask import Blueprint, jsonify, request
+from app.pagination import PaginationError
+from app.search import SEARCH_KINDS, SearchError, search
+from app.ratelimit import rate_limit_cost
+
+search_bp = Blueprint("search", __name__, url_prefix="search")
+
+@search_bp.get("")
+@rate_limit_cost(5)
+def search_catalog():
+    kind = request.args.get('kind')
+    if kind is not None and kind not in SEARCH_KINDS:
+        return jsonify({
+            'error': "Invalid query",
+            'message': f"kind must be one of {', '.join(SEARCH_KINDS)}"
+        }), 400
+
+    try:
+        results, next_cursor = search(
+            request.args.get('q'),
+            kinds=(kind,) if kind else SEARCH_KINDS,
+            cursor=request.args.get('cursor'),
+        )
+    except SearchError as err:
+        return jsonify({
+            'error': "Invalid query",
+            'message': str(err)
+        }), 400
+    except PaginationError as err:
+        return jsonify({
+            'error': "Invalid pagination",
+            'message': str(err)
+        }), 400
+    return jsonify({
+        'data': results,
+        'next_cursor': next_cursor
+    }), 200
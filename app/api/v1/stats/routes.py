@@ -0,0 +1,15 @@
+from flask import Blueprint, jsonify
+from app.database import pool_stats
+from app.passwords import hashing_stats
+from app.auth import admin_required, token_cache_stats
+
+stats_bp = Blueprint("stats", __name__, url_prefix="stats")
+
+@stats_bp.get("")
+@admin_required()
+def get_stats():
+    return jsonify({
+        'db_pool': pool_stats(),
+        'password_hashing': hashing_stats(),
+        'jwt_cache': token_cache_stats(),
+    }), 200
@@ -1,27 +1,47 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 from app.models.duties import Duties
-from app.models.coins import Coins
 from app.models.coin_duties import CoinDuties
-from peewee import JOIN
-import peewee
+from app.relationships import bulk_names, linked_name, linked_names, BulkRequestError
+from app.names import similar_names, FuzzyUnavailable
+from app.ratelimit import rate_limit_cost
 
 v2_duties_bp = Blueprint("v2_duties", __name__, url_prefix="duties")
 
+@v2_duties_bp.get('')
+@rate_limit_cost(5)
+def get_all_coins_for_duties():
+    try:
+        names = bulk_names(request.args.getlist('names'))
+    except BulkRequestError as err:
+        return jsonify({
+            'error': "Invalid query",
+            'message': str(err)
+        }), 400
+
+    linked_to, not_found = linked_names(CoinDuties.duty_id, CoinDuties.coin_id, names)
+    return jsonify({
+        'linked_to': linked_to,
+        'not_found': not_found
+    }), 200
+
 @v2_duties_bp.get('/<name>')
 def get_all_coins_for_duty(name):
-    try:
-        duty = Duties.get(Duties.name == name)
-        query = (Coins
-        .select(Coins.name)
-        .join(CoinDuties, JOIN.INNER)
-        .join(Duties, JOIN.INNER)
-        .where(Duties.name == name))
+    # Case-insensitive; with ?fuzzy=1 an unknown name also gets suggestions
+    found = linked_name(CoinDuties.duty_id, CoinDuties.coin_id, name)
+    if found is not None:
+        duty_name, linked_to = found
         return jsonify({
-            'duty_name': duty.name,
-            'linked_to': [coin.name for coin in query]
+            'duty_name': duty_name,
+            'linked_to': linked_to
         }), 200
-    except peewee.DoesNotExist:
-        return jsonify({
-            'error': "Database error",
-            'message': f"Duty with name = '{name}' does not exist"
-        }), 400
\ No newline at end of file
+
+    error = {
+        'error': "Database error",
+        'message': f"Duty with name = '{name}' does not exist"
+    }
+    if request.args.get('fuzzy') == '1':
+        try:
+            error['did_you_mean'] = similar_names(Duties, name)
+        except FuzzyUnavailable as err:
+            error['message'] += f". {err}"
+    return jsonify(error), 400
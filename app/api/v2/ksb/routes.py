@@ -1,27 +1,47 @@
-from flask import Blueprint, jsonify
-from app.models.duties import Duties
+from flask import Blueprint, jsonify, request
 from app.models.ksb import KSB
 from app.models.ksb_duties import KsbDuties
-from peewee import JOIN
-import peewee
+from app.relationships import bulk_names, linked_name, linked_names, BulkRequestError
+from app.names import similar_names, FuzzyUnavailable
+from app.ratelimit import rate_limit_cost
 
 v2_ksb_bp = Blueprint("v2_ksb", __name__, url_prefix="ksb")
 
+@v2_ksb_bp.get('')
+@rate_limit_cost(5)
+def get_all_duties_for_ksbs():
+    try:
+        names = bulk_names(request.args.getlist('names'))
+    except BulkRequestError as err:
+        return jsonify({
+            'error': "Invalid query",
+            'message': str(err)
+        }), 400
+
+    linked_to, not_found = linked_names(KsbDuties.ksb_id, KsbDuties.duty_id, names)
+    return jsonify({
+        'linked_to': linked_to,
+        'not_found': not_found
+    }), 200
+
 @v2_ksb_bp.get('/<name>')
 def get_all_duties_for_ksb(name):
-    try:
-        ksb = KSB.get(KSB.name == name)
-        query = (Duties
-        .select(Duties.name)
-        .join(KsbDuties, JOIN.INNER)
-        .join(KSB, JOIN.INNER)
-        .where(KSB.name == name))
+    # Case-insensitive; with ?fuzzy=1 an unknown name also gets suggestions
+    found = linked_name(KsbDuties.ksb_id, KsbDuties.duty_id, name)
+    if found is not None:
+        ksb_name, linked_to = found
         return jsonify({
-            'ksb_name': ksb.name,
-            'linked_to': [duty.name for duty in query]
+            'ksb_name': ksb_name,
+            'linked_to': linked_to
         }), 200
-    except peewee.DoesNotExist:
-        return jsonify({
-            'error': "Database error",
-            'message': f"KSB with name = '{name}' does not exist"
-        }), 400
\ No newline at end of file
+
+    error = {
+        'error': "Database error",
+        'message': f"KSB with name = '{name}' does not exist"
+    }
+    if request.args.get('fuzzy') == '1':
+        try:
+            error['did_you_mean'] = similar_names(KSB, name)
+        except FuzzyUnavailable as err:
+            error['message'] += f". {err}"
+    return jsonify(error), 400
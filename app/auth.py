@@ -1,6 +1,88 @@
+import collections
+import math
+import os
+import threading
+import time
 from functools import wraps
-from flask import jsonify
-from flask_jwt_extended import verify_jwt_in_request, get_jwt
+from flask import current_app, jsonify
+from flask_jwt_extended import JWTManager, verify_jwt_in_request, get_jwt
+from flask_jwt_extended.config import config
+
+# Most verified tokens each worker keeps decoded
+JWT_CACHE_SIZE = int(os.environ.get('JWT_CACHE_SIZE', 1024))
+
+class TokenCache:
+    # (Key it was verified with, encoded token) -> its verified claims, least
+    # recently used first. An entry is never served after the token's exp, so
+    # expiry is still enforced by a full decode once it has passed.
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evicted': 0}
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None and entry[0] <= time.time():
+                del self._entries[token]
+                self._stats['expired'] += 1
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(token)
+            self._stats['hits'] += 1
+            # A copy, so a caller changing its claims cannot change the cache
+            return dict(entry[1])
+
+    def put(self, token, claims):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[token] = (claims.get('exp', math.inf), dict(claims))
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evicted'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'max_size': self.max_size, **self._stats}
+
+class CachingJWTManager(JWTManager):
+    # Every protected route (admin_required and jwt_required alike) decodes
+    # its token through here, so a token reused across many requests has its
+    # signature checked once per worker. Blocklist and user loader callbacks
+    # still run on every request.
+    #
+    # Each app has its own cache, and entries are keyed by the key the token
+    # was verified with as well, so a token is not taken as valid by another
+    # app or after the secret changes.
+    def init_app(self, app, add_context_processor=False):
+        super().init_app(app, add_context_processor)
+        app.extensions['jwt_token_cache'] = TokenCache(JWT_CACHE_SIZE)
+
+    def _decode_jwt_from_config(self, encoded_token, csrf_value=None, allow_expired=False):
+        # Cookie tokens come with a CSRF value that has to be checked each time
+        if csrf_value is not None or allow_expired:
+            return super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+        cache = current_app.extensions['jwt_token_cache']
+        key = (config.decode_key, encoded_token)
+        claims = cache.get(key)
+        if claims is None:
+            claims = super()._decode_jwt_from_config(encoded_token)
+            cache.put(key, claims)
+        return claims
+
+def token_cache_stats():
+    # None for an app without CachingJWTManager
+    cache = current_app.extensions.get('jwt_token_cache')
+    return cache.stats() if cache is not None else None
 
 def admin_required():
     def wrapper(fn):
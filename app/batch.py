@@ -0,0 +1,35 @@
+from flask import jsonify, request
+from peewee import Value, fn
+from app.relationships import bulk_ids, is_valid_id, normalize_id, BulkRequestError
+
+def requested_ids():
+    # ?ids=a,b and/or repeated ?ids=a&ids=b, or {"ids": [...]} in a POST body
+    if request.method == 'GET':
+        data = {'ids': [id for value in request.args.getlist('ids') for id in value.split(',') if id]}
+    else:
+        data = request.get_json(silent=True)
+    # Kept as sent, so not_found reports them as the client knows them
+    return bulk_ids(data, 'ids', normalize=False)
+
+def fetch_by_ids(model):
+    try:
+        ids = requested_ids()
+    except BulkRequestError as err:
+        return jsonify({
+            'error': "Invalid json input",
+            'message': str(err)
+        }), 400
+    if not all(is_valid_id(id) for id in ids):
+        return jsonify({
+            'error': "Invalid ID format",
+            'message': "IDs must be a valid UUID"
+        }), 400
+
+    # One statement with a single array parameter however many IDs are requested
+    keys = [normalize_id(id) for id in ids]
+    rows = model.select().where(model.id == fn.ANY(Value(keys, unpack=False).cast('uuid[]'))).dicts()
+    found = {str(row['id']): row for row in rows}
+    return jsonify({
+        'data': [found[key] for key in dict.fromkeys(keys) if key in found],
+        'not_found': [id for id, key in zip(ids, keys) if key not in found]
+    }), 200
@@ -0,0 +1,234 @@
+import itertools
+import uuid
+from peewee import IntegrityError, Tuple, Value, fn
+from app.database import db
+from app.ids import new_id
+from app.models import Coins, Duties, KSB, CoinDuties, KsbDuties
+from app.mutations import update_returning
+from app.relationships import is_valid_id
+
+# Ordered create/update/delete/link/unlink operations applied in one
+# transaction. Runs of consecutive operations of the same kind are sent as
+# one statement each (updates excepted, as each sets its own columns).
+# A create may name a `ref`; later operations refer to its row as "$ref".
+
+MAX_BULK_OPERATIONS = 1000
+KSB_TYPES = ('Knowledge', 'Skill', 'Behaviour')
+
+RESOURCES = {'coin': Coins, 'duty': Duties, 'ksb': KSB}
+LABELS = {'coin': "coin", 'duty': "duty", 'ksb': "KSB"}
+TITLES = {'coin': "Coin", 'duty': "Duty", 'ksb': "KSB"}
+FIELDS = {
+    'coin': {'name': str, 'completed': bool},
+    'duty': {'name': str, 'description': str},
+    'ksb': {'type': str, 'name': str, 'description': str},
+}
+REQUIRED = {'coin': ('name',), 'duty': ('name', 'description'), 'ksb': ('type', 'name', 'description')}
+LINKS = {
+    ('coin', 'duty'): (CoinDuties.coin_id, CoinDuties.duty_id),
+    ('duty', 'ksb'): (KsbDuties.duty_id, KsbDuties.ksb_id),
+}
+
+class BulkOperationError(Exception):
+    def __init__(self, index, status, error, message):
+        super().__init__(message)
+        self.index = index
+        self.status = status
+        self.error = error
+        self.message = message
+
+def _invalid(index, message):
+    return BulkOperationError(index, 400, "Invalid operation", message)
+
+# PARSING
+
+def _resolve(index, value, refs):
+    if isinstance(value, str) and value.startswith('$'):
+        if value[1:] not in refs:
+            raise _invalid(index, f"{value} does not refer to an earlier create")
+        return refs[value[1:]]
+    if not is_valid_id(value):
+        raise BulkOperationError(index, 400, "Invalid ID format", "IDs must be a valid UUID or a $ref")
+    return str(uuid.UUID(str(value)))
+
+def _fields(index, resource, data, create):
+    if not isinstance(data, dict):
+        raise _invalid(index, "data must be a JSON object")
+    unknown = data.keys() - FIELDS[resource].keys()
+    if unknown:
+        raise _invalid(index, f"Unknown {LABELS[resource]} fields: {', '.join(sorted(unknown))}")
+    for field, type in FIELDS[resource].items():
+        if field in data and not isinstance(data[field], type):
+            raise _invalid(index, f"{field} must be a {'boolean' if type is bool else 'string'}")
+    if create:
+        missing = [field for field in REQUIRED[resource] if field not in data]
+        if missing:
+            raise _invalid(index, f"A {LABELS[resource]} requires {', '.join(missing)}")
+    elif not data:
+        raise _invalid(index, "data must set at least one field")
+    if data.get('type', KSB_TYPES[0]) not in KSB_TYPES:
+        raise BulkOperationError(index, 400, "Invalid type", "Type must be one of 'Knowledge', 'Skill' or 'Behaviour'")
+    if create and resource == 'coin':
+        return {'completed': False, **data}
+    return data
+
+def _link_kind(index, operation):
+    for kind in LINKS:
+        if operation.keys() - {'op'} == set(kind):
+            return kind
+    raise _invalid(index, "A link names either a coin and a duty, or a duty and a ksb")
+
+def parse_operations(data):
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list) or not operations:
+        raise _invalid(None, "operations must be a non-empty list")
+    if len(operations) > MAX_BULK_OPERATIONS:
+        raise _invalid(None, f"operations must contain at most {MAX_BULK_OPERATIONS} operations")
+
+    refs = {}
+    parsed = []
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict):
+            raise _invalid(index, "Each operation must be a JSON object")
+        op = operation.get('op')
+
+        if op in ('create', 'update', 'delete'):
+            resource = operation.get('resource')
+            if resource not in RESOURCES:
+                raise _invalid(index, f"resource must be one of {', '.join(RESOURCES)}")
+            if op == 'create':
+                # IDs are generated here, so every ref resolves before anything runs
+                id = str(new_id())
+                ref = operation.get('ref')
+                if ref is not None:
+                    if not isinstance(ref, str) or not ref or ref in refs:
+                        raise _invalid(index, "ref must be a non-empty string not used by an earlier create")
+                    refs[ref] = id
+                data = _fields(index, resource, operation.get('data'), create=True)
+            else:
+                id = _resolve(index, operation.get('id'), refs)
+                data = _fields(index, resource, operation.get('data'), create=False) if op == 'update' else None
+            parsed.append({'index': index, 'op': op, 'kind': resource, 'id': id, 'data': data, 'ref': operation.get('ref')})
+
+        elif op in ('link', 'unlink'):
+            kind = _link_kind(index, operation)
+            parsed.append({
+                'index': index,
+                'op': op,
+                'kind': kind,
+                'parent': _resolve(index, operation[kind[0]], refs),
+                'child': _resolve(index, operation[kind[1]], refs),
+            })
+
+        else:
+            raise _invalid(index, "op must be one of create, update, delete, link, unlink")
+    return parsed
+
+# EXECUTION
+
+def _uuid_array(ids):
+    return Value(ids, unpack=False).cast('uuid[]')
+
+def _create(resource, ops):
+    model = RESOURCES[resource]
+    rows = [{'id': op['id'], **op['data']} for op in ops]
+    # Conflicting rows are skipped rather than aborting the statement, so
+    # the operation at fault can be reported
+    query = model.insert_many(rows).on_conflict_ignore().returning(model.id).tuples()
+    created = {str(id) for id, in query.execute()}
+    for op in ops:
+        if op['id'] not in created:
+            raise BulkOperationError(op['index'], 409, "Duplication error",
+                f"A {LABELS[resource]} named {op['data']['name']!r}"
+                f"{'' if resource == 'coin' else ' or with the same description'} already exists")
+    return [
+        {'id': op['id'], 'name': op['data']['name'], **({'ref': op['ref']} if op['ref'] is not None else {})}
+        for op in ops
+    ]
+
+def _update(resource, ops):
+    model = RESOURCES[resource]
+    results = []
+    for op in ops:
+        try:
+            with db.atomic():
+                row = update_returning(model, op['id'], op['data'], FIELDS[resource])
+        except IntegrityError:
+            raise BulkOperationError(op['index'], 409, "Duplication error",
+                f"Another {LABELS[resource]} already has this name{'' if resource == 'coin' else ' or description'}")
+        if row is None:
+            raise BulkOperationError(op['index'], 404, "Database error",
+                f"{TITLES[resource]} with ID = {op['id']} does not exist")
+        results.append({**row, 'id': str(row['id'])})
+    return results
+
+def _delete(resource, ops):
+    model = RESOURCES[resource]
+    query = (model
+        .delete()
+        .where(model.id == fn.ANY(_uuid_array([op['id'] for op in ops])))
+        .returning(model.id, model.name)
+        .tuples())
+    deleted = {str(id): name for id, name in query.execute()}
+    results = []
+    for op in ops:
+        if op['id'] not in deleted:
+            raise BulkOperationError(op['index'], 404, "Database error",
+                f"{TITLES[resource]} with ID = {op['id']} does not exist")
+        results.append({'id': op['id'], 'name': deleted.pop(op['id'])})
+    return results
+
+def _check_exist(kind, field, ops, key):
+    model = field.rel_model
+    ids = [op[key] for op in ops]
+    found = {str(id) for id, in model.select(model.id).where(model.id == fn.ANY(_uuid_array(ids))).tuples()}
+    for op in ops:
+        if op[key] not in found:
+            raise BulkOperationError(op['index'], 404, "Invalid ID",
+                f"A {LABELS[kind]} with ID = {op[key]} does not exist")
+
+def _link(kind, ops):
+    parent_field, child_field = LINKS[kind]
+    link_model = parent_field.model
+    _check_exist(kind[0], parent_field, ops, 'parent')
+    _check_exist(kind[1], child_field, ops, 'child')
+
+    rows = [{link_model.id: str(new_id()), parent_field: op['parent'], child_field: op['child']} for op in ops]
+    query = link_model.insert_many(rows).on_conflict_ignore().returning(parent_field, child_field).tuples()
+    linked = {(str(parent), str(child)) for parent, child in query.execute()}
+    results = []
+    for op in ops:
+        pair = (op['parent'], op['child'])
+        results.append({'status': "linked" if pair in linked else "already_linked"})
+        linked.discard(pair)
+    return results
+
+def _unlink(kind, ops):
+    parent_field, child_field = LINKS[kind]
+    link_model = parent_field.model
+    pairs = [(op['parent'], op['child']) for op in ops]
+    query = (link_model
+        .delete()
+        .where(Tuple(parent_field, child_field).in_(pairs))
+        .returning(parent_field, child_field)
+        .tuples())
+    unlinked = {(str(parent), str(child)) for parent, child in query.execute()}
+    for op in ops:
+        pair = (op['parent'], op['child'])
+        if pair not in unlinked:
+            raise BulkOperationError(op['index'], 404, "Record does not exist",
+                f"{TITLES[kind[1]]} {op['child']} is not associated with {LABELS[kind[0]]} {op['parent']}")
+        unlinked.discard(pair)
+    return [{'status': "unlinked"} for _ in ops]
+
+EXECUTORS = {'create': _create, 'update': _update, 'delete': _delete, 'link': _link, 'unlink': _unlink}
+
+def run_operations(operations):
+    # All or nothing: a BulkOperationError rolls the whole transaction back
+    results = []
+    with db.atomic():
+        for (op, kind), group in itertools.groupby(operations, key=lambda operation: (operation['op'], operation['kind'])):
+            group = list(group)
+            for operation, result in zip(group, EXECUTORS[op](kind, group)):
+                results.append({'op': op, **result})
+    return results
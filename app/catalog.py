@@ -0,0 +1,274 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
+import sys
+from peewee import SQL, IntegrityError, PostgresqlDatabase, Select, Table, Value, chunked
+from app.database import db
+from app.ids import new_id
+from app.models import Coins, Duties, KSB, CoinDuties, KsbDuties
+
+# Whole-catalog import and export. Every record names its kind and refers to
+# other records by name, e.g. in NDJSON:
+#
+#   {"kind": "coin", "name": "Automate", "completed": false}
+#   {"kind": "duty", "name": "Duty 1", "description": "..."}
+#   {"kind": "ksb", "type": "Knowledge", "name": "K1", "description": "..."}
+#   {"kind": "coin_duty", "coin": "Automate", "duty": "Duty 1"}
+#   {"kind": "ksb_duty", "duty": "Duty 1", "ksb": "K1"}
+#
+# CSV uses the same records with one column per field (CSV_COLUMNS).
+
+FIELDS = {
+    'coin': ('name', 'completed'),
+    'duty': ('name', 'description'),
+    'ksb': ('type', 'name', 'description'),
+    'coin_duty': ('coin', 'duty'),
+    'ksb_duty': ('duty', 'ksb'),
+}
+CSV_COLUMNS = ('kind', 'name', 'type', 'description', 'completed', 'coin', 'duty', 'ksb')
+FORMATS = ('ndjson', 'csv')
+# Rows per INSERT when staging without COPY
+INSERT_BATCH_SIZE = 500
+
+class CatalogError(ValueError):
+    pass
+
+def format_for_path(path):
+    if path.endswith('.csv'):
+        return 'csv'
+    if path.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    raise CatalogError("Cannot tell the format from the file name, use --format")
+
+# READING
+
+def _parse_bool(value):
+    if value in (None, ''):
+        return False
+    if isinstance(value, bool):
+        return value
+    if str(value).lower() in ('true', 't', '1'):
+        return True
+    if str(value).lower() in ('false', 'f', '0'):
+        return False
+    raise ValueError(value)
+
+def _records(stream, format):
+    if format == 'csv':
+        for line, row in enumerate(csv.DictReader(stream), start=2):
+            yield line, row
+        return
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError:
+            raise CatalogError(f"Line {line}: invalid JSON")
+        if not isinstance(record, dict):
+            raise CatalogError(f"Line {line}: expected a JSON object")
+        yield line, record
+
+def read_catalog(stream, format):
+    # Entities are keyed by name and links by pair, so a record repeated in
+    # the input is only applied once (the last one wins)
+    catalog = {kind: {} for kind in FIELDS}
+    for line, record in _records(stream, format):
+        kind = record.get('kind')
+        if kind not in FIELDS:
+            raise CatalogError(f"Line {line}: kind must be one of {', '.join(FIELDS)}")
+        values = []
+        for field in FIELDS[kind]:
+            value = record.get(field)
+            if field == 'completed':
+                try:
+                    value = _parse_bool(value)
+                except ValueError:
+                    raise CatalogError(f"Line {line}: completed must be true or false")
+            elif not isinstance(value, str) or not value:
+                raise CatalogError(f"Line {line}: {kind} requires {field}")
+            values.append(value)
+        if kind in ('coin_duty', 'ksb_duty'):
+            catalog[kind][tuple(values)] = values
+        else:
+            catalog[kind][record['name']] = values
+    return catalog
+
+# IMPORT
+
+STAGING = {
+    'coin': (('id', 'uuid'), ('name', 'text'), ('completed', 'boolean')),
+    'duty': (('id', 'uuid'), ('name', 'text'), ('description', 'text')),
+    'ksb': (('id', 'uuid'), ('type', 'text'), ('name', 'text'), ('description', 'text')),
+    'coin_duty': (('id', 'uuid'), ('coin', 'text'), ('duty', 'text')),
+    'ksb_duty': (('id', 'uuid'), ('duty', 'text'), ('ksb', 'text')),
+}
+
+def _staging_name(kind):
+    return f"catalog_import_{kind}"
+
+def _stage(kind, rows, use_copy):
+    name = _staging_name(kind)
+    table = Table(name).bind(db)
+    columns = ", ".join(f"{column} {type}" for column, type in STAGING[kind])
+    db.execute_sql(f"CREATE TEMPORARY TABLE {name} ({columns})")
+    rows = [(str(new_id()), *values) for values in rows]
+    if not rows:
+        return table
+
+    if use_copy:
+        buffer = io.StringIO()
+        csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(rows)
+        buffer.seek(0)
+        db.cursor().copy_expert(f"COPY {name} FROM STDIN WITH (FORMAT csv)", buffer)
+    else:
+        for batch in chunked(rows, INSERT_BATCH_SIZE):
+            table.insert(batch, columns=[table.c[column] for column, _ in STAGING[kind]]).execute()
+    return table
+
+def _unresolved(stage, left, left_model, right, right_model):
+    query = (stage
+        .select(stage.c[left], stage.c[right])
+        .left_outer_join(left_model, on=(left_model.name == stage.c[left]))
+        .left_outer_join(right_model, on=(right_model.name == stage.c[right]))
+        .where(left_model.id.is_null() | right_model.id.is_null())
+        .limit(10)
+        .tuples())
+    return [f"{left} '{a}' / {right} '{b}'" for a, b in query]
+
+def _staged(stage, *columns):
+    # SQLite cannot tell an upsert's ON CONFLICT from a join's ON unless the
+    # SELECT has a WHERE clause
+    return stage.select(*(stage.c[column] for column in columns)).where(SQL('true'))
+
+def _link(stage, link_field_left, left, link_field_right, right):
+    left_model = link_field_left.rel_model
+    right_model = link_field_right.rel_model
+    missing = _unresolved(stage, left, left_model, right, right_model)
+    if missing:
+        raise CatalogError(f"Unknown names in {left}/{right} links: {'; '.join(missing)}")
+    link_model = link_field_left.model
+    return (link_model
+        .insert_from(
+            Select((stage,), (stage.c.id, left_model.id, right_model.id))
+                .join(left_model, on=(left_model.name == stage.c[left]))
+                .join(right_model, on=(right_model.name == stage.c[right]))
+                .where(SQL('true')),
+            [link_model.id, link_field_left, link_field_right])
+        .on_conflict_ignore()
+        .as_rowcount()
+        .execute())
+
+def import_catalog(stream, format):
+    # Loads the records into temporary staging tables (with COPY on
+    # Postgres, batched INSERTs elsewhere), then upserts entities by name
+    # and links by the names they refer to, all in one transaction
+    catalog = read_catalog(stream, format)
+    use_copy = isinstance(db.current(), PostgresqlDatabase)
+    counts = {}
+    try:
+        with db.atomic():
+            stages = {kind: _stage(kind, rows.values(), use_copy) for kind, rows in catalog.items()}
+
+            stage = stages['coin']
+            counts['coins'] = (Coins
+                .insert_from(_staged(stage, 'id', 'name', 'completed'), [Coins.id, Coins.name, Coins.completed])
+                .on_conflict(conflict_target=[Coins.name], preserve=[Coins.completed])
+                .as_rowcount()
+                .execute())
+            stage = stages['duty']
+            counts['duties'] = (Duties
+                .insert_from(_staged(stage, 'id', 'name', 'description'), [Duties.id, Duties.name, Duties.description])
+                .on_conflict(conflict_target=[Duties.name], preserve=[Duties.description])
+                .as_rowcount()
+                .execute())
+            stage = stages['ksb']
+            counts['ksbs'] = (KSB
+                .insert_from(_staged(stage, 'id', 'type', 'name', 'description'), [KSB.id, KSB.type, KSB.name, KSB.description])
+                .on_conflict(conflict_target=[KSB.name], preserve=[KSB.type, KSB.description])
+                .as_rowcount()
+                .execute())
+
+            counts['coin_duties'] = _link(stages['coin_duty'], CoinDuties.coin_id, 'coin', CoinDuties.duty_id, 'duty')
+            counts['ksb_duties'] = _link(stages['ksb_duty'], KsbDuties.duty_id, 'duty', KsbDuties.ksb_id, 'ksb')
+    except IntegrityError as err:
+        raise CatalogError(f"Import rejected by the database: {err}")
+    finally:
+        for kind in FIELDS:
+            db.execute_sql(f"DROP TABLE IF EXISTS {_staging_name(kind)}")
+    return counts
+
+# EXPORT
+
+def _export_query():
+    def row(kind, source, **columns):
+        return Select((source,), [Value(kind).alias('kind')] + [
+            columns[column].alias(column) if column in columns else Value(None).alias(column)
+            for column in CSV_COLUMNS[1:]
+        ])
+
+    Coin, Duty, Ksb = Coins.alias(), Duties.alias(), KSB.alias()
+    return (
+        row('coin', Coins, name=Coins.name, completed=Coins.completed)
+        + row('duty', Duties, name=Duties.name, description=Duties.description)
+        + row('ksb', KSB, type=KSB.type, name=KSB.name, description=KSB.description)
+        + row('coin_duty', CoinDuties, coin=Coin.name, duty=Duty.name)
+            .join(Coin, on=(Coin.id == CoinDuties.coin_id))
+            .join(Duty, on=(Duty.id == CoinDuties.duty_id))
+        + row('ksb_duty', KsbDuties, duty=Duty.name, ksb=Ksb.name)
+            .join(Duty, on=(Duty.id == KsbDuties.duty_id))
+            .join(Ksb, on=(Ksb.id == KsbDuties.ksb_id))
+    ).bind(db)
+
+def export_catalog(out, format):
+    query = _export_query()
+    if isinstance(db.current(), PostgresqlDatabase):
+        _copy_out(query, out, format)
+        return
+
+    # The UNION's columns are untyped, so booleans come back as stored (0/1)
+    rows = ({**row, 'completed': bool(row['completed'])} if row['kind'] == 'coin' else row for row in query.dicts())
+    if format == 'csv':
+        writer = csv.DictWriter(out, CSV_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        for row in rows:
+            out.write(json.dumps({key: value for key, value in row.items() if value is not None}) + "\n")
+
+def _copy_out(query, out, format):
+    cursor = db.cursor()
+    sql, params = db.get_sql_context().sql(query).query()
+    sql = cursor.mogrify(sql, params).decode()
+    if format == 'csv':
+        cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER)", out)
+    else:
+        # JSON text never contains raw control characters, so with a quote
+        # character and delimiter that cannot appear COPY writes it verbatim
+        sql = f"SELECT json_strip_nulls(row_to_json(catalog)) FROM ({sql}) AS catalog"
+        cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02')", out)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.catalog", description="Import or export the whole catalog")
+    parser.add_argument("command", choices=("import", "export"))
+    parser.add_argument("path", help="file to read or write, - for stdin/stdout")
+    parser.add_argument("--format", choices=FORMATS)
+    args = parser.parse_args(argv)
+
+    try:
+        format = args.format or format_for_path(args.path)
+        with db.connection_context():
+            if args.command == "import":
+                with (contextlib.nullcontext(sys.stdin) if args.path == "-" else open(args.path, newline='')) as stream:
+                    counts = import_catalog(stream, format)
+                print(json.dumps(counts))
+            else:
+                with (contextlib.nullcontext(sys.stdout) if args.path == "-" else open(args.path, "w", newline='')) as out:
+                    export_catalog(out, format)
+    except CatalogError as err:
+        parser.exit(1, f"error: {err}\n")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,11 @@
 from app.database import db
-from app.models import Coins, Duties, KSB, CoinDuties, KsbDuties, Users
+from app.migrate import migrate
+
+# Kept for existing deploy scripts; the schema is now managed by app.migrate
 
 def create_tables():
-    db.connect()
-    db.create_tables([Coins, Duties, KSB, CoinDuties, KsbDuties, Users])
-    db.close()
+    with db.connection_context():
+        migrate()
 
 if __name__ == "__main__":
     create_tables()
@@ -1,7 +1,269 @@
 import os
+import heapq
+import itertools
+import threading
+import time
+import weakref
+import psycopg2
 from dotenv import load_dotenv
+from peewee import DatabaseProxy, OperationalError
 from playhouse.db_url import connect
+from playhouse.pool import MaxConnectionsExceeded
 
 load_dotenv()
 
-db = connect(os.environ.get('DB_URL'))
\ No newline at end of file
+POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', 1))
+POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 8))
+# Connections older than this many seconds are recycled on checkout / checkin
+POOL_STALE_TIMEOUT = int(os.environ.get('DB_POOL_STALE_TIMEOUT', 300))
+# Idle connections above POOL_MIN_SIZE are closed after this many seconds
+POOL_IDLE_TIMEOUT = int(os.environ.get('DB_POOL_IDLE_TIMEOUT', 60))
+# How long a request waits for a free connection before giving up
+POOL_CHECKOUT_TIMEOUT = int(os.environ.get('DB_POOL_CHECKOUT_TIMEOUT', 10))
+# After a client writes, its reads stay on the primary for this many seconds
+READ_YOUR_WRITES_SECONDS = float(os.environ.get('DB_READ_YOUR_WRITES_SECONDS', 5))
+
+def pooled_url(url):
+    scheme, sep, rest = url.partition('://')
+    # The ext database adds server-side cursor support
+    if scheme in ('postgres', 'postgresql'):
+        scheme += 'ext'
+    if not scheme.endswith('+pool'):
+        scheme += '+pool'
+    return f"{scheme}{sep}{rest}"
+
+def open_pool(url):
+    return _instrument(connect(
+        pooled_url(url),
+        max_connections=POOL_MAX_SIZE,
+        stale_timeout=POOL_STALE_TIMEOUT,
+        timeout=POOL_CHECKOUT_TIMEOUT,
+    ))
+
+# Per-request query instrumentation: the number of queries, the rows they
+# returned or changed and the time spent in them, for the request being
+# handled on this thread (see app/ratelimit.py for its use)
+_request = threading.local()
+
+def start_request_stats():
+    _request.stats = {'queries': 0, 'rows': 0, 'db_seconds': 0.0}
+
+def stop_request_stats():
+    _request.stats = None
+
+def request_stats():
+    return getattr(_request, 'stats', None)
+
+def _instrument(pool):
+    execute_sql = pool.execute_sql
+
+    def execute_sql_measured(sql, params=None, *args, **kwargs):
+        stats = getattr(_request, 'stats', None)
+        if stats is None:
+            return execute_sql(sql, params, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            cursor = execute_sql(sql, params, *args, **kwargs)
+        finally:
+            stats['queries'] += 1
+            stats['db_seconds'] += time.perf_counter() - start
+        # -1 where the driver cannot tell, e.g. SELECTs on SQLite
+        stats['rows'] += max(cursor.rowcount, 0)
+        return cursor
+
+    pool.execute_sql = execute_sql_measured
+    return pool
+
+class RoutingDatabase(DatabaseProxy):
+    # Models are bound to this proxy. Each thread is routed to the primary
+    # unless it has been switched to a replica with use_replica().
+    __slots__ = ('obj', '_callbacks', '_Model', 'replicas', '_local', '_next_replica')
+
+    def __init__(self, primary, replicas=()):
+        super().__init__()
+        self.initialize(primary)
+        self.replicas = list(replicas)
+        self._local = threading.local()
+        self._next_replica = itertools.count()
+
+    @property
+    def primary(self):
+        return self.obj
+
+    def current(self):
+        return getattr(self._local, 'database', None) or self.obj
+
+    def use_replica(self):
+        if self.replicas:
+            index = next(self._next_replica) % len(self.replicas)
+            self._local.database = self.replicas[index]
+
+    def use_primary(self):
+        self._local.database = None
+
+    def __getattr__(self, attr):
+        return getattr(self.current(), attr)
+
+    def __enter__(self):
+        return self.current().__enter__()
+
+    def __exit__(self, *args):
+        return self.current().__exit__(*args)
+
+primary = open_pool(os.environ.get('DB_URL'))
+db = RoutingDatabase(
+    primary,
+    [open_pool(url.strip()) for url in os.environ.get('DB_REPLICA_URL', '').split(',') if url.strip()],
+)
+
+_stats_lock = threading.Lock()
+_stats = {}
+# When each idle connection was last checked in, keyed by the entry the pool
+# keeps it in. The pool makes a new entry at every check-in and drops it when
+# it hands the connection out again or closes it, taking its time with it.
+_last_checkin = weakref.WeakKeyDictionary()
+
+def _counters(pool):
+    return _stats.setdefault(pool, {
+        'checkouts': 0,
+        'checkout_timeouts': 0,
+        'checkout_wait_seconds': 0.0,
+        'recycled_idle': 0,
+    })
+
+def _checkout(pool):
+    start = time.perf_counter()
+    try:
+        pool.connect()
+    except MaxConnectionsExceeded:
+        with _stats_lock:
+            _counters(pool)['checkout_timeouts'] += 1
+        raise
+    with _stats_lock:
+        counters = _counters(pool)
+        counters['checkouts'] += 1
+        counters['checkout_wait_seconds'] += time.perf_counter() - start
+
+def connect_db():
+    pool = db.current()
+    if not pool.is_closed():
+        return
+    try:
+        _checkout(pool)
+    except (MaxConnectionsExceeded, OperationalError):
+        if pool is db.primary:
+            raise
+        # An unavailable replica should not fail the read; serve it from the primary
+        db.use_primary()
+        connect_db()
+
+def close_db():
+    pool = db.current()
+    db.use_primary()
+    if pool.is_closed():
+        return
+    conn = pool.connection()
+    pool.close()
+    with pool._pool_lock:
+        for entry in pool._connections:
+            if entry[2] is conn:
+                _last_checkin[entry[1]] = time.time()
+    recycle_idle(pool)
+
+def read_only(fn):
+    # Lets a non-GET handler that only reads (e.g. a lookup with a long JSON
+    # body) be routed to a replica like a GET
+    fn.read_only = True
+    return fn
+
+def use_replica():
+    db.use_replica()
+
+def use_primary():
+    db.use_primary()
+
+def all_pools():
+    return [db.primary, *db.replicas]
+
+def warm_pool():
+    # Open POOL_MIN_SIZE connections up front so the first requests a worker
+    # serves do not pay the connection setup cost.
+    for pool in all_pools():
+        with pool._pool_lock:
+            missing = POOL_MIN_SIZE - len(pool._connections) - len(pool._in_use)
+            for _ in range(max(missing, 0)):
+                conn = pool._connect()
+                pool._close(conn)
+
+def cooperative_waits():
+    # For gevent workers: psycopg2 would otherwise block the whole worker,
+    # every greenlet in it, while it waits on Postgres. With a wait callback
+    # it waits on the socket through gevent and the other greenlets run.
+    from gevent.socket import wait_read, wait_write
+    from psycopg2 import extensions
+
+    def wait(conn, timeout=None):
+        while True:
+            state = conn.poll()
+            if state == extensions.POLL_OK:
+                return
+            if state == extensions.POLL_READ:
+                wait_read(conn.fileno(), timeout=timeout)
+            elif state == extensions.POLL_WRITE:
+                wait_write(conn.fileno(), timeout=timeout)
+            else:
+                raise OperationalError(f"Unexpected poll() state {state}")
+
+    extensions.set_wait_callback(wait)
+
+def close_pools():
+    # Run as a gunicorn worker exits or gives up on a request, and in the
+    # master before it forks (see gunicorn.conf.py). A statement still running
+    # on a checked-out connection is cancelled first, so Postgres stops it
+    # rather than finishing it for a worker that is going away.
+    for pool in all_pools():
+        with pool._pool_lock:
+            for pool_conn in list(pool._in_use.values()):
+                try:
+                    pool_conn.connection.cancel()
+                except (AttributeError, psycopg2.Error):
+                    pass
+            pool.close_all()
+
+def recycle_idle(pool):
+    cutoff = time.time() - POOL_IDLE_TIMEOUT
+    with pool._pool_lock:
+        idle = sorted(pool._connections, key=lambda entry: _last_checkin.get(entry[1], entry[0]))
+        surplus = len(idle) + len(pool._in_use) - POOL_MIN_SIZE
+        keep = []
+        for entry in idle:
+            conn = entry[2]
+            if surplus > 0 and _last_checkin.get(entry[1], entry[0]) < cutoff:
+                pool._close(conn, close_conn=True)
+                surplus -= 1
+                with _stats_lock:
+                    _counters(pool)['recycled_idle'] += 1
+            else:
+                keep.append(entry)
+        heapq.heapify(keep)
+        pool._connections = keep
+
+def _pool_stats(pool):
+    with pool._pool_lock:
+        idle = len(pool._connections)
+        in_use = len(pool._in_use)
+    with _stats_lock:
+        counters = dict(_counters(pool))
+    return {
+        'min_size': POOL_MIN_SIZE,
+        'max_size': POOL_MAX_SIZE,
+        'in_use': in_use,
+        'idle': idle,
+        **counters,
+    }
+
+def pool_stats():
+    return {
+        'primary': _pool_stats(db.primary),
+        'replicas': [_pool_stats(replica) for replica in db.replicas],
+    }
@@ -0,0 +1,284 @@
+import argparse
+import collections
+import contextlib
+import datetime
+import importlib
+import pkgutil
+import sys
+from peewee import CharField, DatabaseError, DateTimeField, Model, PostgresqlDatabase, sort_models
+from app import migrations
+from app.database import db
+from app.models import Coins, Duties, KSB, CoinDuties, KsbDuties, Users
+
+# Versioned schema migrations. Each module in app/migrations is named
+# NNNN_description.py and defines up(m) and down(m), which describe their
+# changes through a Migrator. Applied versions are kept in schema_migrations.
+#
+#   python -m app.migrate status
+#   python -m app.migrate up [--to VERSION] [--dry-run]
+#   python -m app.migrate down [--to VERSION] [--dry-run]
+#   python -m app.migrate check
+
+MODELS = [Coins, Duties, KSB, CoinDuties, KsbDuties, Users]
+# Advisory lock key that keeps two deploys from migrating at the same time
+LOCK_KEY = 718_204_001
+
+Migration = collections.namedtuple('Migration', ('version', 'name', 'module'))
+Statement = collections.namedtuple('Statement', ('sql', 'params', 'transactional', 'cleanup'))
+
+class SchemaMigration(Model):
+    version = CharField(primary_key=True)
+    name = CharField()
+    applied_at = DateTimeField(default=datetime.datetime.now)
+
+    class Meta:
+        database = db
+        table_name = "schema_migrations"
+
+class Migrator:
+    # Collects the statements a migration would run instead of running them,
+    # so a plan can be executed, printed for a dry run, or replayed to learn
+    # which columns and indexes the applied migrations added outside the models
+    def __init__(self, database):
+        self.database = database
+        self.postgres = isinstance(database, PostgresqlDatabase)
+        self.statements = []
+        self.columns = {}
+        self.indexes = {}
+
+    def sql(self, sql, params=None, transactional=True, cleanup=None):
+        self.statements.append(Statement(sql, params or [], transactional, cleanup))
+
+    def create_tables(self, *models):
+        for model in sort_models(models):
+            self.sql(*model._schema._create_table(safe=True).query())
+            for index in model._schema._create_indexes(safe=True):
+                self.sql(*index.query())
+
+    def drop_tables(self, *models):
+        for model in reversed(sort_models(models)):
+            self.sql(*model._schema._drop_table(safe=True).query())
+
+    def add_column(self, table, column, definition):
+        self.sql(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS "{column}" {definition}')
+        self.columns[table, column] = True
+
+    def drop_column(self, table, column):
+        self.sql(f'ALTER TABLE "{table}" DROP COLUMN IF EXISTS "{column}"')
+        self.columns[table, column] = False
+
+    def create_index(self, table, name, expressions, unique=False, using=None, concurrently=True):
+        # On Postgres indexes are built CONCURRENTLY by default, which does not
+        # block writes but cannot run inside a transaction. A failed concurrent
+        # build leaves an invalid index behind, so it is dropped again.
+        concurrently = concurrently and self.postgres
+        self.sql(
+            f"CREATE {'UNIQUE ' if unique else ''}INDEX {'CONCURRENTLY ' if concurrently else ''}"
+            f'IF NOT EXISTS "{name}" ON "{table}" {f"USING {using} " if using else ""}({", ".join(expressions)})',
+            transactional=not concurrently,
+            cleanup=f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"' if concurrently else None,
+        )
+        self.indexes[table, name] = True
+
+    def drop_index(self, table, name, concurrently=True):
+        concurrently = concurrently and self.postgres
+        self.sql(f'DROP INDEX {"CONCURRENTLY " if concurrently else ""}IF EXISTS "{name}"', transactional=not concurrently)
+        self.indexes[table, name] = False
+
+    def has_extension(self, name):
+        # Whether the server can install the extension, not whether it is installed
+        if not self.postgres:
+            return False
+        cursor = self.database.execute_sql("SELECT 1 FROM pg_available_extensions WHERE name = %s", (name,))
+        return cursor.fetchone() is not None
+
+def discover():
+    found = []
+    for info in pkgutil.iter_modules(migrations.__path__):
+        version, _, name = info.name.partition('_')
+        if version.isdigit():
+            module = importlib.import_module(f"{migrations.__name__}.{info.name}")
+            found.append(Migration(version, name, module))
+    return sorted(found, key=lambda migration: migration.version)
+
+def applied_versions():
+    if not SchemaMigration.table_exists():
+        return set()
+    return {row.version for row in SchemaMigration.select(SchemaMigration.version)}
+
+def plan(migration, direction):
+    migrator = Migrator(db.current())
+    getattr(migration.module, direction)(migrator)
+    return migrator
+
+@contextlib.contextmanager
+def _lock():
+    if not isinstance(db.current(), PostgresqlDatabase):
+        yield
+        return
+    db.execute_sql("SELECT pg_advisory_lock(%s)", (LOCK_KEY,))
+    try:
+        yield
+    finally:
+        db.execute_sql("SELECT pg_advisory_unlock(%s)", (LOCK_KEY,))
+
+def _execute(statement):
+    try:
+        db.execute_sql(statement.sql, statement.params)
+    except DatabaseError:
+        if statement.cleanup:
+            db.execute_sql(statement.cleanup)
+        raise
+
+def _record(migration, direction):
+    if direction == 'up':
+        SchemaMigration.insert(version=migration.version, name=migration.name).on_conflict_ignore().execute()
+    else:
+        SchemaMigration.delete().where(SchemaMigration.version == migration.version).execute()
+
+def _run(migration, direction, dry_run, out):
+    migrator = plan(migration, direction)
+    if dry_run:
+        out.write(f"-- {migration.version}_{migration.name} ({direction})\n")
+        for statement in migrator.statements:
+            out.write(f"{statement.sql};\n")
+            if statement.params:
+                out.write(f"-- params: {statement.params}\n")
+        return
+
+    if all(statement.transactional for statement in migrator.statements):
+        with db.atomic():
+            for statement in migrator.statements:
+                _execute(statement)
+            _record(migration, direction)
+        return
+
+    # Statements that cannot run in a transaction (concurrent index builds)
+    # run one at a time. They are all idempotent (IF [NOT] EXISTS), so a
+    # migration that fails part way through can simply be run again.
+    for statement in migrator.statements:
+        if statement.transactional:
+            with db.atomic():
+                _execute(statement)
+        else:
+            _execute(statement)
+    _record(migration, direction)
+
+def migrate(target=None, dry_run=False, out=sys.stdout):
+    # Applies pending migrations up to and including `target` (default: all)
+    with _lock():
+        if not dry_run:
+            SchemaMigration.create_table(safe=True)
+        applied = applied_versions()
+        pending = [
+            migration for migration in discover()
+            if migration.version not in applied and (target is None or migration.version <= target)
+        ]
+        for migration in pending:
+            _run(migration, 'up', dry_run, out)
+        return pending
+
+def rollback(target=None, dry_run=False, out=sys.stdout):
+    # Reverts applied migrations newer than `target` (default: the latest one)
+    with _lock():
+        applied = applied_versions()
+        done = [migration for migration in discover() if migration.version in applied]
+        undo = done[-1:] if target is None else [migration for migration in done if migration.version > target]
+        undo.reverse()
+        for migration in undo:
+            _run(migration, 'down', dry_run, out)
+        return undo
+
+def _invalid_indexes():
+    if not isinstance(db.current(), PostgresqlDatabase):
+        return []
+    cursor = db.execute_sql(
+        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE NOT i.indisvalid AND n.nspname = current_schema()"
+    )
+    return [name for name, in cursor]
+
+def drift():
+    # Differences between the database and what the models, plus the columns
+    # and indexes added by applied migrations, say it should contain
+    applied = applied_versions()
+    columns = {}
+    indexes = {}
+    for model in MODELS + [SchemaMigration]:
+        table = model._meta.table_name
+        columns[table] = {field.column_name: field.null for field in model._meta.sorted_fields}
+        indexes[table] = {index._name for index in model._meta.fields_to_index()}
+
+    problems = []
+    for migration in discover():
+        if migration.version not in applied:
+            problems.append(f"migration {migration.version}_{migration.name} has not been applied")
+            continue
+        migrator = plan(migration, 'up')
+        for (table, column), present in migrator.columns.items():
+            if present:
+                columns.setdefault(table, {})[column] = None
+            else:
+                columns.get(table, {}).pop(column, None)
+        for (table, name), present in migrator.indexes.items():
+            if present:
+                indexes.setdefault(table, set()).add(name)
+            else:
+                indexes.get(table, set()).discard(name)
+
+    tables = set(db.get_tables())
+    for table, expected in columns.items():
+        if table not in tables:
+            problems.append(f"table {table} is missing")
+            continue
+        actual = {column.name: column for column in db.get_columns(table)}
+        for name, null in expected.items():
+            if name not in actual:
+                problems.append(f"column {table}.{name} is missing")
+            elif null is not None and actual[name].null != null and not actual[name].primary_key:
+                problems.append(f"column {table}.{name} is {'' if actual[name].null else 'not '}nullable in the database")
+        for name in actual.keys() - expected.keys():
+            problems.append(f"column {table}.{name} is not in the models or migrations")
+
+        primary_key = [column.name for column in actual.values() if column.primary_key]
+        actual_indexes = {index.name for index in db.get_indexes(table) if index.columns != primary_key}
+        for name in sorted(indexes.get(table, set()) - actual_indexes):
+            problems.append(f"index {name} on {table} is missing")
+        for name in sorted(actual_indexes - indexes.get(table, set())):
+            problems.append(f"index {name} on {table} is not in the models or migrations")
+
+    for name in _invalid_indexes():
+        problems.append(f"index {name} is invalid (a failed concurrent build), drop it and migrate again")
+    return problems
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.migrate", description="Manage the database schema")
+    parser.add_argument("command", choices=("status", "up", "down", "check"))
+    parser.add_argument("--to", metavar="VERSION", help="migrate up to, or down to, this version")
+    parser.add_argument("--dry-run", action="store_true", help="print the SQL instead of running it")
+    args = parser.parse_args(argv)
+
+    with db.connection_context():
+        if args.command == "status":
+            applied = applied_versions()
+            for migration in discover():
+                print(f"[{'x' if migration.version in applied else ' '}] {migration.version}_{migration.name}")
+        elif args.command == "up":
+            for migration in migrate(args.to, args.dry_run):
+                if not args.dry_run:
+                    print(f"applied {migration.version}_{migration.name}")
+        elif args.command == "down":
+            for migration in rollback(args.to, args.dry_run):
+                if not args.dry_run:
+                    print(f"reverted {migration.version}_{migration.name}")
+        else:
+            problems = drift()
+            for problem in problems:
+                print(problem)
+            if problems:
+                parser.exit(1)
+            print("schema matches the models and migrations")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+from peewee import *
+
+# The tables as app/create_tables.py used to create them. Existing databases
+# already have them, so this is a no-op there (CREATE TABLE IF NOT EXISTS).
+#
+# A snapshot of the models at the time rather than app.models, so that what
+# this migration creates does not change as the models do: later schema
+# changes (such as 0004's indexes) belong to their own migrations.
+
+class Coins(Model):
+    id = UUIDField(primary_key=True)
+    name = CharField(unique=True, null=False)
+    completed = BooleanField(null=True, constraints=[SQL("DEFAULT FALSE")])
+
+    class Meta:
+        table_name = "coins"
+
+class Duties(Model):
+    id = UUIDField(primary_key=True)
+    name = CharField(unique=True, null=False)
+    description = CharField(unique=True, null=False)
+
+    class Meta:
+        table_name = "duties"
+
+class KSB(Model):
+    id = UUIDField(primary_key=True)
+    type = CharField(constraints=[Check("type IN ('Knowledge', 'Skill', 'Behaviour')")])
+    name = CharField(unique=True, null=False)
+    description = CharField(unique=True, null=False)
+
+    class Meta:
+        table_name = "ksb"
+
+class CoinDuties(Model):
+    id = UUIDField(primary_key=True)
+    coin_id = ForeignKeyField(Coins, on_delete='Cascade', on_update='Cascade')
+    duty_id = ForeignKeyField(Duties, on_delete='Cascade', on_update='Cascade')
+
+    class Meta:
+        table_name = "coin_duties"
+        indexes = (
+            (('coin_id', 'duty_id'), True),
+        )
+
+class KsbDuties(Model):
+    id = UUIDField(primary_key=True)
+    ksb_id = ForeignKeyField(KSB, on_delete='Cascade', on_update='Cascade')
+    duty_id = ForeignKeyField(Duties, on_delete='Cascade', on_update='Cascade')
+
+    class Meta:
+        table_name = "ksb_duties"
+        indexes = (
+            (('duty_id', 'ksb_id'), True),
+        )
+
+class Users(Model):
+    id = UUIDField(primary_key=True)
+    username = CharField(unique=True, null=False)
+    password = CharField(null=False)
+    is_admin = BooleanField(null=False)
+
+    class Meta:
+        table_name = "users"
+
+TABLES = [Coins, Duties, KSB, CoinDuties, KsbDuties, Users]
+
+def up(m):
+    with m.database.bind_ctx(TABLES):
+        m.create_tables(*TABLES)
+
+def down(m):
+    with m.database.bind_ctx(TABLES):
+        m.drop_tables(*TABLES)
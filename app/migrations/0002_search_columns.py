@@ -0,0 +1,23 @@
+# Weighted tsvector columns kept current by Postgres, with GIN indexes, for
+# full-text search (app/search.py)
+
+SEARCH_VECTOR = (
+    "tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', name), 'A') || "
+    "setweight(to_tsvector('english', description), 'B')"
+    ") STORED"
+)
+
+def up(m):
+    if not m.postgres:
+        return
+    for table in ('duties', 'ksb'):
+        m.add_column(table, 'search', SEARCH_VECTOR)
+        m.create_index(table, f"{table}_search", ['search'], using='GIN')
+
+def down(m):
+    if not m.postgres:
+        return
+    for table in ('duties', 'ksb'):
+        m.drop_index(table, f"{table}_search")
+        m.drop_column(table, 'search')
@@ -0,0 +1,20 @@
+# Case-insensitive and fuzzy name lookups for the v2 routes (app/names.py).
+# The trigram index needs the pg_trgm extension; where the server does not
+# ship it, fuzzy matching reports itself unavailable instead.
+
+def up(m):
+    if not m.postgres:
+        return
+    for table in ('duties', 'ksb'):
+        m.create_index(table, f"{table}_name_lower", ['lower(name)'])
+    if m.has_extension('pg_trgm'):
+        m.sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for table in ('duties', 'ksb'):
+            m.create_index(table, f"{table}_name_trgm", ['lower(name) gist_trgm_ops'], using='GIST')
+
+def down(m):
+    if not m.postgres:
+        return
+    for table in ('duties', 'ksb'):
+        m.drop_index(table, f"{table}_name_trgm")
+        m.drop_index(table, f"{table}_name_lower")
@@ -0,0 +1,11 @@
+# The link tables' unique indexes lead with coin_id and duty_id, so lookups
+# from the other side (the coins of a duty, the duties of a KSB) get covering
+# indexes of their own and can be answered by index-only scans
+
+def up(m):
+    m.create_index('coin_duties', 'coinduties_duty_id_coin_id', ['duty_id', 'coin_id'])
+    m.create_index('ksb_duties', 'ksbduties_ksb_id_duty_id', ['ksb_id', 'duty_id'])
+
+def down(m):
+    m.drop_index('coin_duties', 'coinduties_duty_id_coin_id')
+    m.drop_index('ksb_duties', 'ksbduties_ksb_id_duty_id')
@@ -0,0 +1,33 @@
+# Per-coin KSB coverage by type, through the coin's duties, for
+# /api/v1/analytics/coverage (app/analytics.py). The unique index lets the
+# view be refreshed CONCURRENTLY, without blocking readers.
+
+COVERAGE_VIEW = """
+CREATE MATERIALIZED VIEW IF NOT EXISTS coin_coverage AS
+SELECT
+    coins.id AS coin_id,
+    coins.name AS coin_name,
+    count(DISTINCT coin_duties.duty_id) AS duties,
+    count(DISTINCT ksb.id) FILTER (WHERE ksb.type = 'Knowledge') AS knowledge,
+    count(DISTINCT ksb.id) FILTER (WHERE ksb.type = 'Skill') AS skill,
+    count(DISTINCT ksb.id) FILTER (WHERE ksb.type = 'Behaviour') AS behaviour,
+    count(DISTINCT ksb.id) AS ksbs,
+    now() AS refreshed_at
+FROM coins
+LEFT JOIN coin_duties ON coin_duties.coin_id = coins.id
+LEFT JOIN ksb_duties ON ksb_duties.duty_id = coin_duties.duty_id
+LEFT JOIN ksb ON ksb.id = ksb_duties.ksb_id
+GROUP BY coins.id, coins.name
+"""
+
+def up(m):
+    if not m.postgres:
+        return
+    m.sql(COVERAGE_VIEW)
+    m.sql('CREATE UNIQUE INDEX IF NOT EXISTS "coin_coverage_coin_id" ON coin_coverage (coin_id)')
+    m.sql('CREATE INDEX IF NOT EXISTS "coin_coverage_coin_name" ON coin_coverage (coin_name)')
+
+def down(m):
+    if not m.postgres:
+        return
+    m.sql("DROP MATERIALIZED VIEW IF EXISTS coin_coverage")
@@ -0,0 +1,21 @@
+# Rate limit counters for the database:// limiter storage (app/ratelimit.py).
+# Unlogged: they are written on most requests and not worth keeping through
+# a crash.
+
+def up(m):
+    if not m.postgres:
+        return
+    m.sql(
+        "CREATE UNLOGGED TABLE IF NOT EXISTS rate_limits ("
+        "key text NOT NULL, "
+        "bucket bigint NOT NULL, "
+        "count integer NOT NULL, "
+        "expires_at double precision NOT NULL, "
+        "PRIMARY KEY (key, bucket))"
+    )
+    m.create_index('rate_limits', "rate_limits_expires_at", ['expires_at'])
+
+def down(m):
+    if not m.postgres:
+        return
+    m.sql("DROP TABLE IF EXISTS rate_limits")
@@ -1,10 +1,11 @@
 from peewee import *
 from app.database import db
+from app.ids import new_id
 from app.models.coins import Coins
 from app.models.duties import Duties
 
 class CoinDuties(Model):
-    id = UUIDField(primary_key=True)
+    id = UUIDField(primary_key=True, default=new_id)
     coin_id = ForeignKeyField(Coins, on_delete='Cascade', on_update='Cascade', backref='coin_duties')
     duty_id = ForeignKeyField(Duties, on_delete='Cascade', on_update='Cascade', backref='coin_duties')
 
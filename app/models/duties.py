@@ -1,8 +1,9 @@
 from peewee import *
 from app.database import db
+from app.ids import new_id
 
 class Duties(Model):
-    id = UUIDField(primary_key=True)
+    id = UUIDField(primary_key=True, default=new_id)
     name = CharField(unique=True, null=False)
     description = CharField(unique=True, null=False)
 
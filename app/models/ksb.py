@@ -1,8 +1,9 @@
 from peewee import *
 from app.database import db
+from app.ids import new_id
 
 class KSB(Model):
-    id = UUIDField(primary_key=True)
+    id = UUIDField(primary_key=True, default=new_id)
     type = CharField(
             constraints=[
                 Check("type IN ('Knowledge', 'Skill', 'Behaviour')")
@@ -1,10 +1,11 @@
 from peewee import *
 from app.database import db
+from app.ids import new_id
 from app.models.duties import Duties
 from app.models.ksb import KSB
 
 class KsbDuties(Model):
-    id = UUIDField(primary_key=True)
+    id = UUIDField(primary_key=True, default=new_id)
     ksb_id = ForeignKeyField(KSB, on_delete='Cascade', on_update='Cascade', backref='ksb_duty')
     duty_id = ForeignKeyField(Duties, on_delete='Cascade', on_update='Cascade', backref='ksb_duty')
 
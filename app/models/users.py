@@ -1,8 +1,9 @@
 from peewee import *
 from app.database import db
+from app.ids import new_id
 
 class Users(Model):
-    id = UUIDField(primary_key=True)
+    id = UUIDField(primary_key=True, default=new_id)
     username = CharField(unique=True, null=False)
     password = CharField(null=False)
     is_admin = BooleanField(null=False)
@@ -0,0 +1,17 @@
+# Single-statement writes for the v1 handlers
+
+def update_returning(model, id, data, columns):
+    # One UPDATE ... SET <only the given columns> ... RETURNING the row,
+    # instead of fetching it, saving it and fetching it again. Returns the
+    # updated row as a dict, or None when no row has this id.
+    changes = {getattr(model, column): data[column] for column in columns if column in data}
+    if not changes:
+        return model.select().where(model.id == id).dicts().first()
+    query = model.update(changes).where(model.id == id).returning(*model._meta.sorted_fields)
+    return next(iter(query.dicts().execute()), None)
+
+def delete_returning(model, id):
+    # One DELETE ... RETURNING the deleted row instead of a get and a
+    # delete_instance(). Returns None when no row has this id.
+    query = model.delete().where(model.id == id).returning(*model._meta.sorted_fields)
+    return next(iter(query.dicts().execute()), None)
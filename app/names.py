@@ -0,0 +1,29 @@
+from peewee import Expression, ProgrammingError, fn
+from app.database import db
+from app.models import Duties, KSB
+
+# Case-insensitive and fuzzy (pg_trgm) name resolution for the v2 routes.
+# lower(name) has a btree index for exact lookups and a trigram GiST index
+# for nearest-name suggestions (see app/migrations/0003_name_indexes.py).
+
+# Most "did you mean" suggestions returned for an unknown name
+MAX_SUGGESTIONS = 5
+
+class FuzzyUnavailable(Exception):
+    pass
+
+def similar_names(model, name):
+    # `%` (doubled for the driver) keeps names above pg_trgm's similarity
+    # threshold, 0.3 by default, and `<->` walks the GiST index nearest first
+    lowered = fn.lower(model.name)
+    query = (model
+        .select(model.name)
+        .where(Expression(lowered, '%%', fn.lower(name)))
+        .order_by(Expression(lowered, '<->', fn.lower(name)), model.name)
+        .limit(MAX_SUGGESTIONS))
+    try:
+        with db.atomic():
+            return [row.name for row in query]
+    except ProgrammingError:
+        # The pg_trgm operators are missing
+        raise FuzzyUnavailable("Fuzzy matching is not available")
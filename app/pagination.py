@@ -0,0 +1,59 @@
+import base64
+import binascii
+import json
+from flask import request
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+class PaginationError(ValueError):
+    pass
+
+def is_paginated():
+    return 'limit' in request.args or 'cursor' in request.args
+
+def _key_name(key):
+    # A model field, or the name of a computed sort key
+    return getattr(key, 'name', key)
+
+def encode_cursor(key, value):
+    payload = json.dumps({_key_name(key): value}, default=str).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+def decode_cursor(key, cursor, expected=str):
+    # `expected` is the type the key's value must have; anything else (or a
+    # string Postgres cannot hold) would only fail once it reached the query
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value = json.loads(payload)[_key_name(key)]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise PaginationError("The provided cursor is invalid")
+    if not isinstance(value, expected) or (isinstance(value, str) and '\x00' in value):
+        raise PaginationError("The provided cursor is invalid")
+    return value
+
+def page_size():
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE)
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise PaginationError("Limit must be an integer")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise PaginationError(f"Limit must be between 1 and {MAX_PAGE_SIZE}")
+    return limit
+
+def paginate(query, key):
+    # Keyset pagination: seek past the last key of the previous page using
+    # the index on `key` instead of counting rows with OFFSET.
+    # `key` must be unique and every row must expose it by name.
+    limit = page_size()
+    cursor = request.args.get('cursor')
+    if cursor:
+        query = query.where(key > decode_cursor(key, cursor))
+    rows = list(query.order_by(key).limit(limit + 1))
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(key, rows[-1][key.name])
+    return rows, next_cursor
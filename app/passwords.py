@@ -0,0 +1,250 @@
+import concurrent.futures
+import fcntl
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import bcrypt
+from concurrent.futures.process import BrokenProcessPool
+
+# bcrypt is slow on purpose (a few hundred ms at cost 12), so a burst of
+# logins can stall every worker. Two host-wide limits keep some workers free
+# for other requests: only PASSWORD_HASH_SLOTS hashes run at once across every
+# worker on the host, and only PASSWORD_HASH_MAX_PENDING may be queued or
+# running. Past the second, a request is turned away with HashingUnavailable
+# (a 503) straight away; a queued one waits at most PASSWORD_HASH_QUEUE_TIMEOUT
+# seconds for a slot. Both are kept with flock()ed files, which the OS
+# releases if a worker dies holding one.
+#
+# Hashes run in a small process pool per worker, so a gthread or gevent worker
+# keeps serving its other requests meanwhile. A sync worker can serve nothing
+# else while it waits either way, so with PASSWORD_HASH_PROCESSES=0 (what
+# gunicorn.conf.py sets for it) it hashes inline instead.
+
+def default_limits(workers, processes):
+    # Half of the host's hashing capacity (a process of each worker, or the
+    # worker itself when it hashes inline) may hash at once, and three
+    # quarters be queued or running, leaving the rest for other requests
+    capacity = workers * max(processes, 1)
+    return max(capacity // 2, 1), max(capacity * 3 // 4, 1)
+
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+PASSWORD_HASH_PROCESSES = int(os.environ.get('PASSWORD_HASH_PROCESSES', 1))
+_default_slots, _default_pending = default_limits(int(os.environ.get('WEB_CONCURRENCY', 4)), PASSWORD_HASH_PROCESSES)
+PASSWORD_HASH_SLOTS = int(os.environ.get('PASSWORD_HASH_SLOTS', _default_slots))
+PASSWORD_HASH_MAX_PENDING = max(int(os.environ.get('PASSWORD_HASH_MAX_PENDING', _default_pending)), PASSWORD_HASH_SLOTS)
+# Seconds a queued request waits for a slot before a 503
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.environ.get('PASSWORD_HASH_QUEUE_TIMEOUT', 1))
+# Seconds a request waits for its hash once it has a slot before a 503
+PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+PASSWORD_HASH_SLOT_DIR = os.environ.get(
+    'PASSWORD_HASH_SLOT_DIR', os.path.join(tempfile.gettempdir(), "password-hash-slots"))
+# How often a queued request retries the slot files
+SLOT_POLL_SECONDS = 0.02
+
+class HashingUnavailable(Exception):
+    pass
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+# A worker holds no more slots than it has processes to hash in, so every
+# slot held is a hash actually running rather than one queued in the pool
+_running = threading.BoundedSemaphore(max(PASSWORD_HASH_PROCESSES, 1))
+_stats_lock = threading.Lock()
+_stats = {
+    'hashes': 0,
+    'checks': 0,
+    'rehashes': 0,
+    'rejected': 0,
+    'timeouts': 0,
+    'queue_wait_seconds': 0.0,
+    'hash_seconds': 0.0,
+}
+
+def _executor():
+    # Created lazily, and again after a fork, so each worker gets its own.
+    # Spawned rather than forked, as the worker may already have threads. The
+    # pool is handed bcrypt's own functions, so its processes import bcrypt
+    # and nothing of the app.
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = concurrent.futures.ProcessPoolExecutor(
+                PASSWORD_HASH_PROCESSES, mp_context=multiprocessing.get_context('spawn'))
+            _pool_pid = os.getpid()
+        return _pool
+
+def _reset_executor(broken):
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+
+def _count(counter, amount=1):
+    with _stats_lock:
+        _stats[counter] += amount
+
+def _claim(kind, count, deadline):
+    # Returns one of the `count` locked files of this kind, or None if none
+    # came free by the deadline
+    os.makedirs(PASSWORD_HASH_SLOT_DIR, exist_ok=True)
+    while True:
+        for number in range(count):
+            fd = os.open(os.path.join(PASSWORD_HASH_SLOT_DIR, f"{kind}-{number}"), os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            return fd
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        time.sleep(min(SLOT_POLL_SECONDS, remaining))
+
+def _claim_slot(deadline):
+    return _claim("slot", PASSWORD_HASH_SLOTS, deadline)
+
+def _claim_pending():
+    return _claim("pending", PASSWORD_HASH_MAX_PENDING, time.monotonic())
+
+def _acquire(deadline):
+    # Takes a place in the queue, then queues for a process of this worker
+    # and a slot on the host. Returns the function that gives all of them
+    # back; closing a file releases its lock.
+    pending = _claim_pending()
+    if pending is None:
+        _count('rejected')
+        raise HashingUnavailable("Too many password checks in progress")
+    if not _running.acquire(timeout=max(deadline - time.monotonic(), 0)):
+        os.close(pending)
+        _count('rejected')
+        raise HashingUnavailable("Too many password checks in progress")
+    slot = _claim_slot(deadline)
+    if slot is None:
+        _running.release()
+        os.close(pending)
+        _count('rejected')
+        raise HashingUnavailable("Too many password checks in progress")
+
+    def release():
+        os.close(slot)
+        _running.release()
+        os.close(pending)
+
+    return release
+
+def _run(counter, fn, *args, wait=None):
+    # `wait` is how long to queue for a slot, PASSWORD_HASH_QUEUE_TIMEOUT by default
+    queued = time.monotonic()
+    release = _acquire(queued + (PASSWORD_HASH_QUEUE_TIMEOUT if wait is None else wait))
+    started = time.monotonic()
+    _count('queue_wait_seconds', started - queued)
+
+    lock = threading.Lock()
+    done = False
+
+    def finished(_=None):
+        # Called both by the future's callback and by the request once the
+        # hash is done, as the callback can still be running after result()
+        # has returned; the slot is back by the time either call returns
+        nonlocal done
+        with lock:
+            if not done:
+                done = True
+                release()
+                _count('hash_seconds', time.monotonic() - started)
+
+    if PASSWORD_HASH_PROCESSES == 0:
+        try:
+            result = fn(*args)
+        finally:
+            finished()
+    else:
+        executor = _executor()
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            finished()
+            _reset_executor(executor)
+            raise HashingUnavailable("The password hashing pool stopped")
+        # The slot stays held until the hash is done, even if this request
+        # stops waiting for it, so a timeout does not let more hashes run
+        future.add_done_callback(finished)
+        try:
+            result = future.result(timeout=PASSWORD_HASH_TIMEOUT)
+        except concurrent.futures.TimeoutError:
+            _count('timeouts')
+            raise HashingUnavailable("Timed out waiting for a password check")
+        except BrokenProcessPool:
+            _reset_executor(executor)
+            raise HashingUnavailable("The password hashing pool stopped")
+        finally:
+            if future.done():
+                finished()
+    _count(counter)
+    return result
+
+def hash_password(password, wait=None):
+    # Raises ValueError for passwords bcrypt cannot hash (over 72 bytes)
+    hashed = _run('hashes', bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt(BCRYPT_ROUNDS), wait=wait)
+    return hashed.decode('utf-8')
+
+def check_password(hashed, password):
+    try:
+        return _run('checks', bcrypt.checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+    except ValueError:
+        # Too long to have been hashed, or not a bcrypt hash
+        return False
+
+def needs_rehash(hashed):
+    try:
+        return int(hashed.split('$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+def rehash_if_needed(hashed, password):
+    # After a successful check, returns a new hash at BCRYPT_ROUNDS if the
+    # stored one used another cost, else None. Skipped (None) rather than
+    # queued when no slot is free: the login has already succeeded and the
+    # next one can try again.
+    if not needs_rehash(hashed):
+        return None
+    try:
+        new_hash = hash_password(password, wait=0)
+    except HashingUnavailable:
+        return None
+    _count('rehashes')
+    return new_hash
+
+def warm_password_pool():
+    # Starts the pool's processes up front, so the first login a worker
+    # serves does not wait for them to spawn
+    if PASSWORD_HASH_PROCESSES == 0:
+        return
+    executor = _executor()
+    for future in [executor.submit(time.time) for _ in range(PASSWORD_HASH_PROCESSES)]:
+        future.result()
+
+def shutdown_password_pool():
+    # Stops this worker's hashing processes as it exits, without waiting for
+    # queued hashes. A pool inherited over fork is not this worker's to stop.
+    global _pool
+    with _pool_lock:
+        pool = _pool if _pool_pid == os.getpid() else None
+        _pool = None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def hashing_stats():
+    with _stats_lock:
+        counters = dict(_stats)
+    return {
+        'rounds': BCRYPT_ROUNDS,
+        'processes': PASSWORD_HASH_PROCESSES,
+        'slots': PASSWORD_HASH_SLOTS,
+        'max_pending': PASSWORD_HASH_MAX_PENDING,
+        **counters,
+    }
@@ -0,0 +1,474 @@
+import fcntl
+import functools
+import hashlib
+import logging
+import math
+import mmap
+import os
+import random
+import struct
+import tempfile
+import threading
+import time
+import urllib.parse
+from flask import current_app, request
+from limits.storage import SlidingWindowCounterSupport, Storage
+from peewee import DatabaseError, PostgresqlDatabase
+from app.database import db, request_stats
+from app.pagination import is_paginated
+from app.streaming import wants_stream
+
+logger = logging.getLogger(__name__)
+
+# Rate limit storage shared by every worker, so a limit holds for the whole
+# server rather than for each worker separately, and survives worker
+# restarts. Two backends are registered with the limits package:
+#
+#   mmap://[/directory]  a counter table in a memory-mapped file (the default)
+#   database://          the rate_limits table in the app's own database
+#
+# Both count in fixed windows aligned to the epoch and support the sliding
+# window counter strategy, which weights the previous window's count by how
+# much of it still overlaps the sliding window.
+
+RATELIMIT_STORAGE_URI = os.environ.get('RATELIMIT_STORAGE_URI', "mmap://")
+RATELIMIT_STRATEGY = os.environ.get('RATELIMIT_STRATEGY', "sliding-window-counter")
+# Distinct limit keys (client and limit) the mmap table holds at once; when
+# it fills up the key closest to expiring is dropped
+RATELIMIT_MMAP_SLOTS = int(os.environ.get('RATELIMIT_MMAP_SLOTS', 8192))
+# Processes that may use the mmap table at the same time. By default room for
+# two generations of gunicorn workers, as old and new ones overlap during a
+# HUP reload, and two more, e.g. for a management command.
+RATELIMIT_MMAP_WORKERS = int(os.environ.get(
+    'RATELIMIT_MMAP_WORKERS', 2 * int(os.environ.get('WEB_CONCURRENCY', 4)) + 2))
+RATELIMIT_MMAP_DIR = os.environ.get('RATELIMIT_MMAP_DIR', tempfile.gettempdir())
+
+# How much a request takes from the default limits: 'static' charges each
+# route its weight (see rate_limit_cost) before it runs; 'measured' checks
+# the weight is left before it runs and charges afterwards by what it cost
+# the database, if that was more
+RATELIMIT_COST_MODE = os.environ.get('RATELIMIT_COST_MODE', "static")
+# In measured mode, rows returned or changed, and milliseconds spent in the
+# database, that cost one request's worth of the limit
+RATELIMIT_ROWS_PER_UNIT = int(os.environ.get('RATELIMIT_ROWS_PER_UNIT', 100))
+RATELIMIT_DB_MS_PER_UNIT = float(os.environ.get('RATELIMIT_DB_MS_PER_UNIT', 10))
+# Most one request is charged, so no single request can use up a client's limit
+RATELIMIT_MAX_COST = int(os.environ.get('RATELIMIT_MAX_COST', 50))
+
+# Slots a key may be stored in, starting from the one its hash points at
+MAX_PROBES = 16
+# How often a process that found no free mmap column tries again
+CLAIM_RETRY_SECONDS = 10
+
+def _window(expiry, now):
+    return int(now // expiry)
+
+def _sliding_window(expiry, now, previous_count, current_count):
+    # The same (count, seconds left) pairs as limits' in-memory storage
+    if previous_count:
+        previous_ttl = (1 - (((now - expiry) / expiry) % 1)) * expiry
+    else:
+        previous_ttl = 0.0
+    current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+    return previous_count, previous_ttl, current_count, current_ttl
+
+def _allowed(expiry, limit, amount, previous_count, previous_ttl, current_count):
+    return math.floor(previous_count * previous_ttl / expiry + current_count) + amount <= limit
+
+# COSTS
+
+def rate_limit_cost(weight):
+    # Marks a view that costs the database more than a point lookup, e.g. one
+    # reading the whole catalog, so it takes `weight` hits from the default
+    # limits. `weight` may be a function, called for each request to the view.
+    def decorator(fn):
+        fn.rate_limit_cost = weight
+        return fn
+    return decorator
+
+def list_cost():
+    # The weight of a list route, by what it was asked for: the whole table,
+    # unpaginated or streamed, as much as the other whole-catalog reads; up to
+    # MAX_BULK_IDS rows by ?ids= as a bulk request; a page as one request
+    if 'ids' in request.args:
+        return 10
+    if wants_stream() or not is_paginated():
+        return 20
+    return 1
+
+def request_cost():
+    # Passed to Flask-Limiter as default_limits_cost. In measured mode it is
+    # asked again after the view has run, by when request_stats() holds what
+    # the request's queries cost.
+    view = current_app.view_functions.get(request.endpoint)
+    weight = getattr(view, 'rate_limit_cost', 1)
+    if callable(weight):
+        weight = weight()
+    stats = request_stats()
+    if RATELIMIT_COST_MODE != "measured" or stats is None:
+        return weight
+    measured = max(
+        math.ceil(stats['rows'] / RATELIMIT_ROWS_PER_UNIT),
+        math.ceil(stats['db_seconds'] * 1000 / RATELIMIT_DB_MS_PER_UNIT),
+    )
+    cost = min(max(weight, measured), RATELIMIT_MAX_COST)
+    # Charged after the response, a cost past what a limit has left would be
+    # refused whole and not counted at all. Take what is left instead, so it
+    # is the client's next request that gets turned away.
+    remaining = [
+        limit.remaining
+        for limiter in current_app.extensions.get('limiter', ())
+        for limit in limiter.current_limits
+    ]
+    if remaining:
+        cost = min(cost, max(min(remaining), 1))
+    return cost
+
+def deduct_when():
+    # Passed to Flask-Limiter as default_limits_deduct_when: in measured mode
+    # every request is charged once it has run
+    if RATELIMIT_COST_MODE == "measured":
+        return lambda response: True
+    return None
+
+# MMAP STORAGE
+#
+# Each slot is a header (key fingerprint, window length, expiry) followed by
+# two cells per worker process, one for even and one for odd windows, each
+# holding (window, count). A process only ever writes its own cells, so
+# counting needs no lock shared between processes: a check reads every
+# process's cells for the key and adds up those of the current and previous
+# window. Processes claim their column with an fcntl lock, which the OS
+# releases if the process dies. Only adding a new key to the table takes a
+# lock that is shared between processes. A process that finds every column
+# taken still checks the others' counts but does not count its own hits,
+# rather than failing its requests, until a column comes free.
+#
+# As with limits' in-memory storage, hits racing in different processes at
+# the end of a window can let a limit be exceeded by a hit or two.
+
+HEADER = struct.Struct('<Qqq')
+CELL = struct.Struct('<qq')
+
+class _Table:
+    def __init__(self, path, slots, workers):
+        self.path = path
+        self.slots = slots
+        self.workers = workers
+        self.cells = struct.Struct(f'<{workers * 4}q')
+        self.slot_size = HEADER.size + self.cells.size
+        self.size = slots * self.slot_size
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self.fd).st_size < self.size:
+            os.ftruncate(self.fd, self.size)
+        self.map = mmap.mmap(self.fd, self.size)
+        self.thread_lock = threading.Lock()
+        self.pid = None
+        self.column = None
+        self.retry_at = 0.0
+
+    def needs_column(self):
+        if self.pid != os.getpid():
+            return True
+        return self.column is None and time.monotonic() >= self.retry_at
+
+    def claim_column(self):
+        # Record locks are not inherited across fork, so a forked worker
+        # claims its own column. They are placed past the end of the file.
+        self.pid, self.column = os.getpid(), None
+        for column in range(self.workers):
+            try:
+                fcntl.lockf(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, self.size + column)
+            except OSError:
+                continue
+            self.column = column
+            return
+        self.retry_at = time.monotonic() + CLAIM_RETRY_SECONDS
+        logger.warning(
+            "More than RATELIMIT_MMAP_WORKERS (%d) processes are using %s; "
+            "this process's requests are not counted against the rate limits", self.workers, self.path)
+
+    def insert_lock(self):
+        return _FileLock(self.fd, self.size + self.workers)
+
+class _FileLock:
+    def __init__(self, fd, offset):
+        self.fd = fd
+        self.offset = offset
+
+    def __enter__(self):
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, 1, self.offset)
+
+    def __exit__(self, *args):
+        fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, self.offset)
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=RATELIMIT_MMAP_SLOTS)
+def _fingerprint(key):
+    # Never 0, which marks an empty slot
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little') | 1
+
+class MmapStorage(Storage, SlidingWindowCounterSupport):
+    STORAGE_SCHEME = ["mmap"]
+
+    def __init__(self, uri=None, wrap_exceptions=False, **options):
+        directory = urllib.parse.urlparse(uri).path if uri else ""
+        # One file per layout, so changing the settings starts a new table
+        self.path = os.path.join(
+            directory or RATELIMIT_MMAP_DIR, f"rate-limits-{RATELIMIT_MMAP_SLOTS}x{RATELIMIT_MMAP_WORKERS}")
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return (OSError, ValueError)
+
+    def _table(self):
+        table = _tables.get(self.path)
+        if table is None or table.needs_column():
+            with _tables_lock:
+                table = _tables.get(self.path)
+                if table is None:
+                    table = _tables[self.path] = _Table(self.path, RATELIMIT_MMAP_SLOTS, RATELIMIT_MMAP_WORKERS)
+                if table.needs_column():
+                    table.claim_column()
+        return table
+
+    def _probe(self, table, fingerprint):
+        start = fingerprint % table.slots
+        for probe in range(MAX_PROBES):
+            offset = ((start + probe) % table.slots) * table.slot_size
+            if HEADER.unpack_from(table.map, offset)[0] == fingerprint:
+                return offset
+        return None
+
+    def _find(self, table, key):
+        return self._probe(table, _fingerprint(key))
+
+    def _find_or_add(self, table, key, expiry, now):
+        fingerprint = _fingerprint(key)
+        offset = self._probe(table, fingerprint)
+        if offset is not None:
+            return offset
+        with table.thread_lock, table.insert_lock():
+            offset = self._probe(table, fingerprint)
+            if offset is not None:
+                return offset
+            # An empty or expired slot if there is one, else the one closest to expiring
+            start = fingerprint % table.slots
+            offset = min(
+                (((start + probe) % table.slots) * table.slot_size for probe in range(MAX_PROBES)),
+                key=lambda offset: HEADER.unpack_from(table.map, offset)[2])
+            # The old key stops being found before its counts are cleared, and
+            # the new fingerprint goes in last, once the slot is ready
+            HEADER.pack_into(table.map, offset, 0, 0, 0)
+            table.map[offset + HEADER.size:offset + table.slot_size] = bytes(table.cells.size)
+            HEADER.pack_into(table.map, offset, fingerprint, expiry, (_window(expiry, now) + 2) * expiry)
+            return offset
+
+    def _counts(self, table, offset, window):
+        cells = table.cells.unpack_from(table.map, offset + HEADER.size)
+        previous = current = 0
+        for index in range(0, len(cells), 2):
+            if cells[index] == window:
+                current += cells[index + 1]
+            elif cells[index] == window - 1:
+                previous += cells[index + 1]
+        return previous, current
+
+    def _add(self, table, offset, expiry, window, amount):
+        if table.column is None:
+            return
+        cell = offset + HEADER.size + ((window % 2) * table.workers + table.column) * CELL.size
+        with table.thread_lock:
+            cell_window, count = CELL.unpack_from(table.map, cell)
+            CELL.pack_into(table.map, cell, window, count + amount if cell_window == window else amount)
+            struct.pack_into('<q', table.map, offset + 16, (window + 2) * expiry)
+
+    def incr(self, key, expiry, amount=1):
+        table = self._table()
+        now = time.time()
+        window = _window(expiry, now)
+        offset = self._find_or_add(table, key, expiry, now)
+        self._add(table, offset, expiry, window, amount)
+        return self._counts(table, offset, window)[1]
+
+    def get(self, key):
+        table = self._table()
+        offset = self._find(table, key)
+        if offset is None:
+            return 0
+        expiry = HEADER.unpack_from(table.map, offset)[1]
+        return self._counts(table, offset, _window(expiry, time.time()))[1]
+
+    def get_expiry(self, key):
+        table = self._table()
+        now = time.time()
+        offset = self._find(table, key)
+        if offset is None:
+            return now
+        expiry = HEADER.unpack_from(table.map, offset)[1]
+        return (_window(expiry, now) + 1) * expiry
+
+    def check(self):
+        self._table()
+        return True
+
+    def reset(self):
+        table = self._table()
+        with table.thread_lock, table.insert_lock():
+            used = sum(1 for slot in range(table.slots) if HEADER.unpack_from(table.map, slot * table.slot_size)[0])
+            table.map[:] = bytes(table.size)
+        return used
+
+    def clear(self, key):
+        table = self._table()
+        with table.thread_lock, table.insert_lock():
+            offset = self._find(table, key)
+            if offset is not None:
+                table.map[offset:offset + table.slot_size] = bytes(table.slot_size)
+
+    def acquire_sliding_window_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+        table = self._table()
+        now = time.time()
+        window = _window(expiry, now)
+        offset = self._find_or_add(table, key, expiry, now)
+        previous, current = self._counts(table, offset, window)
+        previous, previous_ttl, current, _ = _sliding_window(expiry, now, previous, current)
+        if not _allowed(expiry, limit, amount, previous, previous_ttl, current):
+            return False
+        self._add(table, offset, expiry, window, amount)
+        # Another process may have counted a hit meanwhile; if that took the
+        # key over its limit, this hit is taken back and refused
+        current = self._counts(table, offset, window)[1]
+        if not _allowed(expiry, limit, 0, previous, previous_ttl, current):
+            self._add(table, offset, expiry, window, -amount)
+            return False
+        return True
+
+    def get_sliding_window(self, key, expiry):
+        table = self._table()
+        now = time.time()
+        offset = self._find(table, key)
+        if offset is None:
+            return _sliding_window(expiry, now, 0, 0)
+        return _sliding_window(expiry, now, *self._counts(table, offset, _window(expiry, now)))
+
+    def clear_sliding_window(self, key, expiry):
+        self.clear(key)
+
+# DATABASE STORAGE
+#
+# Counts are rows of the unlogged rate_limits table (see
+# app/migrations/0006_rate_limits.py), one per key and window, written on the
+# primary. A hit is counted by a single INSERT ... ON CONFLICT DO UPDATE
+# whose WHERE re-checks the limit against the locked row, so concurrent hits
+# cannot take a key over its limit.
+
+# About one call in this many also deletes expired rows
+PURGE_EVERY = 1000
+
+ACQUIRE = """
+INSERT INTO rate_limits (key, bucket, count, expires_at)
+SELECT %(key)s, %(bucket)s, %(amount)s, %(expires_at)s
+WHERE floor(%(weighted)s) + %(amount)s <= %(limit)s
+ON CONFLICT (key, bucket) DO UPDATE SET count = rate_limits.count + excluded.count
+WHERE floor(%(weighted)s + rate_limits.count) + excluded.count <= %(limit)s
+RETURNING count
+"""
+
+INCR = """
+INSERT INTO rate_limits (key, bucket, count, expires_at)
+VALUES (%(key)s, %(bucket)s, %(amount)s, %(expires_at)s)
+ON CONFLICT (key, bucket) DO UPDATE SET count = rate_limits.count + excluded.count
+RETURNING count
+"""
+
+class DatabaseStorage(Storage, SlidingWindowCounterSupport):
+    STORAGE_SCHEME = ["database"]
+
+    @property
+    def base_exceptions(self):
+        return DatabaseError
+
+    def _execute(self, sql, params=()):
+        # Runs on the primary whichever database the request was routed to,
+        # returning the rows. A connection opened here is closed again.
+        database = db.primary
+        if not isinstance(database, PostgresqlDatabase):
+            raise RuntimeError("database:// rate limit storage needs PostgreSQL")
+        opened = database.is_closed()
+        if opened:
+            database.connect()
+        try:
+            if random.randrange(PURGE_EVERY) == 0:
+                database.execute_sql("DELETE FROM rate_limits WHERE expires_at < %s", (time.time(),))
+            return database.execute_sql(sql, params).fetchall()
+        finally:
+            if opened:
+                database.close()
+
+    def _buckets(self, key, expiry, now):
+        window = _window(expiry, now)
+        rows = self._execute(
+            "SELECT bucket, count FROM rate_limits WHERE key = %s AND bucket IN (%s, %s)",
+            (key, window - 1, window))
+        counts = dict(rows)
+        return counts.get(window - 1, 0), counts.get(window, 0)
+
+    def incr(self, key, expiry, amount=1):
+        window = _window(expiry, time.time())
+        rows = self._execute(INCR, {
+            'key': key, 'bucket': window, 'amount': amount, 'expires_at': (window + 1) * expiry,
+        })
+        return rows[0][0]
+
+    def get(self, key):
+        rows = self._execute(
+            "SELECT count FROM rate_limits WHERE key = %s AND expires_at > %s ORDER BY bucket DESC LIMIT 1",
+            (key, time.time()))
+        return rows[0][0] if rows else 0
+
+    def get_expiry(self, key):
+        now = time.time()
+        rows = self._execute(
+            "SELECT expires_at FROM rate_limits WHERE key = %s AND expires_at > %s ORDER BY bucket DESC LIMIT 1",
+            (key, now))
+        return rows[0][0] if rows else now
+
+    def check(self):
+        self._execute("SELECT 1")
+        return True
+
+    def reset(self):
+        return len(self._execute("DELETE FROM rate_limits RETURNING 1"))
+
+    def clear(self, key):
+        self._execute("DELETE FROM rate_limits WHERE key = %s RETURNING 1", (key,))
+
+    def acquire_sliding_window_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+        now = time.time()
+        window = _window(expiry, now)
+        previous, previous_ttl, _, _ = _sliding_window(expiry, now, *self._buckets(key, expiry, now))
+        rows = self._execute(ACQUIRE, {
+            'key': key,
+            'bucket': window,
+            'amount': amount,
+            'limit': limit,
+            'weighted': previous * previous_ttl / expiry,
+            # Kept while it still counts as the previous window
+            'expires_at': (window + 2) * expiry,
+        })
+        return bool(rows)
+
+    def get_sliding_window(self, key, expiry):
+        now = time.time()
+        return _sliding_window(expiry, now, *self._buckets(key, expiry, now))
+
+    def clear_sliding_window(self, key, expiry):
+        self.clear(key)
@@ -0,0 +1,246 @@
+import csv
+import uuid
+from peewee import JOIN, SQL, Select, Value, ValuesList, fn
+from app.ids import new_id
+
+# Most IDs accepted by one bulk relationship request
+MAX_BULK_IDS = 1000
+# Most names accepted by one batched name lookup
+MAX_BULK_NAMES = 100
+
+class BulkRequestError(ValueError):
+    pass
+
+def is_valid_id(value):
+    try:
+        uuid.UUID(str(value))
+        return True
+    except ValueError:
+        return False
+
+def normalize_id(value):
+    # The canonical form of an ID. uuid.UUID takes forms Postgres does not
+    # (urn:uuid:...), so IDs are passed on to SQL in this one; an invalid ID
+    # is kept as it is, to be reported as such.
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        return str(value)
+
+def bulk_ids(data, key, allow_empty=False, normalize=True):
+    if data is not None and not isinstance(data, dict):
+        raise BulkRequestError("The request body must be a JSON object")
+    ids = (data or {}).get(key)
+    if not isinstance(ids, list) or not (ids or allow_empty):
+        raise BulkRequestError(f"{key} must be a {'' if allow_empty else 'non-empty '}list of IDs")
+    if len(ids) > MAX_BULK_IDS:
+        raise BulkRequestError(f"{key} must contain at most {MAX_BULK_IDS} IDs")
+    # Drop repeats, keeping the order the client sent
+    return list(dict.fromkeys(normalize_id(id) if normalize else str(id) for id in ids))
+
+def bulk_names(values):
+    # Accepts repeated ?names=a&names=b, each taken as it is, or a single
+    # comma-separated ?names=a,b in which a name containing a comma is quoted
+    # as in CSV: ?names="Duty, one",b
+    if len(values) == 1:
+        values = next(csv.reader(values, skipinitialspace=True), [])
+    names = [name.strip() for name in values if name.strip()]
+    if not names:
+        raise BulkRequestError("names must be a comma-separated list of names")
+    if len(names) > MAX_BULK_NAMES:
+        raise BulkRequestError(f"names must contain at most {MAX_BULK_NAMES} names")
+    return list(dict.fromkeys(names))
+
+def linked_names(from_field, to_field, names):
+    # Maps each requested name on the `from_field` side of a link table to
+    # the names it is linked to on the `to_field` side, in one grouped query
+    link_model = from_field.model
+    source = from_field.rel_model
+    target = to_field.rel_model
+
+    query = (source
+        .select(
+            source.name,
+            fn.array_agg(target.name)
+                .order_by(target.name)
+                .filter(target.name.is_null(False))
+                .alias('linked_to'))
+        .join(link_model, JOIN.LEFT_OUTER, on=(from_field == source.id))
+        .join(target, JOIN.LEFT_OUTER, on=(to_field == target.id))
+        .where(source.name.in_(names))
+        .group_by(source.name))
+
+    linked = {row['name']: row['linked_to'] or [] for row in query.dicts()}
+    not_found = [name for name in names if name not in linked]
+    return {name: linked[name] for name in names if name in linked}, not_found
+
+def linked_name(from_field, to_field, name):
+    # Like linked_names for one name, matched case-insensitively through the
+    # lower(name) index; a row whose case matches exactly wins. Returns
+    # (stored name, linked names), or None when nothing matches.
+    link_model = from_field.model
+    source = from_field.rel_model
+    target = to_field.rel_model
+
+    row = (source
+        .select(
+            source.name,
+            fn.array_agg(target.name)
+                .order_by(target.name)
+                .filter(target.name.is_null(False))
+                .alias('linked_to'))
+        .join(link_model, JOIN.LEFT_OUTER, on=(from_field == source.id))
+        .join(target, JOIN.LEFT_OUTER, on=(to_field == target.id))
+        .where(fn.lower(source.name) == fn.lower(name))
+        .group_by(source.name)
+        .order_by((source.name == name).desc())
+        .limit(1)
+        .dicts()
+        .first())
+    if row is None:
+        return None
+    return row['name'], row['linked_to'] or []
+
+def link_many(parent_field, child_field, parent_id, child_ids):
+    # Links every existing child to the parent with a single
+    # INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING, wrapped in a
+    # statement that also reports, per requested child, whether it was
+    # linked, was already linked or does not exist.
+    link_model = parent_field.model
+    parent_model = parent_field.rel_model
+    child_model = child_field.rel_model
+    database = link_model._meta.database
+
+    valid_ids = [child_id for child_id in child_ids if is_valid_id(child_id)]
+    results = {child_id: {'id': child_id, 'name': None, 'status': "invalid_id"} for child_id in child_ids}
+    parent_name = parent_model.select(parent_model.name).where(parent_model.id == parent_id)
+
+    if not valid_ids:
+        return parent_name.scalar(), list(results.values())
+
+    requested = (ValuesList([(str(new_id()), child_id, position) for position, child_id in enumerate(valid_ids)])
+        .cte('requested', columns=('id', 'child_id', 'position')))
+    requested_child_id = requested.c.child_id.cast('uuid')
+
+    inserted = (link_model
+        .insert_from(
+            Select((requested,), (requested.c.id.cast('uuid'), parent_model.id, child_model.id))
+                .join(child_model, on=(child_model.id == requested_child_id))
+                .join(parent_model, on=(parent_model.id == parent_id)),
+            [link_model.id, parent_field, child_field])
+        .on_conflict_ignore()
+        .returning(child_field)
+        .cte('inserted'))
+
+    query = (Select((requested,), (
+            requested.c.child_id,
+            child_model.name,
+            inserted.c[child_field.column_name].is_null(False).alias('linked'),
+            parent_name.alias('parent_name')))
+        .left_outer_join(child_model, on=(child_model.id == requested_child_id))
+        .left_outer_join(inserted, on=(inserted.c[child_field.column_name] == requested_child_id))
+        .order_by(requested.c.position)
+        .with_cte(requested, inserted)
+        .bind(database))
+
+    with database.atomic():
+        rows = list(query.dicts())
+
+    for row in rows:
+        if row['linked']:
+            status = "linked"
+        elif row['name'] is not None:
+            status = "already_linked"
+        else:
+            status = "not_found"
+        results[row['child_id']] = {'id': row['child_id'], 'name': row['name'], 'status': status}
+    return rows[0]['parent_name'], list(results.values())
+
+def unlink(parent_field, child_field, parent_id, child_id):
+    # Deletes one link and looks up both names in the same statement, so a
+    # missing parent or child can be told apart from a missing link.
+    # Returns (parent_name, child_name, removed).
+    link_model = parent_field.model
+    parent_model = parent_field.rel_model
+    child_model = child_field.rel_model
+    database = link_model._meta.database
+
+    removed = (link_model
+        .delete()
+        .where((parent_field == parent_id) & (child_field == child_id))
+        .returning(link_model.id)
+        .cte('removed'))
+
+    query = (Select(columns=(
+            parent_model.select(parent_model.name).where(parent_model.id == parent_id).alias('parent_name'),
+            child_model.select(child_model.name).where(child_model.id == child_id).alias('child_name'),
+            fn.EXISTS(Select((removed,), (SQL('1'),))).alias('removed')))
+        .with_cte(removed)
+        .bind(database))
+    row = next(iter(query.dicts()))
+    return row['parent_name'], row['child_name'], row['removed']
+
+class SyncAborted(Exception):
+    pass
+
+def sync_links(parent_field, child_field, parent_id, child_ids):
+    # Makes the parent's children exactly `child_ids` (which must all be valid
+    # UUIDs) in one statement: a DELETE of links outside the target set and an
+    # INSERT ... ON CONFLICT DO NOTHING of the missing ones, reporting what
+    # changed. If any target does not exist the transaction is rolled back.
+    link_model = parent_field.model
+    parent_model = parent_field.rel_model
+    child_model = child_field.rel_model
+    database = link_model._meta.database
+    column = child_field.column_name
+
+    targets = Value(child_ids, unpack=False).cast('uuid[]')
+    link_ids = Value([str(new_id()) for _ in child_ids], unpack=False).cast('uuid[]')
+    requested = (Select(columns=[fn.unnest(link_ids).alias('id'), fn.unnest(targets).alias('child_id')])
+        .cte('requested'))
+
+    removed = (link_model
+        .delete()
+        .where((parent_field == parent_id) & (child_field != fn.ALL(targets)))
+        .returning(child_field)
+        .cte('removed'))
+
+    added = (link_model
+        .insert_from(
+            Select((requested,), (requested.c.id, parent_model.id, child_model.id))
+                .join(child_model, on=(child_model.id == requested.c.child_id))
+                .join(parent_model, on=(parent_model.id == parent_id)),
+            [link_model.id, parent_field, child_field])
+        .on_conflict_ignore()
+        .returning(child_field)
+        .cte('added'))
+
+    query = ((
+        Select((parent_model,), (Value('parent').alias('change'), parent_model.id, parent_model.name))
+            .where(parent_model.id == parent_id)
+        + Select((added,), (Value('added'), child_model.id, child_model.name))
+            .join(child_model, on=(child_model.id == added.c[column]))
+        + Select((removed,), (Value('removed'), child_model.id, child_model.name))
+            .join(child_model, on=(child_model.id == removed.c[column]))
+        + Select((requested,), (Value('not_found'), requested.c.child_id, child_model.name))
+            .left_outer_join(child_model, on=(child_model.id == requested.c.child_id))
+            .where(child_model.id.is_null()))
+        .with_cte(requested, removed, added)
+        .bind(database))
+
+    parent_name = None
+    changes = {'added': [], 'removed': [], 'not_found': []}
+    try:
+        with database.atomic():
+            for row in query.dicts():
+                if row['change'] == 'parent':
+                    parent_name = row['name']
+                elif row['change'] == 'not_found':
+                    changes['not_found'].append(row['id'])
+                else:
+                    changes[row['change']].append({'id': row['id'], 'name': row['name']})
+            if parent_name is None or changes['not_found']:
+                raise SyncAborted()
+    except SyncAborted:
+        changes['added'], changes['removed'] = [], []
+    return parent_name, changes
@@ -0,0 +1,91 @@
+import uuid
+from peewee import SQL, Column, Expression, Select, Tuple, Value, fn
+from app.database import db
+from app.models import Duties, KSB
+from app.pagination import PaginationError, decode_cursor, encode_cursor, page_size
+
+# Full-text search over duty and KSB names and descriptions. Each table has a
+# generated `search` tsvector column (names weighted above descriptions)
+# with a GIN index, so Postgres keeps it current on every insert and update
+# (see app/migrations/0002_search_columns.py).
+
+SEARCH_LANGUAGE = 'english'
+SEARCH_KINDS = ('duty', 'ksb')
+SEARCH_CURSOR_KEY = 'rank'
+SNIPPET_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxWords=35, MinWords=15, MaxFragments=2"
+
+class SearchError(ValueError):
+    pass
+
+def _matches(model, kind, tsquery):
+    search = Column(model._meta.table, 'search')
+    ksb_type = KSB.type if model is KSB else Value(None)
+    return (model
+        .select(
+            Value(kind).alias('kind'),
+            model.id,
+            model.name,
+            ksb_type.alias('type'),
+            model.description,
+            fn.ts_rank_cd(search, tsquery).alias('rank'))
+        .where(Expression(search, '@@', tsquery)))
+
+def _decode_search_cursor(cursor):
+    try:
+        rank, id = decode_cursor(SEARCH_CURSOR_KEY, cursor, list)
+        if not isinstance(rank, (int, float)) or not isinstance(id, str):
+            raise TypeError
+        return float(rank), str(uuid.UUID(id))
+    except (AttributeError, TypeError, ValueError):
+        raise PaginationError("The provided cursor is invalid")
+
+def _escape_html(text):
+    # Descriptions are stored as clients sent them. Snippets are returned as
+    # markup, so the text is escaped before ts_headline adds its <mark> tags.
+    for char, entity in (('&', '&amp;'), ('<', '&lt;'), ('>', '&gt;'), ('"', '&quot;'), ("'", '&#39;')):
+        text = fn.replace(text, char, entity)
+    return text
+
+def search(text, kinds=SEARCH_KINDS, cursor=None):
+    # One statement: match and rank every kind through its GIN index, keep
+    # one page by (rank, id) keyset, and only then build snippets for it
+    if not text or not text.strip():
+        raise SearchError("A search query is required")
+    limit = page_size()
+    tsquery = fn.websearch_to_tsquery(SEARCH_LANGUAGE, text)
+
+    models = {'duty': Duties, 'ksb': KSB}
+    branches = [_matches(models[kind], kind, tsquery) for kind in kinds]
+    matches = branches[0]
+    for branch in branches[1:]:
+        matches = matches + branch
+
+    matches = matches.alias('matches')
+    page = Select([matches], [SQL('*')])
+    if cursor:
+        rank, id = _decode_search_cursor(cursor)
+        # ts_rank_cd() is a real; compare at that precision so ties survive the JSON round trip
+        page = page.where(Tuple(matches.c.rank, matches.c.id) < Tuple(Value(rank).cast('real'), Value(id).cast('uuid')))
+    page = page.order_by(matches.c.rank.desc(), matches.c.id.desc()).limit(limit + 1).alias('page')
+
+    query = (Select([page], [
+            page.c.kind,
+            page.c.id,
+            page.c.name,
+            page.c.type,
+            fn.ts_headline(SEARCH_LANGUAGE, _escape_html(page.c.description), tsquery, SNIPPET_OPTIONS).alias('snippet'),
+            page.c.rank])
+        .order_by(page.c.rank.desc(), page.c.id.desc())
+        .bind(db))
+
+    rows = []
+    for row in query.dicts():
+        if row['type'] is None:
+            del row['type']
+        rows.append(row)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(SEARCH_CURSOR_KEY, [rows[-1]['rank'], rows[-1]['id']])
+    return rows, next_cursor
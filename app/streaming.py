@@ -0,0 +1,88 @@
+import uuid
+from flask import Response, current_app, request, stream_with_context
+from playhouse.postgres_ext import PostgresqlExtDatabase
+from app.database import db
+
+NDJSON = "application/x-ndjson"
+# Rows fetched from the server-side cursor (and written to the client) at a time
+STREAM_CHUNK_SIZE = 500
+
+def wants_stream():
+    if request.args.get('stream') == '1':
+        return True
+    accept = request.accept_mimetypes
+    return accept[NDJSON] > accept['application/json']
+
+class _DeclaredCursor:
+    # Reads a cursor DECLAREd on the server STREAM_CHUNK_SIZE rows per FETCH,
+    # with the cursor interface peewee's result wrappers read rows through
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self._fetch()
+
+    def _fetch(self):
+        self.cursor = self.database.execute_sql(f"FETCH FORWARD {STREAM_CHUNK_SIZE} FROM {self.name}")
+        self.rows = iter(self.cursor.fetchall())
+
+    @property
+    def description(self):
+        return self.cursor.description
+
+    def fetchone(self):
+        row = next(self.rows, None)
+        if row is None and self.cursor.rowcount == STREAM_CHUNK_SIZE:
+            self._fetch()
+            row = next(self.rows, None)
+        return row
+
+    def close(self):
+        # The server closes the cursor when its transaction ends
+        pass
+
+def iterate_rows(query):
+    # On Postgres, read through a server-side cursor so only one chunk of
+    # rows is held in the worker at a time. It is declared inside a
+    # transaction: outside one it would have to be WITH HOLD, as peewee's
+    # named cursors are, and Postgres would build the whole result before
+    # the first row could be sent.
+    database = db.current()
+    if not isinstance(database, PostgresqlExtDatabase):
+        yield from query.iterator()
+        return
+
+    sql, params = database.get_sql_context().sql(query).query()
+    name = f"stream_{uuid.uuid4().hex}"
+    with database.atomic():
+        database.execute_sql(f"DECLARE {name} NO SCROLL CURSOR FOR {sql}", params)
+        yield from query._get_cursor_wrapper(_DeclaredCursor(database, name)).iterator()
+
+def ndjson_response(query):
+    def generate():
+        chunk = []
+        for row in iterate_rows(query):
+            chunk.append(current_app.json.dumps(row))
+            if len(chunk) >= STREAM_CHUNK_SIZE:
+                yield "\n".join(chunk) + "\n"
+                chunk = []
+        if chunk:
+            yield "\n".join(chunk) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON)
+
+def json_array_response(fragments):
+    # `fragments` are already-encoded JSON values, e.g. documents built by Postgres
+    def generate():
+        yield "["
+        chunk = []
+        separator = ""
+        for fragment in fragments:
+            chunk.append(separator + fragment)
+            separator = ","
+            if len(chunk) >= STREAM_CHUNK_SIZE:
+                yield "".join(chunk)
+                chunk = []
+        chunk.append("]")
+        yield "".join(chunk)
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
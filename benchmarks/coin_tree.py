@@ -0,0 +1,83 @@
+"""Compare loading one coin's duties and KSBs via the per-resource endpoints
+(coin, coin duties, then KSBs per duty) with the single /coins/<id>/tree call.
+
+Seeds its own rows, so point DB_URL at a scratch database:
+
+    DB_URL=postgresql://... python -m benchmarks.coin_tree --duties 40 --ksbs 5
+"""
+import argparse
+import statistics
+import time
+import uuid
+from app import create_app
+from app.database import all_pools, db
+from app.models import Coins, Duties, KSB, CoinDuties, KsbDuties
+
+def seed(n_duties, n_ksbs):
+    run = uuid.uuid4().hex[:8]
+    coin = Coins.create(id=uuid.uuid4(), name=f"bench coin {run}")
+    duties, ksbs = [], []
+    for d in range(n_duties):
+        duty = Duties.create(id=uuid.uuid4(), name=f"bench duty {run} {d}", description=f"bench duty {run} {d}")
+        CoinDuties.create(id=uuid.uuid4(), coin_id=coin.id, duty_id=duty.id)
+        duties.append(duty)
+        for k in range(n_ksbs):
+            ksb = KSB.create(id=uuid.uuid4(), type="Skill", name=f"bench ksb {run} {d} {k}", description=f"bench ksb {run} {d} {k}")
+            KsbDuties.create(id=uuid.uuid4(), duty_id=duty.id, ksb_id=ksb.id)
+            ksbs.append(ksb)
+    return coin, duties, ksbs
+
+def count_queries():
+    counter = {'queries': 0}
+    for pool in all_pools():
+        execute_sql = pool.execute_sql
+        def counted(*args, _execute_sql=execute_sql, **kwargs):
+            counter['queries'] += 1
+            return _execute_sql(*args, **kwargs)
+        pool.execute_sql = counted
+    return counter
+
+def multi_call(client, coin, duties):
+    requests = [f"/api/v1/coins/{coin.id}", f"/api/v1/coins/{coin.id}/duties"]
+    requests += [f"/api/v1/duties/{duty.id}/ksb" for duty in duties]
+    for url in requests:
+        assert client.get(url).status_code == 200
+    return len(requests)
+
+def tree_call(client, coin, duties):
+    assert client.get(f"/api/v1/coins/{coin.id}/tree").status_code == 200
+    return 1
+
+def measure(name, fn, client, coin, duties, counter, iterations):
+    timings = []
+    counter['queries'] = 0
+    for _ in range(iterations):
+        start = time.perf_counter()
+        requests = fn(client, coin, duties)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    print(f"{name:<12} requests={requests:<4} queries={counter['queries'] // iterations:<4} "
+          f"median={statistics.median(timings):.2f}ms p95={timings[int(len(timings) * 0.95) - 1]:.2f}ms")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duties", type=int, default=40)
+    parser.add_argument("--ksbs", type=int, default=5, help="KSBs per duty")
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    with db.connection_context():
+        coin, duties, ksbs = seed(args.duties, args.ksbs)
+    try:
+        client = create_app().test_client()
+        counter = count_queries()
+        measure("multi-call", multi_call, client, coin, duties, counter, args.iterations)
+        measure("tree", tree_call, client, coin, duties, counter, args.iterations)
+    finally:
+        with db.connection_context():
+            KSB.delete().where(KSB.id.in_([ksb.id for ksb in ksbs])).execute()
+            Duties.delete().where(Duties.id.in_([duty.id for duty in duties])).execute()
+            coin.delete_instance()
+
+if __name__ == "__main__":
+    main()
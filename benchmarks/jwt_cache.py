@@ -0,0 +1,46 @@
+"""Compare verifying the same bearer token on every request with JWTManager
+and with CachingJWTManager, which decodes it once and then serves its claims
+from the app's token cache. No database queries are made, but importing
+the app still needs DB_URL:
+
+    DB_URL=postgresql://... python -m benchmarks.jwt_cache --iterations 20000
+"""
+import argparse
+import statistics
+import time
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token, get_jwt, verify_jwt_in_request
+from app.auth import CachingJWTManager
+
+def make_app(manager):
+    app = Flask(__name__)
+    app.config["JWT_SECRET_KEY"] = "benchmark-secret-" * 4
+    manager(app)
+    with app.app_context():
+        token = create_access_token(identity="benchmark", additional_claims={"is_admin": True})
+    return app, token
+
+def measure(name, manager, iterations):
+    app, token = make_app(manager)
+    timings = []
+    with app.test_request_context(headers={"Authorization": f"Bearer {token}"}):
+        for _ in range(iterations):
+            start = time.perf_counter()
+            verify_jwt_in_request()
+            assert get_jwt()["is_admin"]
+            timings.append((time.perf_counter() - start) * 1_000_000)
+    timings.sort()
+    print(f"{name:<10} median={statistics.median(timings):.1f}us p95={timings[int(len(timings) * 0.95) - 1]:.1f}us")
+    if 'jwt_token_cache' in app.extensions:
+        print(app.extensions['jwt_token_cache'].stats())
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=10000)
+    args = parser.parse_args()
+
+    measure("uncached", JWTManager, args.iterations)
+    measure("cached", CachingJWTManager, args.iterations)
+
+if __name__ == "__main__":
+    main()
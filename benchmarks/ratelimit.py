@@ -0,0 +1,45 @@
+"""Time one sliding window rate limit check against each limiter storage:
+limits' per-worker memory:// storage, and the shared mmap:// and database://
+storages from app/ratelimit.py. The database storage writes to rate_limits,
+so point DB_URL at a scratch database:
+
+    DB_URL=postgresql://... python -m benchmarks.ratelimit --iterations 20000
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import SlidingWindowCounterRateLimiter
+import app.ratelimit  # registers mmap:// and database://
+
+def measure(uri, iterations, clients):
+    storage = storage_from_string(uri)
+    limiter = SlidingWindowCounterRateLimiter(storage)
+    limit = parse(f"{iterations}/hour")
+    timings = []
+    try:
+        for iteration in range(iterations):
+            client = str(iteration % clients)
+            start = time.perf_counter()
+            limiter.hit(limit, client)
+            timings.append((time.perf_counter() - start) * 1_000_000)
+    finally:
+        storage.reset()
+    timings.sort()
+    print(f"{uri.split('://')[0]:<9} median={statistics.median(timings):.1f}us p95={timings[int(len(timings) * 0.95) - 1]:.1f}us")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=10000)
+    parser.add_argument("--clients", type=int, default=100, help="distinct keys the hits are spread over")
+    parser.add_argument("--skip-database", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for uri in ["memory://", f"mmap://{directory}", *([] if args.skip_database else ["database://"])]:
+            measure(uri, args.iterations, args.clients)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Compare bulk-insert throughput and primary key index size with uuid4 and
+UUIDv7 keys. Each generator fills its own scratch table shaped like the link
+tables (a uuid primary key and two uuid columns), which is dropped afterwards.
+
+The gap grows once the index no longer fits in shared_buffers, so use enough
+rows for the database being tested:
+
+    DB_URL=postgresql://... python -m benchmarks.uuid_keys --rows 1000000
+"""
+import argparse
+import time
+from peewee import Table
+from app.database import db
+from app.ids import GENERATORS, new_id
+
+def create(name):
+    db.execute_sql(f"DROP TABLE IF EXISTS {name}")
+    db.execute_sql(f"CREATE TABLE {name} (id uuid PRIMARY KEY, parent_id uuid NOT NULL, child_id uuid NOT NULL)")
+    return Table(name, ('id', 'parent_id', 'child_id')).bind(db)
+
+def size(relation):
+    return db.execute_sql("SELECT pg_relation_size(%s::regclass)", (relation,)).fetchone()[0]
+
+def measure(generator, rows, batch):
+    name = f"bench_ids_{generator}"
+    table = create(name)
+    generate = GENERATORS[generator]
+    try:
+        start = time.perf_counter()
+        for offset in range(0, rows, batch):
+            values = [(generate(), new_id(), new_id()) for _ in range(min(batch, rows - offset))]
+            with db.atomic():
+                table.insert(values, columns=[table.id, table.parent_id, table.child_id]).execute()
+        elapsed = time.perf_counter() - start
+        db.execute_sql(f"ANALYZE {name}")
+        print(f"{generator:<6} rows={rows:<8} {rows / elapsed:>9.0f} rows/s "
+              f"index={size(f'{name}_pkey') / 2**20:.1f}MB table={size(name) / 2**20:.1f}MB")
+    finally:
+        db.execute_sql(f"DROP TABLE IF EXISTS {name}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--batch", type=int, default=1000, help="rows per INSERT")
+    parser.add_argument("--generators", nargs="+", choices=list(GENERATORS), default=list(GENERATORS))
+    args = parser.parse_args()
+
+    with db.connection_context():
+        for generator in args.generators:
+            measure(generator, args.rows, args.batch)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Serve the app under gunicorn with each worker profile from gunicorn.conf.py
+(sync, gthread, gevent) and drive it with concurrent keep-alive clients,
+reporting throughput and latency percentiles for each. Rate limiting is
+turned off for the run. Seeds its own rows, so point DB_URL at a scratch
+database:
+
+    DB_URL=postgresql://... python -m benchmarks.worker_profiles --clients 64 --seconds 15
+"""
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from app.database import db
+from app.models import Coins, Duties, KSB, CoinDuties, KsbDuties
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def app():
+    # The gunicorn target: run.py's app without its rate limits
+    from run import app, limiter
+    limiter.enabled = False
+    return app
+
+def seed(n_duties):
+    run = uuid.uuid4().hex[:8]
+    coin = Coins.create(name=f"bench coin {run}")
+    duties = []
+    for d in range(n_duties):
+        duty = Duties.create(name=f"bench duty {run} {d}", description=f"bench duty {run} {d}")
+        CoinDuties.create(coin_id=coin.id, duty_id=duty.id)
+        ksb = KSB.create(type="Skill", name=f"bench ksb {run} {d}", description=f"bench ksb {run} {d}")
+        KsbDuties.create(duty_id=duty.id, ksb_id=ksb.id)
+        duties.append((duty, ksb))
+    return coin, duties
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(profile, workers, port):
+    env = dict(os.environ, WEB_PROFILE=profile, WEB_CONCURRENCY=str(workers))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}",
+         "--access-logfile", "/dev/null", "benchmarks.worker_profiles:app()"],
+        cwd=ROOT, env=env)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {server.returncode}")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/")
+            if connection.getresponse().status == 200:
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("gunicorn did not start")
+
+def drive(port, paths, clients, seconds):
+    timings, errors = [], []
+    stop = time.perf_counter() + seconds
+
+    def client(offset):
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        mine = []
+        i = offset
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            try:
+                connection.request("GET", paths[i % len(paths)])
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    errors.append(response.status)
+            except OSError as err:
+                errors.append(type(err).__name__)
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            mine.append((time.perf_counter() - start) * 1000)
+            i += 1
+        timings.extend(mine)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(timings), errors
+
+def measure(profile, workers, paths, clients, seconds):
+    port = free_port()
+    server = start_server(profile, workers, port)
+    try:
+        drive(port, paths, clients, 1)  # warm up
+        timings, errors = drive(port, paths, clients, seconds)
+    finally:
+        server.terminate()
+        server.wait()
+    percentile = lambda p: timings[max(int(len(timings) * p) - 1, 0)]
+    print(f"{profile:<8} requests/s={len(timings) / seconds:<8.0f} p50={percentile(0.5):.1f}ms "
+          f"p99={percentile(0.99):.1f}ms errors={len(errors)}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profiles", default="sync,gthread,gevent")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--duties", type=int, default=20, help="duties of the coin whose tree is fetched")
+    args = parser.parse_args()
+
+    with db.connection_context():
+        coin, duties = seed(args.duties)
+    # Point lookups mixed with a heavier read
+    paths = [f"/api/v1/coins/{coin.id}"] * 3 + [f"/api/v1/coins/{coin.id}/tree"]
+    try:
+        for profile in args.profiles.split(","):
+            measure(profile, args.workers, paths, args.clients, args.seconds)
+    finally:
+        with db.connection_context():
+            KSB.delete().where(KSB.id.in_([ksb.id for _, ksb in duties])).execute()
+            Duties.delete().where(Duties.id.in_([duty.id for duty, _ in duties])).execute()
+            coin.delete_instance()
+
+if __name__ == "__main__":
+    main()
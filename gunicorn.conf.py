@@ -1,10 +1,103 @@
+import os
+import sys
+
 bind = "0.0.0.0:5000"
-workers = 4
-# timeout = 30
 accesslog = "-"
 errorlog = "-"
+# A worker silent for this long is aborted (see worker_abort below)
+timeout = int(os.environ.get('WEB_TIMEOUT', 120))
+# On a graceful restart (HUP) or stop (TERM), workers stop accepting and get
+# this long to finish the requests they have in flight
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+# Off by default, so a HUP reload brings up workers running the new code.
+# With WEB_PRELOAD=1 the app is imported once in the master and the workers
+# share its pages copy-on-write, but the master keeps the code it started
+# with: deploys then need a full restart, as HUP only restarts the workers.
+# The hooks below keep preloading safe: no connection is carried over a
+# fork, and each worker opens its own.
+preload_app = os.environ.get('WEB_PRELOAD', "0") == "1"
 
-# Gunicorn issues 
+# Gunicorn issues
 # WORKER TIMEOUT - TIMEOUT WAS DEFAULTED TO 30 SECONDS
 # WHEN ONE WORKER WAS KILLED, THE DB CONNECTION WAS NOT PROPERLY CLOSED? AND THE REQUEST COULD NOT BE COMPLETED
-# INCREASING THE TIMEOUT TO 120 SECONDS HELPED
\ No newline at end of file
+# INCREASING THE TIMEOUT TO 120 SECONDS HELPED
+
+# Worker profiles, picked with WEB_PROFILE. A sync worker serves one request
+# at a time, so it sits idle while it waits on Postgres or a password hash;
+# gthread workers serve `threads` requests at once and gevent workers up to
+# `worker_connections`, switching greenlets whenever one waits on a socket.
+PROFILES = {
+    'sync': {'worker_class': "sync"},
+    'gthread': {'worker_class': "gthread", 'threads': 8},
+    'gevent': {'worker_class': "gevent", 'worker_connections': 100},
+}
+WEB_PROFILE = os.environ.get('WEB_PROFILE', "sync")
+# Postgres connections all the workers on this host may hold between them
+DB_MAX_CONNECTIONS = int(os.environ.get('DB_MAX_CONNECTIONS', 90))
+
+if WEB_PROFILE not in PROFILES:
+    raise RuntimeError(f"Unknown WEB_PROFILE {WEB_PROFILE!r}, expected one of {', '.join(PROFILES)}")
+profile = PROFILES[WEB_PROFILE]
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+worker_class = profile['worker_class']
+# Only for gthread: gunicorn turns sync workers given threads into gthread ones
+threads = int(os.environ.get('WEB_THREADS', profile['threads'])) if worker_class == "gthread" else 1
+worker_connections = profile.get('worker_connections', 1000)
+
+# Each worker gets a connection for every request it serves at once, plus one
+# for the coverage refresh (app/analytics.py), within DB_MAX_CONNECTIONS
+# across all workers. The budget is split between twice as many workers, as
+# during a HUP reload the old ones finish their requests while the new ones
+# start serving. gevent workers above that wait for a free connection
+# instead of opening more. DB_POOL_MAX_SIZE, if set, wins.
+concurrency = worker_connections if worker_class == "gevent" else threads
+os.environ.setdefault('DB_POOL_MAX_SIZE', str(max(min(concurrency + 1, DB_MAX_CONNECTIONS // (2 * workers)), 1)))
+
+# A sync worker waits out a password hash whether it runs in a pool or not,
+# so it hashes inline rather than keep processes for it (app/passwords.py)
+if worker_class == "sync":
+    os.environ.setdefault('PASSWORD_HASH_PROCESSES', "0")
+
+if worker_class == "gevent":
+    # Patched before the app is imported, so its thread locals and locks
+    # (peewee's connection state among them) are per greenlet
+    from gevent import monkey
+    monkey.patch_all()
+
+# Each worker owns its own connection pool (see app/database.py). The
+# master closes any connection it holds before forking, as a worker using it
+# too would talk over the same socket, and the worker opens fresh ones.
+def pre_fork(server, worker):
+    # Only a preloaded master has the app imported; otherwise importing it
+    # here would pin that code across HUP reloads
+    if 'app.database' in sys.modules:
+        sys.modules['app.database'].close_pools()
+
+def post_fork(server, worker):
+    from app.database import cooperative_waits, warm_pool
+    from app.passwords import warm_password_pool
+    if worker_class == "gevent":
+        cooperative_waits()
+    warm_pool()
+    warm_password_pool()
+
+# Runs once the worker has drained its requests, or given up on them after
+# graceful_timeout
+def worker_exit(server, worker):
+    from app.database import close_pools
+    from app.passwords import shutdown_password_pool
+    close_pools()
+    shutdown_password_pool()
+
+# A worker past its timeout is sent SIGABRT and then killed. Its stuck
+# queries are cancelled and its connections closed, rather than left running
+# on the server after it is gone.
+def worker_abort(worker):
+    from app.database import close_pools
+    worker.log.warning("Worker %s timed out, cancelling its queries", worker.pid)
+    close_pools()
+
+def on_exit(server):
+    if 'app.database' in sys.modules:
+        sys.modules['app.database'].close_pools()
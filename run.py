@@ -5,11 +5,13 @@ import os
 from dotenv import load_dotenv
 from flask_cors import CORS
 from flask import jsonify, request
-from flask_jwt_extended import create_access_token, JWTManager
-from flask_bcrypt import Bcrypt
+from flask_jwt_extended import create_access_token
+from app.auth import CachingJWTManager
+from app.ratelimit import RATELIMIT_STORAGE_URI, RATELIMIT_STRATEGY, deduct_when, request_cost
 from app.models.users import Users
 import peewee
-import uuid
+from app.ids import new_id
+from app.passwords import HashingUnavailable, check_password, hash_password, rehash_if_needed
 from datetime import timedelta
 
 load_dotenv()
@@ -17,11 +19,10 @@ load_dotenv()
 options = {}
 
 app = create_app()
-bcrypt = Bcrypt(app)
 
 app.config["JWT_SECRET_KEY"] = os.getenv("FLASK_JWT_SECRET_KEY")
 app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(minutes=10)
-jwt = JWTManager(app)
+jwt = CachingJWTManager(app)
 
 CORS(app)
 
@@ -29,7 +30,12 @@ limiter = Limiter(
     get_remote_address,
     app=app,
     default_limits=["100 per 1 minute"],
-    strategy="fixed-window",
+    # Heavy routes take more of the limit than point lookups (app/ratelimit.py)
+    default_limits_cost=request_cost,
+    default_limits_deduct_when=deduct_when(),
+    # Shared by all workers (app/ratelimit.py), so the limits hold server-wide
+    strategy=RATELIMIT_STRATEGY,
+    storage_uri=RATELIMIT_STORAGE_URI,
 )
 
 if __name__ == "__main__":
@@ -55,7 +61,16 @@ def login():
     if not username or not password:
         return jsonify({"msg": "Username and password must be provided"}), 401
     
-    if user and bcrypt.check_password_hash(user.password, password):
+    try:
+        matches = user is not None and check_password(user.password, password)
+    except HashingUnavailable:
+        return jsonify({"msg": "Too many logins in progress, please retry."}), 503
+
+    if matches:
+        # Keeps stored hashes in step with BCRYPT_ROUNDS as it is raised
+        new_hash = rehash_if_needed(user.password, password)
+        if new_hash:
+            Users.update(password=new_hash).where(Users.id == user.id).execute()
         additional_claims = {"is_admin": user.is_admin}
         access_token = create_access_token(identity=user.id, additional_claims=additional_claims)
         return jsonify({'message': 'Login Success', 'access_token': access_token}), 200
@@ -77,10 +92,15 @@ def register():
         if Users.select().where(Users.username == username).exists():
             return jsonify({"msg": "A user with this username already exists."}), 409
 
-        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+        try:
+            hashed_password = hash_password(password)
+        except HashingUnavailable:
+            return jsonify({"msg": "Too many registrations in progress, please retry."}), 503
+        except ValueError:
+            return jsonify({"msg": "Password must be at most 72 bytes."}), 400
 
         new_user = Users.create(
-            id=uuid.uuid4(),
+            id=new_id(),
             username=username,
             password=hashed_password,
             is_admin=is_admin
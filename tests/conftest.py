@@ -88,3 +88,11 @@ def ksb_duty_fixture():
         client.delete(f"/api/v1/duties/{duty_id}")
         client.delete(f"/api/v1/duties/{duty_2_id}")
 
+
+@pytest.fixture
+def trigram():
+    from app.database import db
+    with db.connection_context():
+        installed = db.execute_sql("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'").fetchone()
+    if not installed:
+        pytest.skip("pg_trgm is not installed")
@@ -0,0 +1,102 @@
+import time
+from datetime import timedelta
+import pytest
+from flask import Flask, jsonify
+from flask_jwt_extended import create_access_token, get_jwt, jwt_required
+from app.auth import CachingJWTManager, TokenCache, admin_required
+
+@pytest.fixture
+def auth_app():
+    app = Flask(__name__)
+    app.config["JWT_SECRET_KEY"] = "test-secret-" * 4
+    CachingJWTManager(app)
+
+    @app.get("/admin")
+    @admin_required()
+    def admin_only():
+        return jsonify(ok=True)
+
+    @app.get("/user")
+    @jwt_required()
+    def any_user():
+        return jsonify(is_admin=get_jwt()["is_admin"])
+
+    return app
+
+def token(app, is_admin=True, **kwargs):
+    with app.app_context():
+        return create_access_token(identity="tester", additional_claims={"is_admin": is_admin}, **kwargs)
+
+def cache(app):
+    return app.extensions["jwt_token_cache"]
+
+def get(app, url, token):
+    return app.test_client().get(url, headers={"Authorization": f"Bearer {token}"})
+
+def test_token_is_verified_once_for_both_decorators(auth_app):
+    admin = token(auth_app)
+    before = cache(auth_app).stats()
+
+    assert get(auth_app, "/admin", admin).status_code == 200
+    assert get(auth_app, "/admin", admin).status_code == 200
+    assert get(auth_app, "/user", admin).get_json() == {"is_admin": True}
+
+    after = cache(auth_app).stats()
+    assert after["misses"] == before["misses"] + 1
+    assert after["hits"] == before["hits"] + 2
+
+def test_cached_claims_still_checked(auth_app):
+    user = token(auth_app, is_admin=False)
+
+    assert get(auth_app, "/admin", user).status_code == 403
+    assert get(auth_app, "/admin", user).status_code == 403
+    assert get(auth_app, "/user", user).get_json() == {"is_admin": False}
+
+def test_invalid_tokens_are_not_cached(auth_app):
+    forged = token(auth_app)[:-2] + "xx"
+
+    assert get(auth_app, "/admin", forged).status_code == 401
+    assert get(auth_app, "/admin", forged).status_code == 401
+    assert cache(auth_app).stats()["size"] == 0
+
+def test_expired_token_is_rejected_after_being_cached(auth_app):
+    short = token(auth_app, expires_delta=timedelta(seconds=1))
+    assert get(auth_app, "/admin", short).status_code == 200
+
+    time.sleep(1.1)
+    expired = cache(auth_app).stats()["expired"]
+
+    assert get(auth_app, "/admin", short).status_code == 401
+    assert cache(auth_app).stats()["expired"] == expired + 1
+
+def test_cached_token_is_rejected_under_another_secret(auth_app):
+    admin = token(auth_app)
+    assert get(auth_app, "/admin", admin).status_code == 200
+
+    other_app = Flask(__name__)
+    other_app.config["JWT_SECRET_KEY"] = "other-secret-" * 4
+    CachingJWTManager(other_app)
+    other_app.add_url_rule("/admin", view_func=admin_required()(lambda: jsonify(ok=True)))
+    assert get(other_app, "/admin", admin).status_code == 401
+
+    auth_app.config["JWT_SECRET_KEY"] = "rotated-secret-" * 4
+    assert get(auth_app, "/admin", admin).status_code == 401
+
+def test_least_recently_used_token_is_evicted():
+    cache = TokenCache(max_size=2)
+    exp = time.time() + 60
+    cache.put("a", {"exp": exp})
+    cache.put("b", {"exp": exp})
+    cache.get("a")
+    cache.put("c", {"exp": exp})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"exp": exp}
+    assert cache.stats()["evicted"] == 1
+
+def test_cached_claims_are_copies():
+    cache = TokenCache(max_size=2)
+    cache.put("a", {"exp": time.time() + 60, "is_admin": False})
+    cache.get("a")["is_admin"] = True
+
+    assert cache.get("a")["is_admin"] is False
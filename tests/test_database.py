@@ -0,0 +1,124 @@
+import concurrent.futures
+import os
+import threading
+import time
+import psycopg2
+import pytest
+from app import create_app
+from app import database
+from app.database import db, close_db, close_pools, connect_db, open_pool, pool_stats, request_stats, start_request_stats, stop_request_stats
+from app.models import Coins
+
+@pytest.fixture
+def replica(monkeypatch):
+    # A second pool onto the same database stands in for a read replica
+    replica = open_pool(os.environ["DB_URL"])
+    monkeypatch.setattr(db, "replicas", [replica])
+    yield replica
+    replica.close_all()
+
+def test_reads_are_routed_to_replica(client, replica):
+    response = client.get("/api/v1/coins")
+
+    assert response.status_code == 200
+    assert pool_stats()["replicas"][0]["checkouts"] == 1
+
+def test_writes_are_routed_to_primary(client, replica):
+    primary_checkouts = pool_stats()["primary"]["checkouts"]
+    post_response = client.post("/api/v1/coins", json={"name": "Test coin 1"})
+    client.delete(f"/api/v1/coins/{post_response.get_json()['id']}")
+
+    assert post_response.status_code == 201
+    assert pool_stats()["primary"]["checkouts"] == primary_checkouts + 2
+    assert pool_stats()["replicas"][0]["checkouts"] == 0
+
+def test_reads_after_a_write_are_routed_to_primary(client, replica):
+    post_response = client.post("/api/v1/coins", json={"name": "Test coin 1"})
+    coin_id = post_response.get_json()["id"]
+    get_response = client.get(f"/api/v1/coins/{coin_id}")
+    client.delete(f"/api/v1/coins/{coin_id}")
+
+    assert client.get_cookie("read_primary_until") is not None
+    assert get_response.status_code == 200
+    assert pool_stats()["replicas"][0]["checkouts"] == 0
+
+def test_no_replica_falls_back_to_primary(client):
+    primary_checkouts = pool_stats()["primary"]["checkouts"]
+    client.get("/api/v1/coins")
+
+    assert pool_stats()["primary"]["checkouts"] == primary_checkouts + 1
+
+def test_read_only_posts_are_routed_to_replica(client, replica):
+    response = client.post("/api/v1/coins/lookup", json={"ids": ["00000000-0000-4000-a000-000000000000"]})
+
+    assert response.status_code == 200
+    assert pool_stats()["replicas"][0]["checkouts"] == 1
+    assert client.get_cookie("read_primary_until") is None
+
+
+def test_request_stats_measure_queries():
+    start_request_stats()
+    with db.connection_context():
+        Coins.select().count()
+        Coins.select().execute()
+    stats = request_stats()
+    stop_request_stats()
+
+    assert stats['queries'] == 2
+    assert stats['rows'] >= 1
+    assert stats['db_seconds'] > 0
+    assert request_stats() is None
+
+def test_checkin_times_go_with_the_connections(monkeypatch):
+    def idle_entries():
+        return [entry[1] for entry in db.primary._connections]
+
+    connect_db()
+    close_db()
+    assert set(database._last_checkin.keys()) <= set(idle_entries())
+    assert any(entry in database._last_checkin for entry in idle_entries())
+
+    # Stale connections are closed by the pool itself on checkout
+    monkeypatch.setattr(db.primary, '_stale_timeout', 0.01)
+    time.sleep(0.05)
+    connect_db()
+    db.primary.close()
+
+    assert set(database._last_checkin.keys()) <= set(idle_entries())
+
+def test_threads_share_the_pool():
+    # As under gthread workers: more threads than connections, each request
+    # checking out its own and waiting for one to be free when none are
+    app = create_app()
+
+    def get_coins(_):
+        return app.test_client().get("/api/v1/coins").status_code
+
+    with concurrent.futures.ThreadPoolExecutor(16) as executor:
+        statuses = list(executor.map(get_coins, range(64)))
+
+    assert statuses == [200] * 64
+    assert pool_stats()["primary"]["in_use"] == 0
+
+def test_close_pools_cancels_running_queries():
+    errors = []
+    started = threading.Event()
+
+    def sleep():
+        with db.primary.connection_context():
+            started.set()
+            try:
+                db.primary.execute_sql("SELECT pg_sleep(30)")
+            except psycopg2.errors.QueryCanceled as err:
+                errors.append(err)
+
+    thread = threading.Thread(target=sleep)
+    thread.start()
+    started.wait()
+    time.sleep(0.2)
+    close_pools()
+    thread.join(timeout=10)
+
+    assert not thread.is_alive()
+    assert errors
+    assert pool_stats()["primary"]["in_use"] == 0
@@ -0,0 +1,66 @@
+import os
+import runpy
+import pytest
+
+CONF = os.path.join(os.path.dirname(os.path.dirname(__file__)), "gunicorn.conf.py")
+
+@pytest.fixture
+def load_conf(monkeypatch):
+    def load(**env):
+        for name in ["WEB_PROFILE", "WEB_CONCURRENCY", "WEB_THREADS", "WEB_PRELOAD", "WEB_TIMEOUT", "DB_MAX_CONNECTIONS", "DB_POOL_MAX_SIZE", "PASSWORD_HASH_PROCESSES"]:
+            monkeypatch.delenv(name, raising=False)
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        conf = runpy.run_path(CONF)
+        return conf, int(os.environ["DB_POOL_MAX_SIZE"])
+    return load
+
+def test_sync_profile_is_the_default(load_conf):
+    conf, pool_size = load_conf()
+
+    assert conf["worker_class"] == "sync"
+    assert conf["workers"] == 4
+    assert pool_size == 2
+
+def test_gthread_pool_covers_every_thread(load_conf):
+    conf, pool_size = load_conf(WEB_PROFILE="gthread", WEB_THREADS="12", DB_MAX_CONNECTIONS="120")
+
+    assert conf["worker_class"] == "gthread"
+    assert conf["threads"] == 12
+    assert pool_size == 13
+
+def test_pool_is_capped_by_the_connection_budget(load_conf):
+    # Room for two generations of 8 workers, as during a reload
+    conf, pool_size = load_conf(WEB_PROFILE="gthread", WEB_CONCURRENCY="8", DB_MAX_CONNECTIONS="80")
+    assert pool_size == 5
+
+    conf, pool_size = load_conf(WEB_PROFILE="gthread", DB_POOL_MAX_SIZE="3")
+    assert pool_size == 3
+
+def test_unknown_profile(load_conf):
+    with pytest.raises(RuntimeError):
+        load_conf(WEB_PROFILE="eventlet")
+
+def test_threads_only_apply_to_gthread(load_conf):
+    conf, pool_size = load_conf(WEB_THREADS="12")
+
+    assert conf["threads"] == 1
+    assert pool_size == 2
+
+def test_only_sync_workers_hash_passwords_inline(load_conf):
+    load_conf()
+    assert os.environ["PASSWORD_HASH_PROCESSES"] == "0"
+
+    load_conf(WEB_PROFILE="gthread")
+    assert "PASSWORD_HASH_PROCESSES" not in os.environ
+
+def test_reloadable_by_default_with_lifecycle_hooks(load_conf):
+    conf, _ = load_conf()
+
+    assert conf["preload_app"] is False
+    assert conf["timeout"] == 120
+    for hook in ["pre_fork", "post_fork", "worker_exit", "worker_abort", "on_exit"]:
+        assert callable(conf[hook])
+
+    conf, _ = load_conf(WEB_PRELOAD="1")
+    assert conf["preload_app"] is True
@@ -0,0 +1,57 @@
+import time
+import uuid
+import pytest
+from app import ids
+from app.ids import new_id, set_id_generator, uuid7
+
+def test_uuid7_layout():
+    before = time.time_ns() // 1_000_000
+    id = uuid7()
+    after = time.time_ns() // 1_000_000
+
+    assert id.version == 7
+    assert id.variant == uuid.RFC_4122
+    assert before <= id.int >> 80 <= after
+
+def test_uuid7_is_monotonic():
+    generated = [uuid7() for _ in range(10000)]
+
+    assert generated == sorted(generated)
+    assert len(set(generated)) == len(generated)
+
+def test_uuid7_borrows_the_next_millisecond_when_the_counter_runs_out(monkeypatch):
+    monkeypatch.setattr(ids.time, 'time_ns', lambda: 1_700_000_000_000 * 1_000_000)
+    generated = [uuid7() for _ in range(5000)]
+
+    assert generated == sorted(generated)
+    assert len(set(generated)) == len(generated)
+    assert generated[-1].int >> 80 > 1_700_000_000_000
+
+def test_uuid7_survives_the_clock_going_backwards(monkeypatch):
+    first = uuid7()
+    monkeypatch.setattr(ids.time, 'time_ns', lambda: 0)
+
+    assert uuid7() > first
+
+def test_new_id_uses_the_configured_generator():
+    assert new_id().version == 7
+
+    previous = set_id_generator('uuid4')
+    try:
+        assert new_id().version == 4
+    finally:
+        set_id_generator(previous)
+    assert new_id().version == 7
+
+def test_unknown_generator_is_rejected():
+    with pytest.raises(ValueError):
+        set_id_generator('uuid1')
+
+def test_created_ids_are_time_ordered(client):
+    first = client.post("/api/v1/ksb", json={"type": "Skill", "name": "ID order 1", "description": "ID order 1"}).get_json()
+    second = client.post("/api/v1/ksb", json={"type": "Skill", "name": "ID order 2", "description": "ID order 2"}).get_json()
+    client.delete(f"/api/v1/ksb/{first['id']}")
+    client.delete(f"/api/v1/ksb/{second['id']}")
+
+    assert uuid.UUID(first['id']).version == 7
+    assert uuid.UUID(first['id']) < uuid.UUID(second['id'])
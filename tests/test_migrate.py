@@ -0,0 +1,47 @@
+import io
+import pytest
+from app.database import db
+from app.migrate import discover, drift, migrate, plan, rollback, applied_versions
+
+@pytest.fixture
+def database():
+    with db.connection_context():
+        yield db
+
+def test_all_migrations_applied(database):
+    assert applied_versions() == {migration.version for migration in discover()}
+    assert drift() == []
+
+def test_dry_run_prints_sql_without_applying(database):
+    out = io.StringIO()
+    reverted = rollback(dry_run=True, out=out)
+
+    assert [migration.version for migration in reverted] == [discover()[-1].version]
+    assert out.getvalue().startswith(f"-- {reverted[0].version}_{reverted[0].name} (down)\n")
+    assert applied_versions() == {migration.version for migration in discover()}
+
+def test_reverse_join_indexes_down_and_up(database):
+    rollback(target="0003")
+    problems = drift()
+    indexes = {index.name for table in ("coin_duties", "ksb_duties") for index in database.get_indexes(table)}
+    migrate()
+
+    assert "migration 0004_reverse_join_indexes has not been applied" in problems
+    assert "coinduties_duty_id_coin_id" not in indexes
+    assert "ksbduties_ksb_id_duty_id" not in indexes
+    assert drift() == []
+
+def test_drift_reports_unknown_index(database):
+    database.execute_sql("CREATE INDEX test_unknown_index ON coins (completed)")
+    problems = drift()
+    database.execute_sql("DROP INDEX test_unknown_index")
+
+    assert problems == ["index test_unknown_index on coins is not in the models or migrations"]
+
+def test_reverse_join_indexes_are_only_built_by_0004(database):
+    initial, reverse_indexes = [plan(migration, 'up') for migration in discover() if migration.version in ("0001", "0004")]
+    initial_sql = "\n".join(statement.sql for statement in initial.statements)
+
+    for name in ["coinduties_duty_id_coin_id", "ksbduties_ksb_id_duty_id"]:
+        assert name not in initial_sql
+        assert any(name in statement.sql and "CONCURRENTLY" in statement.sql for statement in reverse_indexes.statements)
@@ -0,0 +1,165 @@
+import os
+import threading
+import time
+import pytest
+from app import passwords
+from app.ids import new_id
+from app.models.users import Users
+from app.passwords import HashingUnavailable, check_password, hash_password, hashing_stats, needs_rehash, rehash_if_needed
+
+@pytest.fixture(autouse=True)
+def fast_hashing(monkeypatch, tmp_path):
+    monkeypatch.setattr(passwords, 'BCRYPT_ROUNDS', 4)
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_SLOT_DIR', str(tmp_path))
+
+def test_hash_and_check():
+    hashed = hash_password("correct horse")
+
+    assert hashed.startswith("$2b$04$")
+    assert check_password(hashed, "correct horse")
+    assert not check_password(hashed, "battery staple")
+
+def test_passwords_bcrypt_cannot_hash():
+    with pytest.raises(ValueError):
+        hash_password("x" * 73)
+    assert not check_password(hash_password("x"), "x" * 73)
+    assert not check_password("not a hash", "x")
+
+def test_rehash_when_rounds_change(monkeypatch):
+    hashed = hash_password("correct horse")
+    assert rehash_if_needed(hashed, "correct horse") is None
+
+    monkeypatch.setattr(passwords, 'BCRYPT_ROUNDS', 5)
+    rehashes = hashing_stats()["rehashes"]
+    new_hash = rehash_if_needed(hashed, "correct horse")
+
+    assert needs_rehash(hashed)
+    assert new_hash.startswith("$2b$05$")
+    assert check_password(new_hash, "correct horse")
+    assert hashing_stats()["rehashes"] == rehashes + 1
+
+def test_rejects_when_saturated(monkeypatch):
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_SLOTS', 1)
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_QUEUE_TIMEOUT', 0.1)
+    rejected = hashing_stats()["rejected"]
+
+    release = passwords._acquire(time.monotonic())
+    try:
+        with pytest.raises(HashingUnavailable):
+            hash_password("correct horse")
+        assert rehash_if_needed("$2b$05$", "correct horse") is None
+    finally:
+        release()
+
+    assert hashing_stats()["rejected"] == rejected + 2
+    # The slot is free again once the holder is done with it
+    assert check_password(hash_password("correct horse"), "correct horse")
+
+def test_rejects_past_max_pending_straight_away(monkeypatch):
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_MAX_PENDING', 1)
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_QUEUE_TIMEOUT', 5)
+    pending = passwords._claim_pending()
+
+    start = time.monotonic()
+    try:
+        with pytest.raises(HashingUnavailable):
+            hash_password("correct horse")
+    finally:
+        os.close(pending)
+
+    assert time.monotonic() - start < 1
+
+def test_default_sync_configuration_leaves_workers_free(monkeypatch):
+    # Four sync workers, hashing inline
+    slots, max_pending = passwords.default_limits(4, 0)
+    assert (slots, max_pending) == (2, 3)
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_PROCESSES', 0)
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_SLOTS', slots)
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_MAX_PENDING', max_pending)
+
+    # Two workers hashing and a third queued for a slot
+    held = [passwords._claim_slot(time.monotonic()) for _ in range(slots)]
+    held += [passwords._claim_pending() for _ in range(max_pending)]
+    try:
+        assert None not in held
+        assert passwords._claim_slot(time.monotonic()) is None
+        # The fourth is turned away rather than tied up too
+        with pytest.raises(HashingUnavailable):
+            hash_password("correct horse")
+    finally:
+        for fd in held:
+            os.close(fd)
+
+    assert check_password(hash_password("correct horse"), "correct horse")
+
+def test_queues_for_a_slot(monkeypatch):
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_SLOTS', 1)
+    fd = passwords._claim_slot(time.monotonic())
+    threading.Timer(0.2, os.close, [fd]).start()
+    before = hashing_stats()
+
+    assert check_password(hash_password("correct horse"), "correct horse")
+    assert hashing_stats()["queue_wait_seconds"] >= before["queue_wait_seconds"] + 0.1
+
+def test_slot_is_held_until_a_timed_out_hash_finishes(monkeypatch):
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_SLOTS', 1)
+    monkeypatch.setattr(passwords, 'BCRYPT_ROUNDS', 13)
+    passwords.warm_password_pool()
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_TIMEOUT', 0.01)
+    timeouts = hashing_stats()["timeouts"]
+
+    with pytest.raises(HashingUnavailable):
+        hash_password("correct horse")
+
+    assert hashing_stats()["timeouts"] == timeouts + 1
+    assert passwords._claim_slot(time.monotonic()) is None
+    fd = passwords._claim_slot(time.monotonic() + 30)
+    assert fd is not None
+    os.close(fd)
+
+def test_hashes_inline_without_processes(monkeypatch):
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_PROCESSES', 0)
+    passwords.shutdown_password_pool()
+    passwords.warm_password_pool()
+
+    assert check_password(hash_password("correct horse"), "correct horse")
+    assert passwords._pool is None
+
+def test_login_returns_503_when_saturated(monkeypatch):
+    from run import app, limiter
+    monkeypatch.setattr(limiter, 'enabled', False)
+    user = Users.create(id=new_id(), username="saturated", password=hash_password("correct horse"), is_admin=False)
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_SLOTS', 1)
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_QUEUE_TIMEOUT', 0.1)
+
+    release = passwords._acquire(time.monotonic())
+    try:
+        response = app.test_client().post("/api/login", json={"username": "saturated", "password": "correct horse"})
+    finally:
+        release()
+        user.delete_instance()
+
+    assert response.status_code == 503
+    assert response.get_json() == {"msg": "Too many logins in progress, please retry."}
+
+def test_stats_time_each_hash():
+    before = hashing_stats()
+    hash_password("correct horse")
+    after = hashing_stats()
+
+    assert after["hashes"] == before["hashes"] + 1
+    assert after["hash_seconds"] > before["hash_seconds"]
+    assert after["queue_wait_seconds"] >= before["queue_wait_seconds"]
+
+def test_shutdown_password_pool():
+    assert check_password(hash_password("secret"), "secret")
+    processes = list(passwords._pool._processes.values())
+
+    passwords.shutdown_password_pool()
+
+    assert passwords._pool is None
+    for process in processes:
+        process.join(timeout=10)
+        assert not process.is_alive()
+    # The next check starts a new pool
+    assert check_password(hash_password("secret"), "secret")
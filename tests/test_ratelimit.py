@@ -0,0 +1,173 @@
+import multiprocessing
+import pytest
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter, SlidingWindowCounterRateLimiter
+from app import create_app, ratelimit
+from app.database import db, request_stats, start_request_stats, stop_request_stats
+from app.ratelimit import DatabaseStorage, MmapStorage, deduct_when, request_cost
+
+@pytest.fixture
+def mmap_storage(tmp_path):
+    storage = storage_from_string(f"mmap://{tmp_path}")
+    yield storage
+    storage.reset()
+
+@pytest.fixture
+def database_storage():
+    storage = storage_from_string("database://")
+    storage.reset()
+    yield storage
+    storage.reset()
+
+@pytest.fixture(params=["mmap", "database"])
+def storage(request):
+    return request.getfixturevalue(f"{request.param}_storage")
+
+def test_storage_schemes_are_registered(mmap_storage, database_storage):
+    assert isinstance(mmap_storage, MmapStorage)
+    assert isinstance(database_storage, DatabaseStorage)
+    assert mmap_storage.check() and database_storage.check()
+
+def test_sliding_window_allows_up_to_the_limit(storage):
+    limiter = SlidingWindowCounterRateLimiter(storage)
+    limit = parse("5/minute")
+
+    assert all(limiter.hit(limit, "client") for _ in range(5))
+    assert not limiter.hit(limit, "client")
+    assert limiter.hit(limit, "other client")
+    assert limiter.get_window_stats(limit, "client").remaining == 0
+
+    limiter.clear(limit, "client")
+    assert limiter.hit(limit, "client")
+
+def test_sliding_window_weights_the_previous_window(storage, monkeypatch):
+    limiter = SlidingWindowCounterRateLimiter(storage)
+    limit = parse("10/minute")
+    now = 1_700_000_040.0  # 0 seconds into a minute window
+    monkeypatch.setattr(ratelimit.time, 'time', lambda: now)
+    for _ in range(10):
+        assert limiter.hit(limit, "client")
+
+    # A quarter into the next window, three quarters of the old one still count
+    now += 75
+    assert [limiter.hit(limit, "client") for _ in range(4)] == [True, True, True, False]
+
+def test_fixed_window_counts(storage):
+    limiter = FixedWindowRateLimiter(storage)
+    limit = parse("3/hour")
+
+    assert [limiter.hit(limit, "client") for _ in range(4)] == [True, True, True, False]
+    assert limiter.get_window_stats(limit, "client").remaining == 0
+
+def _hit_many(path, hits):
+    limiter = SlidingWindowCounterRateLimiter(storage_from_string(f"mmap://{path}"))
+    return sum(limiter.hit(parse("50/hour"), "shared") for _ in range(hits))
+
+def test_mmap_limit_is_shared_between_processes(mmap_storage, tmp_path):
+    with multiprocessing.get_context('fork').Pool(4) as pool:
+        allowed = pool.starmap(_hit_many, [(tmp_path, 30)] * 4)
+
+    assert sum(allowed) == 50
+    assert mmap_storage.get_sliding_window(parse("50/hour").key_for("shared"), 3600)[2] == 50
+
+def test_mmap_fails_open_when_every_column_is_taken(tmp_path, monkeypatch):
+    monkeypatch.setattr(ratelimit, 'RATELIMIT_MMAP_WORKERS', 1)
+    storage = MmapStorage(f"mmap://{tmp_path}")
+    assert storage.check()
+
+    # The forked process finds the only column taken by this one
+    with multiprocessing.get_context('fork').Pool(1) as pool:
+        allowed = pool.starmap(_hit_many, [(tmp_path, 60)])
+
+    assert allowed == [60]
+    assert storage.get_sliding_window(parse("50/hour").key_for("shared"), 3600)[2] == 0
+    storage.reset()
+
+def test_mmap_drops_the_key_closest_to_expiring_when_full(tmp_path, monkeypatch):
+    monkeypatch.setattr(ratelimit, 'RATELIMIT_MMAP_SLOTS', 4)
+    storage = MmapStorage(f"mmap://{tmp_path}")
+    limiter = SlidingWindowCounterRateLimiter(storage)
+
+    limiter.hit(parse("5/hour"), "long lived")
+    for client in range(10):
+        limiter.hit(parse("5/second"), str(client))
+
+    assert storage.get_sliding_window(parse("5/hour").key_for("long lived"), 3600)[2] == 1
+    storage.reset()
+
+def test_database_storage_writes_to_the_primary(database_storage):
+    with db.connection_context():
+        limiter = SlidingWindowCounterRateLimiter(database_storage)
+        limiter.hit(parse("5/minute"), "client")
+        rows = db.primary.execute_sql("SELECT count FROM rate_limits").fetchall()
+
+    assert rows == [(1,)]
+
+def limited_client(limit):
+    app = create_app()
+    Limiter(
+        get_remote_address,
+        app=app,
+        default_limits=[limit],
+        default_limits_cost=request_cost,
+        default_limits_deduct_when=deduct_when(),
+        storage_uri="memory://",
+        strategy="sliding-window-counter",
+    )
+    return app.test_client()
+
+def test_heavy_routes_cost_more():
+    client = limited_client("30 per minute")
+
+    assert client.get("/api/v1/duties/with-ksbs").status_code == 200
+    assert client.get("/api/v1/duties/with-ksbs").status_code == 429
+
+    client = limited_client("30 per minute")
+    statuses = [client.get("/api/v1/coins/00000000-0000-0000-0000-000000000000").status_code for _ in range(25)]
+    assert statuses == [404] * 25
+
+@pytest.mark.parametrize("method, path, cost", [
+    ("GET", "/api/v1/coins", 20),
+    ("GET", "/api/v1/duties?stream=1", 20),
+    ("GET", "/api/v1/ksb?stream=1&limit=10", 20),
+    ("GET", "/api/v1/ksb?limit=10", 1),
+    ("GET", "/api/v1/coins?ids=00000000-0000-0000-0000-000000000000", 10),
+    ("POST", "/api/v1/duties/lookup", 10),
+    ("POST", "/api/v1/coins/00000000-0000-0000-0000-000000000000/duties", 10),
+    ("PUT", "/api/v1/duties/00000000-0000-0000-0000-000000000000/ksb", 10),
+])
+def test_list_and_bulk_id_routes_cost_more(method, path, cost):
+    app = create_app()
+    with app.test_request_context(path, method=method):
+        assert request_cost() == cost
+
+def test_measured_cost_charges_by_rows(monkeypatch, coin_duty_fixture):
+    monkeypatch.setattr(ratelimit, 'RATELIMIT_ROWS_PER_UNIT', 1)
+    static = limited_client("3 per minute")
+    assert [static.get("/api/v1/coins?limit=10").status_code for _ in range(3)] == [200] * 3
+
+    monkeypatch.setattr(ratelimit, 'RATELIMIT_COST_MODE', "measured")
+    measured = limited_client("3 per minute")
+    # Each page returns at least two coins, so costs at least two
+    assert 429 in [measured.get("/api/v1/coins?limit=10").status_code for _ in range(3)]
+
+def test_request_cost(monkeypatch):
+    app = create_app()
+    with app.test_request_context("/api/v1/duties/with-ksbs"):
+        start_request_stats()
+        request_stats()['rows'] = 4000
+        assert request_cost() == 20
+
+        monkeypatch.setattr(ratelimit, 'RATELIMIT_COST_MODE', "measured")
+        assert request_cost() == 40
+        request_stats()['db_seconds'] = 60
+        assert request_cost() == ratelimit.RATELIMIT_MAX_COST
+        request_stats()['rows'] = request_stats()['db_seconds'] = 0
+        assert request_cost() == 20
+        stop_request_stats()
+
+    with app.test_request_context("/api/v1/coins?limit=10"):
+        assert request_cost() == 1
@@ -0,0 +1,21 @@
+from app import streaming
+from app.database import db
+from app.models import Coins
+from app.streaming import iterate_rows
+
+def test_rows_are_fetched_in_chunks_from_a_transaction(monkeypatch):
+    monkeypatch.setattr(streaming, 'STREAM_CHUNK_SIZE', 2)
+    with db.connection_context():
+        coins = [Coins.create(name=f"Test stream coin {n}") for n in range(5)]
+        try:
+            query = Coins.select().where(Coins.name.startswith("Test stream coin")).order_by(Coins.name).dicts()
+            rows = iterate_rows(query)
+            first = next(rows)
+            # Read while the stream is open, on the same connection
+            cursors = db.execute_sql("SELECT is_holdable FROM pg_cursors WHERE name LIKE %s", ("stream%",)).fetchall()
+            names = [first["name"]] + [row["name"] for row in rows]
+        finally:
+            Coins.delete().where(Coins.id.in_([coin.id for coin in coins])).execute()
+
+    assert names == [f"Test stream coin {n}" for n in range(5)]
+    assert cursors == [(False,)]
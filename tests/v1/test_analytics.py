@@ -0,0 +1,71 @@
+import time
+from playhouse.pool import MaxConnectionsExceeded
+from app import analytics
+from app.analytics import refresh_coverage, schedule_coverage_refresh
+
+def test_get_coverage(ksb_duty_fixture):
+    client, ksb, duty, ksb_2, duty_2 = ksb_duty_fixture
+    coin_id = client.post("/api/v1/coins", json={"name": "Coverage coin"}).get_json()["id"]
+    client.post(f"/api/v1/coins/{coin_id}/duties/{duty.id}")
+    client.post(f"/api/v1/coins/{coin_id}/duties/{duty_2.id}")
+    client.post(f"/api/v1/duties/{duty.id}/ksb/{ksb.id}")
+    client.post(f"/api/v1/duties/{duty_2.id}/ksb/{ksb.id}")
+    client.post(f"/api/v1/duties/{duty_2.id}/ksb/{ksb_2.id}")
+    refresh_coverage()
+    response = client.get("/api/v1/analytics/coverage")
+    client.delete(f"/api/v1/coins/{coin_id}")
+
+    assert response.status_code == 200
+    assert response.get_json()["refreshed_at"] is not None
+    coverage = next(row for row in response.get_json()["data"] if row["coin_id"] == coin_id)
+    assert coverage == {
+        'coin_id': coin_id,
+        'coin_name': "Coverage coin",
+        'duties': 2,
+        'ksbs': {'Knowledge': 1, 'Skill': 1, 'Behaviour': 0, 'total': 2},
+    }
+
+def test_get_coverage_paginated(client):
+    ids = [client.post("/api/v1/coins", json={"name": f"Coverage coin {n}"}).get_json()["id"] for n in range(3)]
+    refresh_coverage()
+    first_page = client.get("/api/v1/analytics/coverage?limit=2")
+    second_page = client.get(f"/api/v1/analytics/coverage?limit=2&cursor={first_page.get_json()['next_cursor']}")
+    for coin_id in ids:
+        client.delete(f"/api/v1/coins/{coin_id}")
+
+    assert first_page.status_code == 200
+    assert [row["coin_name"] for row in first_page.get_json()["data"]] == ["Coverage coin 0", "Coverage coin 1"]
+    assert [row["coin_name"] for row in second_page.get_json()["data"]] == ["Coverage coin 2"]
+    assert second_page.get_json()["next_cursor"] is None
+
+def test_write_schedules_coverage_refresh(client, monkeypatch):
+    scheduled = []
+    monkeypatch.setattr("app.schedule_coverage_refresh", lambda: scheduled.append(True))
+    client.get("/api/v1/coins")
+    response = client.post("/api/v1/coins", json={"name": "Coverage coin"})
+    client.delete(f"/api/v1/coins/{response.get_json()['id']}")
+
+    assert scheduled == [True, True]
+
+def test_coverage_refresh_is_debounced(monkeypatch):
+    refreshes = []
+    monkeypatch.setattr("app.analytics._refresh_timer", None)
+    monkeypatch.setattr("app.analytics.COVERAGE_REFRESH_DELAY", 0.05)
+    monkeypatch.setattr("app.analytics.refresh_coverage", lambda: refreshes.append(True))
+    for _ in range(3):
+        schedule_coverage_refresh()
+    time.sleep(0.2)
+
+    assert refreshes == [True]
+
+def test_failed_coverage_refresh_is_logged(monkeypatch, caplog):
+    def exhausted():
+        raise MaxConnectionsExceeded("Exceeded maximum connections.")
+    monkeypatch.setattr("app.analytics._refresh_timer", None)
+    monkeypatch.setattr("app.analytics.COVERAGE_REFRESH_DELAY", 0.05)
+    monkeypatch.setattr("app.analytics.refresh_coverage", exhausted)
+    schedule_coverage_refresh()
+    time.sleep(0.2)
+
+    assert "Coverage refresh failed" in caplog.text
+    assert analytics._refresh_timer is None
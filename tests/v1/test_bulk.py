@@ -0,0 +1,116 @@
+import pytest
+from app import create_app
+from app.models.coins import Coins
+from app.models.duties import Duties
+from app.models.ksb import KSB
+
+valid_uuid = "ddf5f1d8-a0d2-4f0e-9a0a-3b0c8f3a1b5e"
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config["TESTING"] = True
+
+    with app.test_client() as client:
+        yield client
+
+        Coins.delete().where(Coins.name.startswith("Bulk")).execute()
+        Duties.delete().where(Duties.name.startswith("Bulk")).execute()
+        KSB.delete().where(KSB.name.startswith("Bulk")).execute()
+
+def test_bulk_creates_and_links_with_refs(client):
+    response = client.post("/api/v1/bulk", json={"operations": [
+        {"op": "create", "resource": "coin", "ref": "coin", "data": {"name": "Bulk coin"}},
+        {"op": "create", "resource": "duty", "ref": "duty", "data": {"name": "Bulk duty", "description": "Bulk duty description"}},
+        {"op": "create", "resource": "ksb", "ref": "k1", "data": {"type": "Knowledge", "name": "Bulk K1", "description": "Bulk K1 description"}},
+        {"op": "create", "resource": "ksb", "ref": "s1", "data": {"type": "Skill", "name": "Bulk S1", "description": "Bulk S1 description"}},
+        {"op": "link", "coin": "$coin", "duty": "$duty"},
+        {"op": "link", "duty": "$duty", "ksb": "$k1"},
+        {"op": "link", "duty": "$duty", "ksb": "$s1"},
+        {"op": "update", "resource": "coin", "id": "$coin", "data": {"completed": True}},
+    ]})
+    results = response.get_json()["results"]
+
+    assert response.status_code == 200
+    assert [result["op"] for result in results] == ["create"] * 4 + ["link"] * 3 + ["update"]
+    assert results[0]["ref"] == "coin"
+    assert [result["status"] for result in results[4:7]] == ["linked"] * 3
+    assert results[7]["completed"] is True
+    coin_id = results[0]["id"]
+    tree = client.get(f"/api/v1/coins/{coin_id}/tree").get_json()
+    assert [ksb["name"] for ksb in tree["duties"][0]["ksbs"]] == ["Bulk K1", "Bulk S1"]
+
+def test_bulk_unlinks_and_deletes(client):
+    created = client.post("/api/v1/bulk", json={"operations": [
+        {"op": "create", "resource": "coin", "ref": "coin", "data": {"name": "Bulk coin"}},
+        {"op": "create", "resource": "duty", "ref": "duty", "data": {"name": "Bulk duty", "description": "Bulk duty description"}},
+        {"op": "link", "coin": "$coin", "duty": "$duty"},
+    ]}).get_json()["results"]
+    coin_id, duty_id = created[0]["id"], created[1]["id"]
+    response = client.post("/api/v1/bulk", json={"operations": [
+        {"op": "link", "coin": coin_id, "duty": duty_id},
+        {"op": "unlink", "coin": coin_id, "duty": duty_id},
+        {"op": "delete", "resource": "duty", "id": duty_id},
+    ]})
+
+    assert response.status_code == 200
+    assert response.get_json()["results"] == [
+        {"op": "link", "status": "already_linked"},
+        {"op": "unlink", "status": "unlinked"},
+        {"op": "delete", "id": duty_id, "name": "Bulk duty"},
+    ]
+
+def test_bulk_is_all_or_nothing(client):
+    response = client.post("/api/v1/bulk", json={"operations": [
+        {"op": "create", "resource": "coin", "data": {"name": "Bulk coin"}},
+        {"op": "delete", "resource": "duty", "id": valid_uuid},
+    ]})
+
+    assert response.status_code == 404
+    assert response.get_json() == {
+        'error': "Database error",
+        'message': f"Duty with ID = {valid_uuid} does not exist",
+        'operation': 1
+    }
+    assert not Coins.select().where(Coins.name == "Bulk coin").exists()
+
+def test_bulk_reports_duplicate_create(client):
+    response = client.post("/api/v1/bulk", json={"operations": [
+        {"op": "create", "resource": "coin", "data": {"name": "Bulk coin"}},
+        {"op": "create", "resource": "coin", "data": {"name": "Bulk coin 2"}},
+        {"op": "create", "resource": "coin", "data": {"name": "Bulk coin"}},
+    ]})
+
+    assert response.status_code == 409
+    assert response.get_json()["operation"] == 2
+    assert not Coins.select().where(Coins.name.startswith("Bulk")).exists()
+
+def test_bulk_with_unknown_ref(client):
+    response = client.post("/api/v1/bulk", json={"operations": [
+        {"op": "link", "coin": "$coin", "duty": valid_uuid},
+    ]})
+
+    assert response.status_code == 400
+    assert response.get_json() == {
+        'error': "Invalid operation",
+        'message': "$coin does not refer to an earlier create",
+        'operation': 0
+    }
+
+def test_bulk_with_invalid_ksb_type(client):
+    response = client.post("/api/v1/bulk", json={"operations": [
+        {"op": "create", "resource": "ksb", "data": {"type": "Other", "name": "Bulk ksb", "description": "Bulk"}},
+    ]})
+
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Invalid type"
+
+def test_bulk_without_operations(client):
+    response = client.post("/api/v1/bulk", json={})
+
+    assert response.status_code == 400
+    assert response.get_json() == {
+        'error': "Invalid operation",
+        'message': "operations must be a non-empty list",
+        'operation': None
+    }
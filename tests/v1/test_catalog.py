@@ -0,0 +1,95 @@
+import json
+import pytest
+from app import create_app
+from app.models.coins import Coins
+from app.models.duties import Duties
+from app.models.ksb import KSB
+
+CATALOG = "\n".join([
+    '{"kind": "coin", "name": "Catalog coin", "completed": true}',
+    '{"kind": "duty", "name": "Catalog duty", "description": "Catalog duty description"}',
+    '{"kind": "ksb", "type": "Knowledge", "name": "Catalog ksb", "description": "Catalog ksb description"}',
+    '{"kind": "coin_duty", "coin": "Catalog coin", "duty": "Catalog duty"}',
+    '{"kind": "ksb_duty", "duty": "Catalog duty", "ksb": "Catalog ksb"}',
+])
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config["TESTING"] = True
+
+    with app.test_client() as client:
+        yield client
+
+        Coins.delete().where(Coins.name == "Catalog coin").execute()
+        Duties.delete().where(Duties.name == "Catalog duty").execute()
+        KSB.delete().where(KSB.name == "Catalog ksb").execute()
+
+def test_import_catalog(client):
+    response = client.post("/api/v1/catalog/import", data=CATALOG, content_type="application/x-ndjson")
+
+    assert response.status_code == 200
+    assert response.get_json() == {
+        'imported': {'coins': 1, 'duties': 1, 'ksbs': 1, 'coin_duties': 1, 'ksb_duties': 1}
+    }
+    tree = client.get("/api/v1/coins/tree").get_json()
+    coin = next(coin for coin in tree if coin['name'] == "Catalog coin")
+    assert coin['completed'] is True
+    assert coin['duties'][0]['name'] == "Catalog duty"
+    assert coin['duties'][0]['ksbs'][0]['name'] == "Catalog ksb"
+
+def test_import_catalog_twice_adds_no_links(client):
+    client.post("/api/v1/catalog/import", data=CATALOG, content_type="application/x-ndjson")
+    response = client.post("/api/v1/catalog/import", data=CATALOG, content_type="application/x-ndjson")
+
+    assert response.status_code == 200
+    assert response.get_json()['imported']['coin_duties'] == 0
+    assert response.get_json()['imported']['ksb_duties'] == 0
+
+def test_import_catalog_with_unknown_link(client):
+    data = '{"kind": "coin_duty", "coin": "No such coin", "duty": "No such duty"}'
+    response = client.post("/api/v1/catalog/import", data=data, content_type="application/x-ndjson")
+
+    assert response.status_code == 400
+    assert response.get_json()['error'] == "Invalid catalog"
+    assert "No such coin" in response.get_json()['message']
+
+def test_import_catalog_with_invalid_record(client):
+    response = client.post("/api/v1/catalog/import", data='{"kind": "coin"}', content_type="application/x-ndjson")
+
+    assert response.status_code == 400
+    assert response.get_json() == {
+        'error': "Invalid catalog",
+        'message': "Line 1: coin requires name"
+    }
+
+def test_export_catalog_round_trips_through_csv(client):
+    client.post("/api/v1/catalog/import", data=CATALOG, content_type="application/x-ndjson")
+    response = client.get("/api/v1/catalog/export?format=csv")
+    exported = response.get_data(as_text=True)
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/csv"
+    assert exported.splitlines()[0] == "kind,name,type,description,completed,coin,duty,ksb"
+    assert "coin_duty,,,,,Catalog coin,Catalog duty," in exported.splitlines()
+
+    response = client.post("/api/v1/catalog/import?format=csv", data=exported)
+    assert response.status_code == 200
+
+def test_export_catalog_as_ndjson(client):
+    client.post("/api/v1/catalog/import", data=CATALOG, content_type="application/x-ndjson")
+    response = client.get("/api/v1/catalog/export")
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert response.status_code == 200
+    assert {'kind': "coin", 'name': "Catalog coin", 'completed': True} in records
+    assert {'kind': "ksb_duty", 'duty': "Catalog duty", 'ksb': "Catalog ksb"} in records
+
+def test_export_catalog_with_invalid_format(client):
+    response = client.get("/api/v1/catalog/export?format=xml")
+
+    assert response.status_code == 400
+    assert response.get_json() == {
+        'error': "Invalid catalog",
+        'message': "format must be one of ndjson, csv"
+    }
@@ -1,5 +1,8 @@
+import base64
+import pytest
 from unittest.mock import MagicMock, patch
 import uuid 
+import json
 
 valid_uuid = '00000000-0000-4000-a000-000000000000'
 invalid_uuid = '1'
@@ -23,6 +26,99 @@ def test_get_all_coins(client):
     assert response.status_code == 200
     assert response.get_json() == mock_coins
 
+def test_get_coins_paginated(client):
+    ids = [client.post("/api/v1/coins", json={"name": f"Test coin {n}"}).get_json()["id"] for n in range(3)]
+    first_page = client.get("/api/v1/coins?limit=2")
+    second_page = client.get(f"/api/v1/coins?limit=2&cursor={first_page.get_json()['next_cursor']}")
+    for coin_id in ids:
+        client.delete(f"/api/v1/coins/{coin_id}")
+
+    assert first_page.status_code == 200
+    assert [coin["name"] for coin in first_page.get_json()["data"]] == ["Test coin 0", "Test coin 1"]
+    assert second_page.status_code == 200
+    assert [coin["name"] for coin in second_page.get_json()["data"]] == ["Test coin 2"]
+    assert second_page.get_json()["next_cursor"] is None
+
+def test_get_coins_with_invalid_cursor(client):
+    response = client.get("/api/v1/coins?cursor=not-a-cursor")
+
+    assert response.status_code == 400
+    assert response.get_json() == {
+        'error': "Invalid pagination",
+        'message': "The provided cursor is invalid"
+    }
+
+@pytest.mark.parametrize("value", [{"name": "x"}, ["x"], 3, "a\x00b"])
+def test_get_coins_with_tampered_cursor(client, value):
+    cursor = base64.urlsafe_b64encode(json.dumps({"name": value}).encode()).decode()
+    response = client.get(f"/api/v1/coins?cursor={cursor}")
+
+    assert response.status_code == 400
+    assert response.get_json()['message'] == "The provided cursor is invalid"
+
+def test_get_coins_with_invalid_limit(client):
+    response = client.get("/api/v1/coins?limit=0")
+
+    assert response.status_code == 400
+    assert response.get_json() == {
+        'error': "Invalid pagination",
+        'message': "Limit must be between 1 and 1000"
+    }
+
+def test_stream_all_coins(client):
+    ids = [client.post("/api/v1/coins", json={"name": f"Test coin {n}"}).get_json()["id"] for n in range(2)]
+    query_response = client.get("/api/v1/coins?stream=1")
+    query_body = query_response.get_data(as_text=True)
+    header_response = client.get("/api/v1/coins", headers={"Accept": "application/x-ndjson"})
+    header_body = header_response.get_data(as_text=True)
+    for coin_id in ids:
+        client.delete(f"/api/v1/coins/{coin_id}")
+
+    for response, body in ((query_response, query_body), (header_response, header_body)):
+        coins = [json.loads(line) for line in body.splitlines()]
+        assert response.status_code == 200
+        assert response.mimetype == "application/x-ndjson"
+        assert {"id": ids[0], "name": "Test coin 0", "completed": False} in coins
+        assert {"id": ids[1], "name": "Test coin 1", "completed": False} in coins
+
+def test_get_coins_by_ids(client):
+    ids = [client.post("/api/v1/coins", json={"name": f"Test coin {n}"}).get_json()["id"] for n in range(2)]
+    get_response = client.get(f"/api/v1/coins?ids={ids[1]},{valid_uuid},{ids[0]}")
+    post_response = client.post("/api/v1/coins/lookup", json={"ids": [ids[0], ids[1].upper()]})
+    for coin_id in ids:
+        client.delete(f"/api/v1/coins/{coin_id}")
+
+    assert get_response.status_code == 200
+    assert get_response.get_json() == {
+        'data': [
+            {"id": ids[1], "name": "Test coin 1", "completed": False},
+            {"id": ids[0], "name": "Test coin 0", "completed": False},
+        ],
+        'not_found': [valid_uuid]
+    }
+    assert post_response.status_code == 200
+    assert [coin["name"] for coin in post_response.get_json()["data"]] == ["Test coin 0", "Test coin 1"]
+
+def test_get_coins_by_urn(client):
+    coin_id = client.post("/api/v1/coins", json={"name": "Test coin 1"}).get_json()["id"]
+    response = client.get(f"/api/v1/coins?ids=urn:uuid:{coin_id},urn:uuid:{valid_uuid}")
+    client.delete(f"/api/v1/coins/{coin_id}")
+
+    assert response.status_code == 200
+    assert response.get_json() == {
+        'data': [{"id": coin_id, "name": "Test coin 1", "completed": False}],
+        'not_found': [f"urn:uuid:{valid_uuid}"]
+    }
+
+def test_get_coins_by_invalid_ids(client):
+    response = client.get(f"/api/v1/coins?ids={valid_uuid},{invalid_uuid}")
+
+    assert response.status_code == 400
+    assert response.get_json() == {
+        'error': "Invalid ID format",
+        'message': "IDs must be a valid UUID"
+    }
+
 def test_get_coin_by_id(client):
     post_response = client.post("/api/v1/coins", json={"name": "Test coin 1"})
     id_of_new_coin = post_response.get_json()["id"]
@@ -138,6 +234,27 @@ def test_update_existing_coin(client):
         "completed": True
     }
 
+def test_update_coin_with_duplicate_name(coin_duty_fixture):
+    client, coin, duty, coin_2, duty_2 = coin_duty_fixture
+    response = client.patch(f"/api/v1/coins/{coin.id}", json={"name": coin_2.name, "completed": True})
+
+    assert response.status_code == 409
+    assert response.get_json() == {
+        'error': "Duplication error",
+        'message': f"{coin_2.name} already exists"
+    }
+    assert client.get(f"/api/v1/coins/{coin.id}").get_json()["name"] == coin.name
+
+def test_update_coin_name_to_null(client):
+    coin_id = client.post("/api/v1/coins", json={"name": "New test coin"}).get_json()["id"]
+    response = client.patch(f"/api/v1/coins/{coin_id}", json={"name": None})
+    name = client.get(f"/api/v1/coins/{coin_id}").get_json()["name"]
+    client.delete(f"/api/v1/coins/{coin_id}")
+
+    assert response.status_code == 400
+    assert response.get_json()[0]["loc"] == ["name"]
+    assert name == "New test coin"
+
 def test_update_non_existing_coin(client):
     response = client.patch(f"/api/v1/coins/{valid_uuid}", json={"name": "Updated coin"})
     
@@ -260,6 +377,132 @@ def test_add_invalid_duty_to_coin(coin_duty_fixture):
         'message': "IDs must be a valid UUID"
     }
 
+def test_add_duties_to_coin(coin_duty_fixture):
+    client, coin, duty, coin_2, duty_2 = coin_duty_fixture
+    client.post(f"/api/v1/coins/{coin.id}/duties/{duty.id}")
+    response = client.post(f"/api/v1/coins/{coin.id}/duties", json={
+        "duty_ids": [str(duty_2.id), str(duty.id), valid_uuid, invalid_uuid, str(duty_2.id)]
+    })
+    linked_response = client.get(f"/api/v1/coins/{coin.id}/duties")
+
+    assert response.status_code == 200
+    assert response.get_json() == {
+        'coin_name': coin.name,
+        'duties': [
+            {'id': str(duty_2.id), 'name': duty_2.name, 'status': "linked"},
+            {'id': str(duty.id), 'name': duty.name, 'status': "already_linked"},
+            {'id': valid_uuid, 'name': None, 'status': "not_found"},
+            {'id': invalid_uuid, 'name': None, 'status': "invalid_id"},
+        ]
+    }
+    assert sorted(linked_response.get_json()['linked_to']) == sorted([duty.name, duty_2.name])
+
+def test_add_duties_to_coin_by_urn(coin_duty_fixture):
+    client, coin, duty, *rest = coin_duty_fixture
+    response = client.post(f"/api/v1/coins/{coin.id}/duties", json={"duty_ids": [f"urn:uuid:{duty.id}"]})
+
+    assert response.status_code == 200
+    assert response.get_json()['duties'] == [{'id': str(duty.id), 'name': duty.name, 'status': "linked"}]
+
+def test_add_duties_to_non_existent_coin(coin_duty_fixture):
+    client, _, duty, *rest = coin_duty_fixture
+    response = client.post(f"/api/v1/coins/{valid_uuid}/duties", json={"duty_ids": [str(duty.id)]})
+
+    assert response.status_code == 404
+    assert response.get_json() == {
+        'error': "Invalid ID",
+        'message': f"A coin with ID = {valid_uuid} does not exist"
+    }
+
+def test_add_duties_to_invalid_coin(client):
+    response = client.post(f"/api/v1/coins/{invalid_uuid}/duties", json={"duty_ids": [valid_uuid]})
+
+    assert response.status_code == 400
+    assert response.get_json() == {
+        'error': "Invalid ID format",
+        'message': "IDs must be a valid UUID"
+    }
+
+def test_add_empty_list_of_duties_to_coin(client):
+    response = client.post(f"/api/v1/coins/{valid_uuid}/duties", json={"duty_ids": []})
+
+    assert response.status_code == 400
+    assert response.get_json() == {
+        'error': "Invalid json input",
+        'message': "duty_ids must be a non-empty list of IDs"
+    }
+
+@pytest.mark.parametrize("body", [[], "x", 1])
+def test_add_duties_to_coin_with_body_that_is_not_an_object(client, body):
+    response = client.post(f"/api/v1/coins/{valid_uuid}/duties", json=body)
+    lookup_response = client.post("/api/v1/coins/lookup", json=body)
+
+    for response in (response, lookup_response):
+        assert response.status_code == 400
+        assert response.get_json() == {
+            'error': "Invalid json input",
+            'message': "The request body must be a JSON object"
+        }
+
+def test_set_duties_of_coin(coin_duty_fixture):
+    client, coin, duty, coin_2, duty_2 = coin_duty_fixture
+    client.post(f"/api/v1/coins/{coin.id}/duties/{duty.id}")
+    response = client.put(f"/api/v1/coins/{coin.id}/duties", json={"duty_ids": [str(duty_2.id)]})
+    linked_response = client.get(f"/api/v1/coins/{coin.id}/duties")
+
+    assert response.status_code == 200
+    assert response.get_json() == {
+        'coin_name': coin.name,
+        'added': [{'id': str(duty_2.id), 'name': duty_2.name}],
+        'removed': [{'id': str(duty.id), 'name': duty.name}],
+    }
+    assert linked_response.get_json()['linked_to'] == [duty_2.name]
+
+def test_set_duties_of_coin_by_urn(coin_duty_fixture):
+    client, coin, duty, coin_2, duty_2 = coin_duty_fixture
+    client.post(f"/api/v1/coins/{coin.id}/duties/{duty.id}")
+    response = client.put(f"/api/v1/coins/{coin.id}/duties", json={
+        "duty_ids": [f"urn:uuid:{duty.id}", f"urn:uuid:{duty_2.id}"]
+    })
+
+    assert response.status_code == 200
+    assert response.get_json()['added'] == [{'id': str(duty_2.id), 'name': duty_2.name}]
+    assert response.get_json()['removed'] == []
+
+def test_set_no_duties_of_coin(coin_duty_fixture):
+    client, coin, duty, coin_2, duty_2 = coin_duty_fixture
+    client.post(f"/api/v1/coins/{coin.id}/duties/{duty.id}")
+    client.post(f"/api/v1/coins/{coin_2.id}/duties/{duty.id}")
+    response = client.put(f"/api/v1/coins/{coin.id}/duties", json={"duty_ids": []})
+    other_coin_response = client.get(f"/api/v1/coins/{coin_2.id}/duties")
+
+    assert response.status_code == 200
+    assert response.get_json()['removed'] == [{'id': str(duty.id), 'name': duty.name}]
+    assert other_coin_response.get_json()['linked_to'] == [duty.name]
+
+def test_set_non_existent_duties_of_coin(coin_duty_fixture):
+    client, coin, duty, coin_2, duty_2 = coin_duty_fixture
+    client.post(f"/api/v1/coins/{coin.id}/duties/{duty.id}")
+    response = client.put(f"/api/v1/coins/{coin.id}/duties", json={"duty_ids": [str(duty_2.id), valid_uuid]})
+    linked_response = client.get(f"/api/v1/coins/{coin.id}/duties")
+
+    assert response.status_code == 404
+    assert response.get_json() == {
+        'error': "Invalid ID",
+        'message': "Some duties do not exist, no changes were made",
+        'not_found': [valid_uuid]
+    }
+    assert linked_response.get_json()['linked_to'] == [duty.name]
+
+def test_set_duties_of_non_existent_coin(client):
+    response = client.put(f"/api/v1/coins/{valid_uuid}/duties", json={"duty_ids": []})
+
+    assert response.status_code == 404
+    assert response.get_json() == {
+        'error': "Invalid ID",
+        'message': f"A coin with ID = {valid_uuid} does not exist"
+    }
+
 def test_remove_duty_from_coin(coin_duty_fixture):
     client, coin, duty, *rest = coin_duty_fixture
     add_duty_to_coin_response = client.post(f"/api/v1/coins/{coin.id}/duties/{duty.id}")
@@ -320,3 +563,74 @@ def test_remove_invalid_duty_from_coin(coin_duty_fixture):
         'error': "Invalid ID format",
         'message': "IDs must be a valid UUID"
     }
+
+# CURRICULUM TREES
+
+def test_get_coin_tree(coin_duty_fixture):
+    client, coin, duty, coin_2, duty_2 = coin_duty_fixture
+    client.post(f"/api/v1/coins/{coin.id}/duties/{duty.id}")
+    client.post(f"/api/v1/coins/{coin.id}/duties/{duty_2.id}")
+    ksb_response = client.post("/api/v1/ksb", json={
+        "type": "Knowledge",
+        "name": "Test KSB name",
+        "description": "Test KSB description"
+    })
+    ksb = ksb_response.get_json()
+    client.post(f"/api/v1/duties/{duty.id}/ksb/{ksb['id']}")
+    response = client.get(f"/api/v1/coins/{coin.id}/tree")
+    client.delete(f"/api/v1/ksb/{ksb['id']}")
+
+    assert response.status_code == 200
+    assert response.get_json() == {
+        'id': str(coin.id),
+        'name': coin.name,
+        'completed': False,
+        'duties': [
+            {
+                'id': str(duty.id),
+                'name': duty.name,
+                'description': duty.description,
+                'ksbs': [ksb],
+            },
+            {
+                'id': str(duty_2.id),
+                'name': duty_2.name,
+                'description': duty_2.description,
+                'ksbs': [],
+            },
+        ]
+    }
+
+def test_get_catalog_tree(coin_duty_fixture):
+    client, coin, duty, coin_2, duty_2 = coin_duty_fixture
+    client.post(f"/api/v1/coins/{coin_2.id}/duties/{duty_2.id}")
+    response = client.get("/api/v1/coins/tree")
+    trees = {tree['name']: tree for tree in response.get_json()}
+
+    assert response.status_code == 200
+    assert trees[coin.name]['duties'] == []
+    assert [d['name'] for d in trees[coin_2.name]['duties']] == [duty_2.name]
+
+def test_get_tree_of_non_existent_coin(client):
+    response = client.get(f"/api/v1/coins/{valid_uuid}/tree")
+
+    assert response.status_code == 404
+    assert response.get_json() == {
+        'error': "Database error",
+        'message': f"Coin with ID = {valid_uuid} does not exist"
+    }
+
+def test_get_tree_of_invalid_coin(client):
+    response = client.get(f"/api/v1/coins/{invalid_uuid}/tree")
+
+    assert response.status_code == 400
+    assert response.get_json() == {
+        'error': "Invalid ID format",
+        'message': "The provided ID must be a valid UUID"
+    }
+
+@pytest.mark.parametrize("body", [[], "x"])
+def test_update_coin_with_invalid_body(client, body):
+    response = client.patch(f"/api/v1/coins/{valid_uuid}", json=body)
+
+    assert response.status_code == 400
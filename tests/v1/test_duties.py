@@ -1,5 +1,9 @@
+import pytest
 from unittest.mock import MagicMock, patch
 import uuid 
+import json
+from app.models.duties import Duties
+from app.pagination import encode_cursor
 
 valid_uuid = '00000000-0000-4000-a000-000000000000'
 invalid_uuid = '1'
@@ -24,6 +28,28 @@ def test_get_all_duties(client):
     assert response.status_code == 200
     assert response.get_json() == mock_duties
 
+def test_get_duties_paginated(client):
+    ids = [client.post("/api/v1/duties", json={"name": f"Test name {n}", "description": f"Test description {n}"}).get_json()["id"] for n in range(3)]
+    first_page = client.get("/api/v1/duties?limit=2")
+    second_page = client.get(f"/api/v1/duties?limit=2&cursor={first_page.get_json()['next_cursor']}")
+    for id in ids:
+        client.delete(f"/api/v1/duties/{id}")
+
+    assert [row["name"] for row in first_page.get_json()["data"]] == ["Test name 0", "Test name 1"]
+    assert [row["name"] for row in second_page.get_json()["data"]] == ["Test name 2"]
+    assert second_page.get_json()["next_cursor"] is None
+
+def test_get_duties_by_ids(client):
+    ids = [client.post("/api/v1/duties", json={"name": f"Test name {n}", "description": f"Test description {n}"}).get_json()["id"] for n in range(2)]
+    get_response = client.get(f"/api/v1/duties?ids={ids[1]}&ids={ids[0]}")
+    post_response = client.post("/api/v1/duties/lookup", json={"ids": [valid_uuid, ids[0]]})
+    for id in ids:
+        client.delete(f"/api/v1/duties/{id}")
+
+    assert [row["name"] for row in get_response.get_json()["data"]] == ["Test name 1", "Test name 0"]
+    assert [row["name"] for row in post_response.get_json()["data"]] == ["Test name 0"]
+    assert post_response.get_json()["not_found"] == [valid_uuid]
+
 def test_get_duty_by_id(client):
     post_response = client.post("/api/v1/duties", json={
             "name": "Test name",
@@ -173,6 +199,17 @@ def test_update_existing_duty(client):
         "description": "Updated description"
     }
 
+def test_update_duty_with_duplicate_name(coin_duty_fixture):
+    client, coin, duty, coin_2, duty_2 = coin_duty_fixture
+    response = client.patch(f"/api/v1/duties/{duty.id}", json={"name": duty_2.name})
+
+    assert response.status_code == 409
+    assert response.get_json() == {
+        'error': "Duplication error",
+        'message': f"A duty with (name)=({duty_2.name}) already exists"
+    }
+    assert client.get(f"/api/v1/duties/{duty.id}").get_json()["name"] == duty.name
+
 def test_update_non_existing_duty(client):
     response = client.patch(f"/api/v1/duties/{valid_uuid}", json={"name": "Updated duty"})
     
@@ -191,6 +228,65 @@ def test_update_duty_with_invalid_id(client):
         'message': "The provided ID must be a valid UUID"
     }
 
+# DUTIES WITH KSBS
+
+def encode_name_cursor(name):
+    return encode_cursor(Duties.name, name)
+
+def ksb_json(ksb):
+    return {
+        'id': str(ksb.id),
+        'type': ksb.type,
+        'name': ksb.name,
+        'description': ksb.description,
+    }
+
+def test_get_duties_with_ksbs(ksb_duty_fixture):
+    client, ksb, duty, ksb_2, duty_2 = ksb_duty_fixture
+    client.post(f"/api/v1/duties/{duty.id}/ksb/{ksb.id}")
+    client.post(f"/api/v1/duties/{duty.id}/ksb/{ksb_2.id}")
+    response = client.get("/api/v1/duties/with-ksbs")
+    duties = {d['name']: d for d in response.get_json()}
+
+    assert response.status_code == 200
+    assert duties[duty.name] == {
+        'id': str(duty.id),
+        'name': duty.name,
+        'description': duty.description,
+        'ksbs': [ksb_json(ksb), ksb_json(ksb_2)],
+    }
+    assert duties[duty_2.name]['ksbs'] == []
+
+def test_get_duties_with_ksbs_of_type(ksb_duty_fixture):
+    client, ksb, duty, ksb_2, duty_2 = ksb_duty_fixture
+    client.post(f"/api/v1/duties/{duty.id}/ksb/{ksb.id}")
+    client.post(f"/api/v1/duties/{duty.id}/ksb/{ksb_2.id}")
+    response = client.get("/api/v1/duties/with-ksbs?ksb_type=Skill")
+    duties = {d['name']: d for d in response.get_json()}
+
+    assert response.status_code == 200
+    assert duties[duty.name]['ksbs'] == [ksb_json(ksb_2)]
+
+def test_get_duties_with_ksbs_paginated(ksb_duty_fixture):
+    client, ksb, duty, ksb_2, duty_2 = ksb_duty_fixture
+    client.post(f"/api/v1/duties/{duty_2.id}/ksb/{ksb.id}")
+    first_page = client.get(f"/api/v1/duties/with-ksbs?limit=1&cursor={encode_name_cursor(duty.name[:-1])}")
+    second_page = client.get(f"/api/v1/duties/with-ksbs?limit=1&cursor={first_page.get_json()['next_cursor']}")
+
+    assert first_page.status_code == 200
+    assert [d['name'] for d in first_page.get_json()['data']] == [duty.name]
+    assert [d['name'] for d in second_page.get_json()['data']] == [duty_2.name]
+    assert second_page.get_json()['data'][0]['ksbs'] == [ksb_json(ksb)]
+
+def test_get_duties_with_ksbs_of_invalid_type(client):
+    response = client.get("/api/v1/duties/with-ksbs?ksb_type=Attitude")
+
+    assert response.status_code == 400
+    assert response.get_json() == {
+        'error': "Invalid type",
+        'message': "Type must be one of 'Knowledge', 'Skill' or 'Behaviour'",
+    }
+
 # DUTY AND KSB RELATIONSHIPS
 
 def test_get_all_ksb_for_duty(ksb_duty_fixture):
@@ -284,6 +380,62 @@ def test_add_invalid_ksb_to_duty(ksb_duty_fixture):
         'message': "IDs must be a valid UUID"
     }
 
+def test_add_ksbs_to_duty(ksb_duty_fixture):
+    client, ksb, duty, ksb_2, duty_2 = ksb_duty_fixture
+    client.post(f"/api/v1/duties/{duty.id}/ksb/{ksb.id}")
+    response = client.post(f"/api/v1/duties/{duty.id}/ksb", json={
+        "ksb_ids": [str(ksb.id), str(ksb_2.id), valid_uuid]
+    })
+
+    assert response.status_code == 200
+    assert response.get_json() == {
+        'duty_name': duty.name,
+        'ksbs': [
+            {'id': str(ksb.id), 'name': ksb.name, 'status': "already_linked"},
+            {'id': str(ksb_2.id), 'name': ksb_2.name, 'status': "linked"},
+            {'id': valid_uuid, 'name': None, 'status': "not_found"},
+        ]
+    }
+
+def test_add_ksbs_to_non_existent_duty(ksb_duty_fixture):
+    client, ksb, *rest = ksb_duty_fixture
+    response = client.post(f"/api/v1/duties/{valid_uuid}/ksb", json={"ksb_ids": [str(ksb.id)]})
+
+    assert response.status_code == 404
+    assert response.get_json() == {
+        'error': "Invalid ID",
+        'message': f"A duty with ID = {valid_uuid} does not exist"
+    }
+
+def test_set_ksbs_of_duty(ksb_duty_fixture):
+    client, ksb, duty, ksb_2, duty_2 = ksb_duty_fixture
+    client.post(f"/api/v1/duties/{duty.id}/ksb/{ksb.id}")
+    response = client.put(f"/api/v1/duties/{duty.id}/ksb", json={"ksb_ids": [str(ksb.id), str(ksb_2.id)]})
+
+    assert response.status_code == 200
+    assert response.get_json() == {
+        'duty_name': duty.name,
+        'added': [{'id': str(ksb_2.id), 'name': ksb_2.name}],
+        'removed': [],
+    }
+
+def test_set_ksbs_of_duty_by_urn(ksb_duty_fixture):
+    client, ksb, duty, *rest = ksb_duty_fixture
+    response = client.put(f"/api/v1/duties/{duty.id}/ksb", json={"ksb_ids": [f"urn:uuid:{ksb.id}"]})
+
+    assert response.status_code == 200
+    assert response.get_json()['added'] == [{'id': str(ksb.id), 'name': ksb.name}]
+
+def test_set_ksbs_of_duty_with_invalid_id(ksb_duty_fixture):
+    client, ksb, duty, *rest = ksb_duty_fixture
+    response = client.put(f"/api/v1/duties/{duty.id}/ksb", json={"ksb_ids": [str(ksb.id), invalid_uuid]})
+
+    assert response.status_code == 400
+    assert response.get_json() == {
+        'error': "Invalid ID format",
+        'message': "IDs must be a valid UUID"
+    }
+
 def test_remove_ksb_from_duty(ksb_duty_fixture):
     client, ksb, duty, *rest = ksb_duty_fixture
     add_ksb_to_duty_response = client.post(f"/api/v1/duties/{duty.id}/ksb/{ksb.id}")
@@ -345,3 +497,28 @@ def test_remove_invalid_ksb_from_duty(ksb_duty_fixture):
         'message': "IDs must be a valid UUID"
     }
 
+
+def test_stream_all_duties(client):
+    ids = [client.post("/api/v1/duties", json={
+        "name": f"Test duty {n}",
+        "description": f"Test duty description {n}"
+    }).get_json()["id"] for n in range(2)]
+    response = client.get("/api/v1/duties", headers={"Accept": "application/x-ndjson"})
+    duties = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    for duty_id in ids:
+        client.delete(f"/api/v1/duties/{duty_id}")
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert [duty["id"] for duty in duties if duty["id"] in ids] == ids
+
+@pytest.mark.parametrize("body", [[], "x", {"name": None}])
+def test_update_duty_with_invalid_body(client, body):
+    response = client.patch(f"/api/v1/duties/{valid_uuid}", json=body)
+
+    assert response.status_code == 400
+
+def test_update_duty_without_body(client):
+    response = client.patch(f"/api/v1/duties/{valid_uuid}")
+
+    assert response.status_code == 400
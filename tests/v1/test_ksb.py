@@ -1,5 +1,7 @@
+import pytest
 from unittest.mock import MagicMock, patch
 import uuid 
+import json
 
 valid_uuid = '00000000-0000-4000-a000-000000000000'
 invalid_uuid = '1'
@@ -29,6 +31,28 @@ def test_get_all_ksbs(client):
     assert response.status_code == 200
     assert response.get_json() == mock_ksbs
 
+def test_get_ksbs_paginated(client):
+    ids = [client.post("/api/v1/ksb", json={"type": "Knowledge", "name": f"Test name {n}", "description": f"Test description {n}"}).get_json()["id"] for n in range(3)]
+    first_page = client.get("/api/v1/ksb?limit=2")
+    second_page = client.get(f"/api/v1/ksb?limit=2&cursor={first_page.get_json()['next_cursor']}")
+    for id in ids:
+        client.delete(f"/api/v1/ksb/{id}")
+
+    assert [row["name"] for row in first_page.get_json()["data"]] == ["Test name 0", "Test name 1"]
+    assert [row["name"] for row in second_page.get_json()["data"]] == ["Test name 2"]
+    assert second_page.get_json()["next_cursor"] is None
+
+def test_get_ksbs_by_ids(client):
+    ids = [client.post("/api/v1/ksb", json={"type": "Knowledge", "name": f"Test name {n}", "description": f"Test description {n}"}).get_json()["id"] for n in range(2)]
+    get_response = client.get(f"/api/v1/ksb?ids={ids[1]}&ids={ids[0]}")
+    post_response = client.post("/api/v1/ksb/lookup", json={"ids": [valid_uuid, ids[0]]})
+    for id in ids:
+        client.delete(f"/api/v1/ksb/{id}")
+
+    assert [row["name"] for row in get_response.get_json()["data"]] == ["Test name 1", "Test name 0"]
+    assert [row["name"] for row in post_response.get_json()["data"]] == ["Test name 0"]
+    assert post_response.get_json()["not_found"] == [valid_uuid]
+
 def test_get_ksb_by_id(client):
     post_response = client.post("/api/v1/ksb", json={
             "type": KSB_TYPES["K"],
@@ -206,6 +230,16 @@ def test_update_existing_ksb(client):
         "description": "Updated description"
     }
 
+def test_update_ksb_with_duplicate_name(ksb_duty_fixture):
+    client, ksb, duty, ksb_2, duty_2 = ksb_duty_fixture
+    response = client.patch(f"/api/v1/ksb/{ksb.id}", json={"name": ksb_2.name})
+
+    assert response.status_code == 409
+    assert response.get_json() == {
+        'error': "Duplication error",
+        'message': f"A KSB with (name)=({ksb_2.name}) already exists"
+    }
+
 def test_update_non_existing_ksb(client):
     response = client.patch(f"/api/v1/ksb/{valid_uuid}", json={"name": "Updated ksb"})
     
@@ -242,4 +276,29 @@ def test_update_ksb_with_invalid_type(client):
     assert patch_response.get_json() == {
             'error': "Invalid type",
             'message': "Type must be one of 'Knowledge', 'Skill' or 'Behaviour'",
-        }
\ No newline at end of file
+        }
+def test_stream_all_ksbs(client):
+    ids = [client.post("/api/v1/ksb", json={
+        "type": KSB_TYPES["S"],
+        "name": f"Test KSB {n}",
+        "description": f"Test KSB description {n}"
+    }).get_json()["id"] for n in range(2)]
+    response = client.get("/api/v1/ksb?stream=1")
+    ksbs = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    for ksb_id in ids:
+        client.delete(f"/api/v1/ksb/{ksb_id}")
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert {ksb["id"] for ksb in ksbs} >= set(ids)
+
+@pytest.mark.parametrize("body", [[], "x", {"description": None}])
+def test_update_ksb_with_invalid_body(client, body):
+    response = client.patch(f"/api/v1/ksb/{valid_uuid}", json=body)
+
+    assert response.status_code == 400
+
+def test_update_ksb_without_body(client):
+    response = client.patch(f"/api/v1/ksb/{valid_uuid}")
+
+    assert response.status_code == 400
@@ -0,0 +1,106 @@
+import pytest
+from app import create_app
+from app.pagination import encode_cursor
+from app.search import SEARCH_CURSOR_KEY
+
+@pytest.fixture
+def search_client():
+    app = create_app()
+    app.config["TESTING"] = True
+
+    with app.test_client() as client:
+        duty_ids = [client.post("/api/v1/duties", json={
+            "name": f"Search duty {n}",
+            "description": f"Provision infrastructure with terraform modules {n}"
+        }).get_json()["id"] for n in range(3)]
+        ksb_id = client.post("/api/v1/ksb", json={
+            "type": "Skill",
+            "name": "Search ksb",
+            "description": "Writes reusable terraform code"
+        }).get_json()["id"]
+
+        yield client, duty_ids, ksb_id
+
+        for duty_id in duty_ids:
+            client.delete(f"/api/v1/duties/{duty_id}")
+        client.delete(f"/api/v1/ksb/{ksb_id}")
+
+def test_search_duties_and_ksbs(search_client):
+    client, duty_ids, ksb_id = search_client
+    response = client.get("/api/v1/search?q=terraform")
+    results = response.get_json()["data"]
+
+    assert response.status_code == 200
+    assert {result["id"] for result in results} == {*duty_ids, ksb_id}
+    ksb = next(result for result in results if result["id"] == ksb_id)
+    assert ksb["kind"] == "ksb"
+    assert ksb["type"] == "Skill"
+    assert "<mark>terraform</mark>" in ksb["snippet"]
+
+def test_search_ranks_name_matches_first(search_client):
+    client, duty_ids, ksb_id = search_client
+    response = client.get("/api/v1/search?q=terraform ksb")
+    results = response.get_json()["data"]
+
+    assert response.status_code == 200
+    assert [result["id"] for result in results] == [ksb_id]
+
+def test_search_by_kind(search_client):
+    client, duty_ids, ksb_id = search_client
+    response = client.get("/api/v1/search?q=terraform&kind=duty")
+
+    assert response.status_code == 200
+    assert {result["kind"] for result in response.get_json()["data"]} == {"duty"}
+
+def test_search_paginated(search_client):
+    client, duty_ids, ksb_id = search_client
+    first_page = client.get("/api/v1/search?q=terraform&limit=3").get_json()
+    second_page = client.get(f"/api/v1/search?q=terraform&limit=3&cursor={first_page['next_cursor']}").get_json()
+    ids = [result["id"] for result in first_page["data"] + second_page["data"]]
+
+    assert len(first_page["data"]) == 3
+    assert second_page["next_cursor"] is None
+    assert sorted(ids) == sorted([*duty_ids, ksb_id])
+
+def test_search_finds_updated_description(search_client):
+    client, duty_ids, ksb_id = search_client
+    client.patch(f"/api/v1/duties/{duty_ids[0]}", json={"description": "Maintains kubernetes clusters"})
+    response = client.get("/api/v1/search?q=kubernetes")
+
+    assert [result["id"] for result in response.get_json()["data"]] == [duty_ids[0]]
+
+def test_search_without_query(client):
+    response = client.get("/api/v1/search")
+
+    assert response.status_code == 400
+    assert response.get_json() == {
+        'error': "Invalid query",
+        'message': "A search query is required"
+    }
+
+def test_search_with_invalid_cursor(client):
+    response = client.get("/api/v1/search?q=terraform&cursor=not-a-cursor")
+
+    assert response.status_code == 400
+    assert response.get_json() == {
+        'error': "Invalid pagination",
+        'message': "The provided cursor is invalid"
+    }
+
+@pytest.mark.parametrize("value", [[1, 2], [1, {"id": "x"}], ["1", "x"], [1]])
+def test_search_with_tampered_cursor(client, value):
+    cursor = encode_cursor(SEARCH_CURSOR_KEY, value)
+    response = client.get(f"/api/v1/search?q=terraform&cursor={cursor}")
+
+    assert response.status_code == 400
+    assert response.get_json()['message'] == "The provided cursor is invalid"
+
+def test_search_snippets_escape_descriptions(search_client):
+    client, duty_ids, ksb_id = search_client
+    client.patch(f"/api/v1/duties/{duty_ids[0]}", json={"description": "Runs <script>alert(1)</script> & kubernetes"})
+    response = client.get("/api/v1/search?q=kubernetes")
+    snippet = response.get_json()["data"][0]["snippet"]
+
+    assert "<script>" not in snippet
+    assert "&lt;script&gt;" in snippet and "&amp;" in snippet
+    assert "<mark>kubernetes</mark>" in snippet
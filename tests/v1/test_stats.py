@@ -0,0 +1,16 @@
+def test_get_stats(client):
+    client.get("/api/v1/coins")
+    response = client.get("/api/v1/stats")
+    pool = response.get_json()["db_pool"]["primary"]
+
+    assert response.status_code == 200
+    assert pool["checkouts"] >= 1
+    assert pool["in_use"] == 1
+    assert pool["idle"] + pool["in_use"] <= pool["max_size"]
+    assert response.get_json()["password_hashing"]["rejected"] >= 0
+
+def test_connection_is_returned_to_pool_after_request(client):
+    from app.database import pool_stats
+    client.get("/api/v1/coins")
+
+    assert pool_stats()["primary"]["in_use"] == 0
@@ -17,4 +17,67 @@ def test_get_all_coins_of_non_existent_duty(client):
     assert response.get_json() == {
         'error': "Database error",
         'message': f"Duty with name = '{name_of_non_existent_duty}' does not exist"
-    }
\ No newline at end of file
+    }
+
+def test_get_all_coins_for_many_duties(coin_duty_fixture):
+    client, coin, duty, coin_2, duty_2 = coin_duty_fixture
+    client.post(f"/api/v1/coins/{coin.id}/duties/{duty.id}")
+    client.post(f"/api/v1/coins/{coin_2.id}/duties/{duty.id}")
+    response = client.get(f"/api/v2/duties?names={duty.name},{duty_2.name},Name of non-existent duty")
+
+    assert response.status_code == 200
+    assert response.get_json() == {
+        'linked_to': {
+            duty.name: [coin.name, coin_2.name],
+            duty_2.name: [],
+        },
+        'not_found': ['Name of non-existent duty']
+    }
+
+def test_get_all_coins_for_no_duties(client):
+    response = client.get("/api/v2/duties")
+
+    assert response.status_code == 400
+    assert response.get_json() == {
+        'error': "Invalid query",
+        'message': "names must be a comma-separated list of names"
+    }
+
+def test_get_all_coins_for_duty_ignores_case(coin_duty_fixture):
+    client, coin, duty, *rest = coin_duty_fixture
+    client.post(f"/api/v1/coins/{coin.id}/duties/{duty.id}")
+    response = client.get(f"/api/v2/duties/{duty.name.upper()}")
+
+    assert response.status_code == 200
+    assert response.get_json() == {
+        'duty_name': duty.name,
+        'linked_to': [coin.name]
+    }
+
+def test_get_all_coins_for_misspelt_duty_suggests_names(coin_duty_fixture, trigram):
+    client, coin, duty, *rest = coin_duty_fixture
+    response = client.get("/api/v2/duties/Test dutty name?fuzzy=1")
+
+    assert response.status_code == 400
+    assert response.get_json()['did_you_mean'][0] == duty.name
+
+def test_get_all_coins_for_duties_with_commas_in_their_names(coin_duty_fixture):
+    client, coin, duty, *rest = coin_duty_fixture
+    comma_duty = client.post("/api/v1/duties", json={
+        "name": "Test duty, with a comma",
+        "description": "Test duty description with a comma"
+    }).get_json()
+    client.post(f"/api/v1/coins/{coin.id}/duties/{comma_duty['id']}")
+    repeated = client.get("/api/v2/duties", query_string=[("names", comma_duty["name"]), ("names", duty.name)])
+    quoted = client.get("/api/v2/duties", query_string={"names": f'"{comma_duty["name"]}",{duty.name}'})
+    client.delete(f"/api/v1/duties/{comma_duty['id']}")
+
+    for response in (repeated, quoted):
+        assert response.status_code == 200
+        assert response.get_json() == {
+            'linked_to': {
+                comma_duty["name"]: [coin.name],
+                duty.name: [],
+            },
+            'not_found': []
+        }
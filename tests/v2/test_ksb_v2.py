@@ -17,4 +17,37 @@ def test_get_all_coins_of_non_existent_duty(client):
     assert response.get_json() == {
         'error': "Database error",
         'message': f"KSB with name = '{name_of_non_existent_ksb}' does not exist"
-    }
\ No newline at end of file
+    }
+
+def test_get_all_duties_for_many_ksbs(ksb_duty_fixture):
+    client, ksb, duty, ksb_2, duty_2 = ksb_duty_fixture
+    client.post(f"/api/v1/duties/{duty.id}/ksb/{ksb.id}")
+    client.post(f"/api/v1/duties/{duty_2.id}/ksb/{ksb.id}")
+    response = client.get(f"/api/v2/ksb?names={ksb.name}&names={ksb_2.name}")
+
+    assert response.status_code == 200
+    assert response.get_json() == {
+        'linked_to': {
+            ksb.name: [duty.name, duty_2.name],
+            ksb_2.name: [],
+        },
+        'not_found': []
+    }
+
+def test_get_all_duties_for_ksb_ignores_case(ksb_duty_fixture):
+    client, ksb, duty, *rest = ksb_duty_fixture
+    client.post(f"/api/v1/duties/{duty.id}/ksb/{ksb.id}")
+    response = client.get(f"/api/v2/ksb/{ksb.name.lower()}")
+
+    assert response.status_code == 200
+    assert response.get_json() == {
+        'ksb_name': ksb.name,
+        'linked_to': [duty.name]
+    }
+
+def test_get_all_duties_for_misspelt_ksb_suggests_names(ksb_duty_fixture, trigram):
+    client, ksb, duty, *rest = ksb_duty_fixture
+    response = client.get("/api/v2/ksb/Test KBS name?fuzzy=1")
+
+    assert response.status_code == 400
+    assert response.get_json()['did_you_mean'][0] == ksb.name